@@ -0,0 +1,404 @@
+"""ASGI entry point for an event-loop server: uvicorn asgi:application
+
+The hot read routes and the password reset run natively on the event loop,
+with a non-blocking Supabase client, so a waiting request holds no thread.
+Every other route, and any request a native route does not cover (paging,
+streaming), runs the Flask app itself in a thread pool. Native routes go
+through Flask's own request context, hooks and error handlers, so status
+codes, bodies and headers (sessions, ETags, compression, metrics, deadlines)
+are the same as under Gunicorn.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import requests
+from flask import g, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+import app as backend
+from projection import parse_select, with_select
+from singleflight import AsyncSingleFlight
+from supabase_async import AsyncSupabaseClient, httpx
+from tenancy import TENANT_FANOUT_WORKERS, partition_params
+
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+
+# Lists with these arguments page or stream, which only the Flask routes do
+PAGING_ARGS = ('after', 'limit', 'stream')
+
+upstream = AsyncSupabaseClient(backend.supabase) if httpx is not None else None
+upstream_reads = AsyncSingleFlight()
+# Shared by every request on the loop, like the Flask app's fan-out pool
+fanout_slots = asyncio.Semaphore(TENANT_FANOUT_WORKERS)
+
+
+# Async counterparts of the supabase_* helpers in app.py
+async def _supabase_fetch(table, params=None):
+    try:
+        response = await upstream.rest('GET', table, params=params)
+    except requests.RequestException as e:
+        return backend.stale_rows(table, params, e)
+    return backend.read_rows(table, params, response)
+
+
+async def supabase_get(table, params=None):
+    rows = await upstream_reads.do(table, params, lambda: _supabase_fetch(table, params))
+    return rows if rows is not None else []
+
+
+async def supabase_get_cached(table, params=None):
+    found, rows = backend.cache.get(table, params)
+    if found:
+        return rows
+
+    rows = await upstream_reads.do(table, params, lambda: _supabase_fetch(table, params))
+    if rows is None:
+        return []
+
+    backend.cache.set(table, params, rows)
+    return rows
+
+
+async def supabase_update(table, data, match_column, match_value):
+    response = await upstream.rest('PATCH', table, params={match_column: f"eq.{match_value}"}, json=data)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+
+async def fan_out(table, params, fetch):
+    """Read table one fuel pump at a time, at most TENANT_FANOUT_WORKERS reads at once"""
+    partitions = partition_params(params, await asyncio.to_thread(backend.fuel_pump_ids))
+
+    async def read(partition):
+        async with fanout_slots:
+            return await fetch(table, partition)
+
+    return [row for rows in await asyncio.gather(*[read(p) for p in partitions]) for row in rows]
+
+
+async def list_response(table, params=None, cached=False, match=None):
+    """Unpaged branch of app.list_response"""
+    try:
+        params = with_select(params, parse_select(table, request.args))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if request.args.get('include'):
+        cached = False
+
+    fan = backend.cross_tenant(table)
+    params = backend.tenant_params(table, params)
+    match = backend.tenant_match(table, match)
+    fetch = supabase_get_cached if cached else supabase_get
+    rows = await (fan_out(table, params, fetch) if fan else fetch(table, params))
+    if backend.journal.handles(table):
+        pending = await asyncio.to_thread(backend.journal.pending, table, match)
+        rows = backend.merge_pending(rows, pending, params)
+    return jsonify(rows)
+
+
+async def get_single(table, record_id, cached, not_found):
+    try:
+        select = parse_select(table, request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    fetch = supabase_get_cached if cached and not request.args.get('include') else supabase_get
+    rows = await fetch(table, backend.tenant_params(table, with_select({'id': f'eq.{record_id}'}, select)))
+    if rows:
+        return jsonify(rows[0])
+    return jsonify({'message': not_found}), 404
+
+
+# Native views, named after the Flask endpoints they stand in for
+async def get_customers():
+    return await list_response('customers')
+
+
+async def get_customer(customer_id):
+    return await get_single('customers', customer_id, True, 'Customer not found')
+
+
+async def get_vehicles():
+    customer_id = request.args.get('customer_id')
+    if customer_id:
+        return await list_response('vehicles', {'customer_id': f'eq.{customer_id}'}, cached=True)
+    return await list_response('vehicles')
+
+
+async def get_staff():
+    return await list_response('staff')
+
+
+async def get_staff_member(staff_id):
+    return await get_single('staff', staff_id, True, 'Staff member not found')
+
+
+async def get_indents():
+    customer_id = request.args.get('customer_id')
+    if customer_id:
+        return await list_response('indents', {'customer_id': f'eq.{customer_id}'}, match={'customer_id': customer_id})
+    return await list_response('indents')
+
+
+async def get_readings():
+    date = request.args.get('date')
+    if date:
+        return await list_response('readings', {'date': f'eq.{date}'}, match={'date': date})
+    return await list_response('readings')
+
+
+async def get_transactions():
+    date = request.args.get('date')
+    if date:
+        return await list_response('transactions', {'date': f'eq.{date}'}, match={'date': date})
+    return await list_response('transactions')
+
+
+async def reset_password():
+    if not request.is_json:
+        return jsonify({'success': False, 'error': 'Expected JSON data'}), 400
+
+    data = request.json
+    if not data:
+        return jsonify({'success': False, 'error': 'No data provided'}), 400
+
+    email = data.get('email')
+    new_password = data.get('newPassword')
+
+    if g.session is None:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if g.session.get('email') != email and g.session.get('role') not in ('admin', 'super_admin'):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    # The fuel pump and the user are independent lookups, so they run concurrently
+    fuel_pumps, users = await asyncio.gather(
+        supabase_get('fuel_pumps', {'email': f'eq.{email}'}),
+        supabase_get('app_users', {'email': f'eq.{email}'})
+    )
+
+    if not fuel_pumps:
+        return jsonify({'success': False, 'error': 'Fuel pump not found'}), 404
+
+    fuel_pump = fuel_pumps[0]
+    status = fuel_pump.get('status', '')
+    if not status.startswith('pending_reset:'):
+        return jsonify({'success': False, 'error': 'No pending password reset'}), 400
+    if status.split(':', 1)[1] != new_password:
+        return jsonify({'success': False, 'error': 'Password verification failed'}), 400
+
+    if not users:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+
+    password_hash, password_salt = backend.hash_password(new_password)
+    result = await supabase_update('app_users', {
+        'password_hash': password_hash,
+        'password_salt': password_salt,
+        'updated_at': datetime.now().isoformat()
+    }, 'id', users[0]['id'])
+
+    if result:
+        # Queuing the job is a SQLite write, kept off the loop
+        await asyncio.to_thread(backend.scheduler.defer, 'fuel_pump_status', column='id', value=fuel_pump['id'],
+                                status='active')
+        return jsonify({'success': True, 'message': 'Password reset successfully'})
+    return jsonify({'success': False, 'error': 'Failed to reset password'}), 500
+
+
+NATIVE_VIEWS = {
+    'get_customers': get_customers,
+    'get_customer': get_customer,
+    'get_vehicles': get_vehicles,
+    'get_staff': get_staff,
+    'get_staff_member': get_staff_member,
+    'get_indents': get_indents,
+    'get_readings': get_readings,
+    'get_transactions': get_transactions,
+    'reset_password': reset_password,
+}
+LIST_VIEWS = frozenset(['get_customers', 'get_vehicles', 'get_staff', 'get_indents', 'get_readings',
+                        'get_transactions'])
+
+
+def _start_view(view):
+    # A task copies the context it is created in, which holds the request
+    return asyncio.ensure_future(view(**request.view_args))
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    }
+
+
+_DONE = object()
+
+
+class Application:
+    """ASGI application serving native views on the loop and the rest through WSGI in threads"""
+
+    def __init__(self, flask_app=backend.app, native_views=None, threads=ASGI_WSGI_THREADS):
+        self.flask_app = flask_app
+        self.native_views = (NATIVE_VIEWS if upstream is not None else {}) if native_views is None else native_views
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        environ = build_environ(scope, await _read_body(receive))
+        view = self._native_view(environ)
+        if view is None:
+            await self._run_wsgi(environ, send)
+        else:
+            await self._run_native(view, environ, send)
+
+    def _native_view(self, environ):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        view = self.native_views.get(endpoint)
+        if view is not None and endpoint in LIST_VIEWS:
+            args = parse_qs(environ['QUERY_STRING'])
+            if any(name in args for name in PAGING_ARGS):
+                return None
+        return view
+
+    async def _run_native(self, view, environ, send):
+        # Mirrors Flask.wsgi_app, with the view awaited in place of dispatch_request.
+        # The request runs in a context of its own, so the before_request hooks,
+        # whose session and job lookups block on SQLite, can run in the pool and
+        # still set the deadline and request state the view and teardown see
+        app = self.flask_app
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        ctx = app.request_context(environ)
+        error = None
+        started = []
+        try:
+            try:
+                context.run(ctx.push)
+                rv = await loop.run_in_executor(self.pool, context.run, app.preprocess_request)
+                if rv is None:
+                    rv = await context.run(_start_view, view)
+            except Exception as e:
+                rv = context.run(app.handle_user_exception, e)
+            response = context.run(app.finalize_request, rv)
+        except Exception as e:
+            error = e
+            response = context.run(app.handle_exception, e)
+        try:
+            body = context.run(lambda: b''.join(
+                response(environ, lambda status, headers, exc_info=None: started.append((status, headers)))))
+        finally:
+            if app.should_ignore_error(error):
+                error = None
+            context.run(ctx.pop, error)
+        await send(_start_message(*started[0]))
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _run_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [(status, headers)]
+            return lambda data: None
+
+        def call():
+            result = self.flask_app(environ, start_response)
+            return result, iter(result)
+
+        result, chunks = await loop.run_in_executor(self.pool, call)
+        try:
+            # Streamed bodies are pulled one chunk at a time, off the loop
+            first = await loop.run_in_executor(self.pool, next, chunks, _DONE)
+            await send(_start_message(*started[0]))
+            chunk = first
+            while chunk is not _DONE:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.pool, next, chunks, _DONE)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.pool, close)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Replays journaled writes and runs background jobs, as under Gunicorn
+                await asyncio.to_thread(backend.scheduler.ensure_started)
+                await asyncio.to_thread(backend.journal.ensure_started)
+                backend.metrics_registry.ensure_writer()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                backend.health.start_draining()
+                if upstream is not None:
+                    await upstream.close()
+                await asyncio.to_thread(backend.scheduler.stop)
+                await asyncio.to_thread(backend.journal.stop)
+                backend.metrics_registry.discard()
+                self.pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = Application()
@@ -0,0 +1,242 @@
+"""Drive realistic request mixes against the backend and report latency percentiles.
+
+Run from the backend directory. By default the app and the Supabase stub both
+run in-process:
+
+    python -m bench.loadgen --scenario mixed --duration 30 --concurrency 32
+
+Use --target to load an already running server instead (for example one started
+under Gunicorn against `python -m bench.stub_server`).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+from bench import stub_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Context:
+    """Ids sampled from the seeded dataset, shared by the scenario functions"""
+
+    def __init__(self, data):
+        self.customer_ids = [row['id'] for row in data['customers']]
+        self.staff_ids = [row['id'] for row in data['staff']]
+        self.reading_ids = [row['id'] for row in data['readings']]
+        self.today = date.today()
+
+
+# Each operation returns (endpoint label, method, path, json body)
+def op_post_reading(ctx, rng):
+    return 'POST /api/readings', 'POST', '/api/readings', {
+        'pump_id': f'P-{rng.randint(1, 12)}', 'opening_reading': rng.randint(10000, 90000),
+        'staff_id': rng.choice(ctx.staff_ids), 'date': ctx.today.isoformat()
+    }
+
+
+def op_close_reading(ctx, rng):
+    reading_id = rng.choice(ctx.reading_ids)
+    return 'PUT /api/readings/<id>', 'PUT', f'/api/readings/{reading_id}', {
+        'closing_reading': rng.randint(90000, 99000)
+    }
+
+
+def op_post_transaction(ctx, rng):
+    return 'POST /api/transactions', 'POST', '/api/transactions', {
+        'customer_id': rng.choice(ctx.customer_ids), 'amount': rng.randint(100, 5000),
+        'quantity': round(rng.uniform(1, 50), 2), 'fuel_type': rng.choice(stub_server.FUEL_TYPES),
+        'payment_method': rng.choice(stub_server.PAYMENT_METHODS), 'staff_id': rng.choice(ctx.staff_ids)
+    }
+
+
+def op_get_customer(ctx, rng):
+    return 'GET /api/customers/<id>', 'GET', f'/api/customers/{rng.choice(ctx.customer_ids)}', None
+
+
+def op_get_vehicles(ctx, rng):
+    return 'GET /api/vehicles?customer_id=', 'GET', f'/api/vehicles?customer_id={rng.choice(ctx.customer_ids)}', None
+
+
+def op_list_transactions(ctx, rng):
+    return 'GET /api/transactions?limit=', 'GET', '/api/transactions?limit=100', None
+
+
+def op_daily_report(ctx, rng):
+    return 'GET /api/reports/daily-sales?date=', 'GET', f'/api/reports/daily-sales?date={ctx.today.isoformat()}', None
+
+
+def op_month_report(ctx, rng):
+    start = (ctx.today - timedelta(days=30)).isoformat()
+    return ('GET /api/reports/daily-sales?from=&to=', 'GET',
+            f'/api/reports/daily-sales?from={start}&to={ctx.today.isoformat()}', None)
+
+
+SCENARIOS = {
+    # Every pump posting opening and closing readings at once
+    'shift-change': [(op_post_reading, 5), (op_close_reading, 5)],
+    'transactions': [(op_post_transaction, 1)],
+    'customer-lookup': [(op_get_customer, 3), (op_get_vehicles, 2)],
+    'reports': [(op_daily_report, 1), (op_month_report, 1)],
+    'mixed': [
+        (op_post_transaction, 30), (op_get_customer, 20), (op_get_vehicles, 15),
+        (op_post_reading, 10), (op_close_reading, 10), (op_list_transactions, 10),
+        (op_daily_report, 3), (op_month_report, 2)
+    ],
+}
+
+
+def run_load(base_url, ctx, scenario, duration, concurrency, seed=1):
+    operations, weights = zip(*SCENARIOS[scenario])
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        local = {}
+        local_errors = {}
+        while time.monotonic() < deadline:
+            label, method, path, body = rng.choices(operations, weights)[0](ctx, rng)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=30)
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                failed = True
+            local.setdefault(label, []).append(time.perf_counter() - start)
+            if failed:
+                local_errors[label] = local_errors.get(label, 0) + 1
+        with lock:
+            for label, values in local.items():
+                samples.setdefault(label, []).extend(values)
+            for label, count in local_errors.items():
+                errors[label] = errors.get(label, 0) + count
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    endpoints = {}
+    for label, values in sorted(samples.items()):
+        values.sort()
+        endpoints[label] = {
+            'requests': len(values),
+            'errors': errors.get(label, 0),
+            'rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': values[-1] * 1000,
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {'elapsed_s': elapsed, 'total_requests': total, 'total_rps': total / elapsed, 'endpoints': endpoints}
+
+
+def start_in_process(args):
+    """Start the Supabase stub and the Flask app in this process; return the app URL"""
+    data = stub_server.seed_dataset(args.rows, args.days)
+    stub, state = stub_server.start(data, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    os.environ['SUPABASE_URL'] = f'http://127.0.0.1:{stub.server_port}'
+    os.environ.setdefault('SUPABASE_SERVICE_ROLE_KEY', 'bench-service-role-key')
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as backend
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', data, state
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    print(f"{'endpoint':45} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errs':>5}")
+    for label, stats in result['endpoints'].items():
+        line = (f"{label:45} {stats['requests']:7d} {stats['rps']:8.1f} {stats['p50_ms']:8.2f} "
+                f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['errors']:5d}")
+        previous = (baseline or {}).get('endpoints', {}).get(label)
+        if previous:
+            change = (stats['p99_ms'] - previous['p99_ms']) / previous['p99_ms'] * 100 if previous['p99_ms'] else 0
+            line += f"  p99 {change:+.1f}% vs baseline"
+        print(line)
+    print(f"total: {result['total_requests']} requests, {result['total_rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--target', help='base URL of a running backend; default runs it in-process')
+    parser.add_argument('--rows', type=int, default=10000, help='transactions seeded in the stub')
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated upstream latency')
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--output', help='JSON results path (default: bench/results/<scenario>-<time>.json)')
+    parser.add_argument('--baseline', help='earlier JSON result to compare p99 latencies against')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.target:
+        base_url = args.target.rstrip('/')
+        data = stub_server.seed_dataset(args.rows, args.days)
+    else:
+        base_url, data, _ = start_in_process(args)
+
+    result = run_load(base_url, Context(data), args.scenario, args.duration, args.concurrency, args.seed)
+    result.update({
+        'scenario': args.scenario,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+    })
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{args.scenario}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
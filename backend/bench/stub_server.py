@@ -0,0 +1,526 @@
+"""Local stand-in for the Supabase PostgREST and Auth admin APIs used by app.py.
+
+Run from the backend directory:
+
+    python -m bench.stub_server --port 54321 --latency-ms 25 --rows 50000
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+FUEL_TYPES = ('Petrol', 'Diesel', 'CNG')
+PAYMENT_METHODS = ('Cash', 'Card', 'UPI', 'Credit')
+# Tables whose writes the sync_changes trigger records upstream
+SYNC_TABLES = ('customers', 'vehicles', 'indents', 'transactions', 'readings')
+# Check constraints: an insert with a row failing one is rejected whole, as by Postgres
+CHECKS = {
+    'readings': lambda row: float(row.get('opening_reading') or 0) >= 0,
+}
+
+
+def _coerce(value, sample):
+    """Convert a filter literal to the type of the column it is compared with"""
+    if isinstance(sample, bool):
+        return value == 'true'
+    if isinstance(sample, (int, float)):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _matches(row, column, expression):
+    negate = expression.startswith('not.')
+    if negate:
+        expression = expression[4:]
+    op, _, literal = expression.partition('.')
+    value = row.get(column)
+
+    if op == 'is':
+        result = value is None if literal == 'null' else str(value).lower() == literal
+    elif op == 'in':
+        result = str(value) in [item.strip('"') for item in literal.strip('()').split(',')]
+    elif value is None:
+        result = False
+    else:
+        other = _coerce(literal, value)
+        if isinstance(value, (int, float)) and not isinstance(other, (int, float)):
+            value = str(value)
+        result = {
+            'eq': lambda: value == other,
+            'neq': lambda: value != other,
+            'gt': lambda: value > other,
+            'gte': lambda: value >= other,
+            'lt': lambda: value < other,
+            'lte': lambda: value <= other,
+            'like': lambda: re.fullmatch(other.replace('*', '.*'), str(value)) is not None,
+            'ilike': lambda: re.fullmatch(other.replace('*', '.*'), str(value), re.I) is not None,
+        }.get(op, lambda: True)()
+    return not result if negate else result
+
+
+def _split_top_level(text):
+    """Split a PostgREST list on commas that are not inside parentheses"""
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _logic(row, op, body):
+    results = []
+    for condition in _split_top_level(body.strip()[1:-1]):
+        if condition.startswith(('and(', 'or(')):
+            name, _, inner = condition.partition('(')
+            results.append(_logic(row, name, '(' + inner))
+        else:
+            column, _, expression = condition.partition('.')
+            results.append(_matches(row, column, expression))
+    return all(results) if op == 'and' else any(results)
+
+
+def seed_dataset(rows=10000, days=90, seed=7, pumps=1):
+    """Build a deterministic dataset roughly shaped like a fuel station's tables
+
+    With several pumps, customers, staff and their rows are spread across
+    them round-robin; readings and settings stay with the first pump.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    pump_ids = [f'pump-{n:04d}' for n in range(1, pumps + 1)]
+    pump_id = pump_ids[0]
+    customers = [{'id': f'cust-{i:06d}', 'name': f'Customer {i}', 'phone': f'9{i:09d}',
+                  'email': f'customer{i}@example.com', 'balance': rng.randint(0, 50000),
+                  'fuel_pump_id': pump_ids[i % pumps], 'created_at': f'{today.isoformat()}T00:00:00'}
+                 for i in range(max(rows // 20, 10))]
+    staff = [{'id': f'staff-{i:04d}', 'name': f'Staff {i}', 'phone': f'8{i:09d}', 'role': 'attendant',
+              'fuel_pump_id': pump_ids[i % pumps]} for i in range(25)]
+    vehicles = [{'id': f'veh-{i:06d}', 'customer_id': customers[i % len(customers)]['id'],
+                 'number': f'KA01AB{i:04d}', 'type': 'Truck', 'capacity': '200',
+                 'fuel_pump_id': customers[i % len(customers)]['fuel_pump_id']}
+                for i in range(len(customers) * 2)]
+
+    transactions, indents, readings, daily_readings = [], [], [], []
+    for i in range(rows):
+        day = (today - timedelta(days=rng.randrange(days))).isoformat()
+        customer = rng.choice(customers)
+        transactions.append({
+            'id': f'TRX{day.replace("-", "")}{i:010d}', 'date': day, 'customer_id': customer['id'],
+            'vehicle_id': None, 'fuel_type': rng.choice(FUEL_TYPES), 'amount': rng.randint(100, 5000),
+            'quantity': round(rng.uniform(1, 50), 2), 'payment_method': rng.choice(PAYMENT_METHODS),
+            'staff_id': rng.choice(staff)['id'], 'staff': {'name': 'Staff'}, 'fuel_pump_id': customer['fuel_pump_id']
+        })
+        if i % 4 == 0:
+            indents.append({'id': f'IND{day.replace("-", "")}{i:010d}', 'customer_id': customer['id'],
+                            'fuel_type': rng.choice(FUEL_TYPES), 'quantity': 20, 'amount': 2000,
+                            'status': 'Pending', 'date': day, 'fuel_pump_id': customer['fuel_pump_id']})
+
+    for offset in range(days):
+        day = (today - timedelta(days=offset)).isoformat()
+        for fuel in FUEL_TYPES:
+            for tank in (1, 2):
+                daily_readings.append({
+                    'id': f'dr-{day}-{fuel}-{tank}', 'date': day, 'fuel_type': fuel, 'tank_number': tank,
+                    'dip_reading': rng.uniform(50, 150), 'net_stock': 4000, 'opening_stock': 8000,
+                    'receipt_quantity': 0, 'closing_stock': 7000, 'actual_meter_sales': 1000,
+                    'fuel_pump_id': pump_id
+                })
+            readings.append({'id': f'rd-{day}-{fuel}', 'date': day, 'fuel_type': fuel, 'pump_id': f'P-{fuel}',
+                             'shift_id': None, 'staff_id': staff[0]['id'], 'opening_reading': 10000,
+                             'closing_reading': 11000, 'testing_fuel': 0, 'cash_given': 0,
+                             'fuel_pump_id': pump_id})
+
+    tank_unloads = [{'id': f'tu-{offset:04d}-{fuel}', 'date': (today - timedelta(days=offset)).isoformat(),
+                     'fuel_type': fuel, 'quantity': rng.choice((4000, 8000, 12000)), 'amount': 0,
+                     'vehicle_number': f'KA01TK{offset:04d}', 'fuel_pump_id': pump_id}
+                    for offset in range(0, days, 3) for fuel in FUEL_TYPES]
+
+    return {
+        'customers': customers,
+        'vehicles': vehicles,
+        'staff': staff,
+        'transactions': transactions,
+        'indents': indents,
+        'readings': readings,
+        'daily_readings': daily_readings,
+        'tank_unloads': tank_unloads,
+        'shifts': [],
+        'shift_consumables': [],
+        'fuel_settings': [{'id': f'fs-{fuel}', 'fuel_type': fuel, 'current_price': price, 'fuel_pump_id': pump_id}
+                          for fuel, price in zip(FUEL_TYPES, (102.5, 90.0, 76.0))],
+        'fuel_pumps': [{'id': pump, 'name': 'Bench Pump' if pump == pump_id else f'Bench Pump {pump}',
+                        'email': 'pump@example.com' if pump == pump_id else f'{pump}@example.com', 'status': 'active'}
+                       for pump in pump_ids],
+        'app_users': [],
+        'sync_changes': [],
+        'auth_users': [{'id': f'user-{i:06d}', 'email': f'pump{i}@example.com'} for i in range(rows // 10)],
+    }
+
+
+class StubState:
+    def __init__(self, data, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, slow_rate=0.0, slow_ms=0.0):
+        self.data = data
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # A slow_rate share of requests stall for an extra slow_ms, for tail latency
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = set()
+
+    def log_changes(self, table, rows, op):
+        """Mimic the sync_changes trigger; call with the lock held"""
+        if table not in SYNC_TABLES:
+            return
+        log = self.data.setdefault('sync_changes', [])
+        for row in rows:
+            log.append({'seq': len(log) + 1, 'table_name': table, 'row_id': str(row.get('id')), 'op': op,
+                        'fuel_pump_id': row.get('fuel_pump_id'),
+                        'changed_at': datetime.now(timezone.utc).isoformat()})
+
+    def delay(self):
+        latency = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if self.slow_rate and random.random() < self.slow_rate:
+            latency += self.slow_ms
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle each response would wait on a delayed ACK
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def _begin(self):
+        state = self.state
+        with state.lock:
+            state.requests += 1
+            state.connections.add(self.client_address)
+        state.delay()
+        if state.error_rate and random.random() < state.error_rate:
+            # Drain the body so the kept-alive connection stays in step
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self._send(503, {'message': 'injected failure'})
+            return None
+        url = urlparse(self.path)
+        return url.path, parse_qsl(url.query, keep_blank_values=True)
+
+    def _filter(self, rows, query):
+        order = limit = None
+        offset = 0
+        select = None
+        for key, value in query:
+            if key == 'order':
+                order = value
+            elif key == 'limit':
+                limit = int(value)
+            elif key == 'offset':
+                offset = int(value)
+            elif key == 'select':
+                select = value
+            elif key in ('and', 'or'):
+                rows = [row for row in rows if _logic(row, key, value)]
+            elif key in ('on_conflict', 'columns'):
+                continue
+            else:
+                rows = [row for row in rows if _matches(row, key, value)]
+        if order:
+            for clause in reversed(order.split(',')):
+                column, _, direction = clause.partition('.')
+                rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)),
+                              reverse=direction.startswith('desc'))
+        rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        if select and select != '*':
+            columns = [c.split(':')[0] for c in _split_top_level(select) if '(' not in c]
+            embeds = [c for c in _split_top_level(select) if '(' in c]
+            rows = [dict({c: row.get(c) for c in columns},
+                         **{e.split(':')[0].split('(')[0]: row.get(e.split(':')[0].split('(')[0]) for e in embeds})
+                    for row in rows]
+        return rows
+
+    def do_GET(self):
+        parsed = self._begin()
+        if parsed is None:
+            return
+        path, query = parsed
+        state = self.state
+        if path.startswith('/auth/v1/admin/users'):
+            params = dict(query)
+            users = state.data.get('auth_users', [])
+            if params.get('filter'):
+                users = [u for u in users if params['filter'] in u['email']]
+            page, per_page = int(params.get('page', 1)), int(params.get('per_page', 50))
+            return self._send(200, {'users': users[(page - 1) * per_page:page * per_page]})
+        table = path.rsplit('/', 1)[-1]
+        with state.lock:
+            rows = list(state.data.get(table, []))
+        self._send(200, self._filter(rows, query))
+
+    def do_POST(self):
+        parsed = self._begin()
+        if parsed is None:
+            return
+        path, query = parsed
+        body = self._body()
+        state = self.state
+        if path.startswith('/auth/v1/admin/users'):
+            with state.lock:
+                user = {'id': f'user-{len(state.data["auth_users"]):06d}', 'email': body.get('email')}
+                state.data['auth_users'].append(user)
+            return self._send(200, user)
+        if path.startswith('/rest/v1/rpc/'):
+            function = RPC_FUNCTIONS.get(path.rsplit('/', 1)[-1])
+            if function is None:
+                return self._send(200, {'function': path.rsplit('/', 1)[-1], 'args': body})
+            with state.lock:
+                status, result = function(state, body or {})
+            return self._send(status, result)
+        table = path.rsplit('/', 1)[-1]
+        rows = body if isinstance(body, list) else [body]
+        with state.lock:
+            stored = state.data.setdefault(table, [])
+            existing = {row.get('id') for row in stored} if any('id' in row for row in rows) else set()
+            created = []
+            for row in rows:
+                row = dict(row)
+                if not CHECKS.get(table, lambda _: True)(row):
+                    return self._send(400, {'code': '23514',
+                                            'message': f'new row for relation "{table}" violates check constraint'})
+                if row.get('id') in existing:
+                    if 'resolution=ignore-duplicates' in (self.headers.get('Prefer') or ''):
+                        continue
+                    return self._send(409, {'code': '23505', 'message': 'duplicate key value'})
+                row.setdefault('id', f'{table}-{len(stored) + len(created):08d}')
+                created.append(row)
+            stored.extend(created)
+            state.log_changes(table, created, 'insert')
+        self._send(201, created)
+
+    def do_PATCH(self):
+        parsed = self._begin()
+        if parsed is None:
+            return
+        path, query = parsed
+        body = self._body()
+        table = path.rsplit('/', 1)[-1]
+        with self.state.lock:
+            rows = self.state.data.get(table, [])
+            matched = [row for row in rows if all(_matches(row, k, v) for k, v in query)]
+            for row in matched:
+                row.update(body)
+            updated = [dict(row) for row in matched]
+            self.state.log_changes(table, updated, 'update')
+        self._send(200, updated)
+
+    def do_PUT(self):
+        parsed = self._begin()
+        if parsed is None:
+            return
+        path, _ = parsed
+        body = self._body()
+        self._send(200, {'id': path.rsplit('/', 1)[-1], **(body or {})})
+
+
+class RpcError(Exception):
+    pass
+
+
+def _apply_delta(state, customer_id, delta, source, source_id, enforce=False, note=None):
+    """Stand-in for apply_customer_balance_delta; call with the lock held"""
+    customer = next((c for c in state.data['customers'] if c['id'] == customer_id), None)
+    if customer is None:
+        raise RpcError(f'customer_not_found: {customer_id}')
+    ledger = state.data.setdefault('customer_ledger', [])
+    if any(e['source'] == source and e['source_id'] == source_id for e in ledger):
+        return customer.get('balance') or 0
+    balance = (customer.get('balance') or 0) + delta
+    limit = customer.get('credit_limit')
+    if enforce and delta < 0 and limit is not None and balance < -limit:
+        raise RpcError(f'credit_limit_exceeded: customer {customer_id}')
+    customer['balance'] = balance
+    ledger.append({'id': len(ledger) + 1, 'customer_id': customer_id, 'source': source, 'source_id': source_id,
+                   'delta': delta, 'balance_after': balance, 'note': note})
+    return balance
+
+
+def _rpc(function):
+    def call(state, args):
+        try:
+            return 200, function(state, args)
+        except RpcError as e:
+            return 400, {'code': 'P0001', 'message': str(e)}
+    return call
+
+
+@_rpc
+def _record_transactions(state, args):
+    stored = state.data.setdefault('transactions', [])
+    existing = {row['id']: row for row in stored}
+    inserted, returned = [], []
+    for row in args['p_rows']:
+        if row.get('id') in existing:
+            returned.append(dict(existing[row['id']]))
+            continue
+        if row.get('customer_id') and row.get('fuel_type') != 'PAYMENT':
+            _apply_delta(state, row['customer_id'], -float(row.get('amount') or 0), 'transaction', row['id'],
+                         args.get('p_enforce_credit_limit', True))
+        inserted.append(dict(row))
+        returned.append(dict(row))
+    stored.extend(inserted)
+    state.log_changes('transactions', inserted, 'insert')
+    return returned
+
+
+@_rpc
+def _record_customer_payment(state, args):
+    payments = state.data.setdefault('customer_payments', [])
+    payment = dict(args['p_payment'], id=f'pay-{len(payments):08d}')
+    balance = _apply_delta(state, payment['customer_id'], float(payment['amount']), 'payment', payment['id'])
+    payments.append(payment)
+    return [{'payment': payment, 'balance': balance}]
+
+
+@_rpc
+def _apply_customer_balance_delta(state, args):
+    return _apply_delta(state, args['p_customer_id'], float(args['p_delta']), args['p_source'],
+                        args['p_source_id'], args.get('p_enforce_credit_limit', False), args.get('p_note'))
+
+
+@_rpc
+def _close_shift(state, args):
+    shift = next((s for s in state.data['shifts'] if s['id'] == args['p_shift_id']), None)
+    if shift is None:
+        raise RpcError(f"shift_not_found: {args['p_shift_id']}")
+    if shift.get('status') == 'completed':
+        raise RpcError(f"shift_already_closed: {args['p_shift_id']}")
+    payload = args['p_payload']
+    amounts = {field: float(payload.get(field) or 0) for field in (
+        'cash_remaining', 'cash_sales', 'card_sales', 'upi_sales', 'indent_sales', 'expenses', 'consumable_expenses')}
+    prices = {f['fuel_type']: f['current_price'] for f in state.data.get('fuel_settings', [])}
+
+    # Validate everything first so a failure leaves no partial update, as in the database
+    matched = []
+    for item in payload.get('readings', []):
+        found = [r for r in state.data['readings'] if r.get('shift_id') == shift['id'] and (
+            r['id'] == item['id'] if 'id' in item else r.get('fuel_type') == item.get('fuel_type'))]
+        if not found:
+            raise RpcError(f"reading_not_found: {item.get('id') or item.get('fuel_type')}")
+        if len(found) > 1:
+            raise RpcError(f"ambiguous_reading: {item.get('fuel_type')} has {len(found)} readings in the shift")
+        reading = found[0]
+        if float(item['closing_reading']) <= float(reading.get('opening_reading') or 0):
+            raise RpcError('invalid_closing_reading: closing must be greater than opening')
+        matched.append((reading, item))
+
+    # Shift totals go on the first closed reading only
+    readings, fuel, expected = [], [], 0.0
+    for index, (reading, item) in enumerate(matched):
+        reading.update({field: amount if index == 0 else 0.0 for field, amount in amounts.items()},
+                       closing_reading=item['closing_reading'], testing_fuel=item.get('testing_fuel') or 0)
+        litres = max(float(reading['closing_reading']) - float(reading['opening_reading']) - reading['testing_fuel'], 0)
+        price = prices.get(reading.get('fuel_type'))
+        expected += litres * (price or 0)
+        readings.append(dict(reading))
+        fuel.append({'reading_id': reading['id'], 'fuel_type': reading.get('fuel_type'), 'litres': litres,
+                     'price': price, 'amount': litres * (price or 0)})
+    for item in payload.get('consumables', []):
+        for consumable in state.data.get('shift_consumables', []):
+            if consumable['id'] == item['id'] and consumable.get('shift_id') == shift['id']:
+                consumable.update(quantity_returned=item['quantity_returned'], status='returned')
+    shift.update(status='completed', cash_remaining=amounts['cash_remaining'],
+                 end_time=payload.get('end_time') or datetime.now(timezone.utc).isoformat())
+    state.log_changes('readings', readings, 'update')
+
+    reported = amounts['cash_sales'] + amounts['card_sales'] + amounts['upi_sales'] + amounts['indent_sales']
+    return {
+        'shift': dict(shift), 'readings': readings, 'fuel': fuel,
+        'total_litres': sum(f['litres'] for f in fuel), 'expected_sales': expected,
+        'reported_sales': reported, 'sales_difference': reported - expected,
+        'cash_discrepancy': amounts['cash_remaining'] - amounts['cash_sales'] + amounts['expenses']
+    }
+
+
+RPC_FUNCTIONS = {
+    'close_shift': _close_shift,
+    'record_transactions': _record_transactions,
+    'record_customer_payment': _record_customer_payment,
+    'apply_customer_balance_delta': _apply_customer_balance_delta,
+}
+
+
+def start(data=None, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+          slow_rate=0.0, slow_ms=0.0):
+    """Start the stub on a background thread and return (server, state)"""
+    state = StubState(data if data is not None else seed_dataset(), latency_ms, jitter_ms, error_rate,
+                      slow_rate, slow_ms)
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--rows', type=int, default=10000, help='transactions to seed')
+    parser.add_argument('--days', type=int, default=90, help='days of history to spread rows over')
+    parser.add_argument('--pumps', type=int, default=1, help='fuel pumps to spread customers and staff over')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of requests that stall')
+    parser.add_argument('--slow-ms', type=float, default=0.0, help='extra latency of a stalled request')
+    args = parser.parse_args()
+
+    server, _ = start(seed_dataset(args.rows, args.days, pumps=args.pumps), args.host, args.port,
+                      args.latency_ms, args.jitter_ms, args.error_rate, args.slow_rate, args.slow_ms)
+    print(f"Stub Supabase listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
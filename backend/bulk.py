@@ -0,0 +1,77 @@
+import os
+
+import requests
+
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', 10000))
+
+# PostgREST answers these when the rows themselves are rejected (bad values, constraint violations)
+ROW_ERROR_STATUSES = (400, 409, 422)
+
+
+def read_batch(payload):
+    """Accept either a JSON array or {"rows": [...]} and return the row list"""
+    rows = payload.get('rows') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError('Expected a JSON array of rows or an object with a "rows" array')
+    if not rows:
+        raise ValueError('No rows provided')
+    if len(rows) > BULK_MAX_ROWS:
+        raise ValueError(f'At most {BULK_MAX_ROWS} rows can be sent in one batch')
+    return rows
+
+
+def validate_row(row, required=(), numeric=()):
+    """Return a list of problems with one incoming row (empty when valid)"""
+    if not isinstance(row, dict):
+        return ['Row must be a JSON object']
+
+    errors = []
+    for field in required:
+        if row.get(field) in (None, ''):
+            errors.append(f'{field} is required')
+    for field in numeric:
+        value = row.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                errors.append(f'{field} must be a number')
+    return errors
+
+
+def insert_chunks(post_many, table, records, chunk_size=BULK_CHUNK_SIZE):
+    """Insert records as array POSTs and return one (ok, row_or_error) per record.
+
+    post_many(table, rows) must return (ok, rows_or_error), with ok False only
+    when upstream rejected the rows, and raise requests.RequestException for
+    anything else. PostgREST inserts an array atomically, so a rejected chunk
+    is split in half and retried until the offending rows are isolated; the
+    good rows around them still go through. A chunk that fails upstream is
+    reported as failed row by row without being split.
+    """
+    results = [None] * len(records)
+
+    def insert(start, end):
+        try:
+            ok, body = post_many(table, records[start:end])
+        except requests.RequestException as e:
+            for index in range(start, end):
+                results[index] = (False, f'Upstream unavailable: {type(e).__name__}')
+            return
+        if ok:
+            for offset, row in enumerate(body):
+                results[start + offset] = (True, row)
+            return
+        if end - start == 1:
+            results[start] = (False, body)
+            return
+        middle = (start + end) // 2
+        insert(start, middle)
+        insert(middle, end)
+
+    for start in range(0, len(records), chunk_size):
+        insert(start, min(start + chunk_size, len(records)))
+    return results
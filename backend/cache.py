@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+# Rows one fuel pump's reads may hold, so a large station cannot evict everyone else's entries
+CACHE_TENANT_MAX_ROWS = int(os.environ.get('CACHE_TENANT_MAX_ROWS', 20000))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+CACHE_REDIS_CHANNEL = os.environ.get('CACHE_REDIS_CHANNEL', 'fuel-pump-erp:cache')
+
+# Seconds a cached read stays fresh, per table
+CACHE_TTLS = {
+    'customers': float(os.environ.get('CACHE_TTL_CUSTOMERS', 60)),
+    'vehicles': float(os.environ.get('CACHE_TTL_VEHICLES', 120)),
+    'staff': float(os.environ.get('CACHE_TTL_STAFF', 300)),
+    'fuel_pumps': float(os.environ.get('CACHE_TTL_FUEL_PUMPS', 300)),
+}
+
+
+def make_key(table, params=None):
+    """Build a hashable cache key from a table name and query params"""
+    return table, tuple(sorted((params or {}).items()))
+
+
+def tenant_of(params):
+    """The fuel pump filter of a read, which names its cache partition"""
+    return (params or {}).get('fuel_pump_id')
+
+
+class TTLCache:
+    """Bounded LRU cache with per-table expiry and hit/miss counters
+
+    Entries are partitioned by their fuel pump filter. Each partition holds at
+    most `tenant_max_rows` rows and evicts its own least recently used entries
+    first, so one fuel pump's reads cannot push out the others'.
+    """
+
+    def __init__(self, ttls=None, max_entries=CACHE_MAX_ENTRIES, bus=None, tenant_max_rows=CACHE_TENANT_MAX_ROWS):
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self.tenant_max_rows = tenant_max_rows
+        self.bus = bus
+        self._entries = OrderedDict()
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+
+        if self.bus is not None:
+            self.bus.subscribe(self._invalidate_local)
+
+    def get(self, table, params=None):
+        """Return (found, value) for a cached read"""
+        if self.bus is not None:
+            self.bus.start()
+        key = make_key(table, params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._partitions[entry[2]][0].move_to_end(key)
+                self.hits[table] = self.hits.get(table, 0) + 1
+                return True, entry[1]
+            if entry is not None:
+                self._drop(key)
+            self.misses[table] = self.misses.get(table, 0) + 1
+        return False, None
+
+    def set(self, table, params, value):
+        """Store a read result, evicting the least recently used entries"""
+        ttl = self.ttls.get(table, 0)
+        if ttl <= 0:
+            return
+        rows = len(value) if isinstance(value, list) else 1
+        if rows > self.tenant_max_rows:
+            return
+        key = make_key(table, params)
+        tenant = tenant_of(params)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            keys, held = self._partitions.get(tenant, (OrderedDict(), 0))
+            keys[key] = rows
+            self._partitions[tenant] = (keys, held + rows)
+            self._entries[key] = (time.monotonic() + ttl, value, tenant)
+            while self._partitions[tenant][1] > self.tenant_max_rows:
+                self._drop(next(iter(self._partitions[tenant][0])))
+                self.evictions += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        # Called with the lock held
+        tenant = self._entries.pop(key)[2]
+        keys, held = self._partitions[tenant]
+        held -= keys.pop(key)
+        if keys:
+            self._partitions[tenant] = (keys, held)
+        else:
+            del self._partitions[tenant]
+
+    def invalidate(self, table, params=None):
+        """Drop cached reads for a table (or one query) here and on the shared bus"""
+        self._invalidate_local(table, params)
+        if self.bus is not None:
+            self.bus.publish(table, params)
+
+    def _invalidate_local(self, table, params=None):
+        with self._lock:
+            if params is not None:
+                key = make_key(table, params)
+                if key in self._entries:
+                    self._drop(key)
+                return
+            for key in [k for k in self._entries if k[0] == table]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+
+    def stats(self):
+        """Return hit/miss counters per table and the current size"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'tenants': len(self._partitions),
+                'evictions': self.evictions,
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+            }
+
+
+class RedisInvalidationBus:
+    """Broadcast cache invalidations between worker processes over Redis pub/sub"""
+
+    def __init__(self, url, channel=CACHE_REDIS_CHANNEL):
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._callbacks = []
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        self._origin = None
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork, so each worker starts its own listener
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._origin = f"{pid}:{id(self)}"
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self._on_message})
+            pubsub.run_in_thread(sleep_time=1, daemon=True)
+            self._listener_pid = pid
+
+    def _on_message(self, message):
+        try:
+            payload = json.loads(message['data'])
+        except (TypeError, ValueError):
+            return
+        if payload.get('origin') == self._origin:
+            return
+        for callback in self._callbacks:
+            callback(payload['table'], payload.get('params'))
+
+    def publish(self, table, params=None):
+        self._ensure_listener()
+        payload = {'origin': self._origin, 'table': table, 'params': params}
+        try:
+            self.client.publish(self.channel, json.dumps(payload))
+        except redis.RedisError as e:
+            print(f"Warning: Failed to publish cache invalidation: {e}")
+
+    def start(self):
+        self._ensure_listener()
+
+
+def create_cache():
+    """Build the master-data cache, shared over Redis when configured"""
+    bus = None
+    if CACHE_REDIS_URL:
+        if redis is None:
+            print("Warning: CACHE_REDIS_URL is set but the redis package is not installed")
+        else:
+            bus = RedisInvalidationBus(CACHE_REDIS_URL)
+    return TTLCache(CACHE_TTLS, bus=bus)
@@ -0,0 +1,187 @@
+import csv
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+EXPORT_MAX_RANGE_DAYS = int(os.environ.get('EXPORT_MAX_RANGE_DAYS', 400))
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# Per table: PostgREST select and the (header, row path) of each export column
+EXPORT_TABLES = {
+    'transactions': {
+        'select': ('id,date,customer_id,fuel_type,quantity,amount,discount_amount,payment_method,indent_id,'
+                   'source,approval_status,customer:customer_id(name),vehicle:vehicle_id(number),'
+                   'staff:staff_id(name)'),
+        'columns': (
+            ('Transaction ID', 'id'), ('Date', 'date'), ('Customer ID', 'customer_id'),
+            ('Customer', 'customer.name'), ('Vehicle', 'vehicle.number'), ('Fuel Type', 'fuel_type'),
+            ('Quantity', 'quantity'), ('Amount', 'amount'), ('Discount', 'discount_amount'),
+            ('Payment Method', 'payment_method'), ('Staff', 'staff.name'), ('Indent ID', 'indent_id'),
+            ('Source', 'source'), ('Approval Status', 'approval_status'),
+        ),
+    },
+    'indents': {
+        'select': ('id,indent_number,date,customer_id,fuel_type,quantity,amount,discount_amount,status,'
+                   'approval_status,customer:customer_id(name),vehicle:vehicle_id(number)'),
+        'columns': (
+            ('Indent ID', 'id'), ('Indent Number', 'indent_number'), ('Date', 'date'),
+            ('Customer ID', 'customer_id'), ('Customer', 'customer.name'), ('Vehicle', 'vehicle.number'),
+            ('Fuel Type', 'fuel_type'), ('Quantity', 'quantity'), ('Amount', 'amount'),
+            ('Discount', 'discount_amount'), ('Status', 'status'), ('Approval Status', 'approval_status'),
+        ),
+    },
+}
+
+# Spreadsheet apps run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def export_params(table, start, end, customer_id=None, fuel_pump_id=None):
+    """PostgREST params selecting one table's export rows for a date range"""
+    params = {
+        'select': EXPORT_TABLES[table]['select'],
+        'and': f'(date.gte.{start},date.lte.{end})'
+    }
+    if customer_id:
+        params['customer_id'] = f'eq.{customer_id}'
+    if fuel_pump_id:
+        params['fuel_pump_id'] = f'eq.{fuel_pump_id}'
+    return params
+
+
+def _value(row, path):
+    for part in path.split('.'):
+        if not isinstance(row, dict):
+            return None
+        row = row.get(part)
+    return row
+
+
+def iter_records(pages, table):
+    """Turn pages of upstream rows into pages of export value lists"""
+    paths = [path for _, path in EXPORT_TABLES[table]['columns']]
+    for rows in pages:
+        yield [[_value(row, path) for path in paths] for row in rows]
+
+
+def headers(table):
+    return [header for header, _ in EXPORT_TABLES[table]['columns']]
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(table, record_pages):
+    """Encode export pages as CSV, one chunk per page"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers(table))
+    for records in record_pages:
+        writer.writerows([_csv_cell(value) for value in record] for record in records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="xl/workbook.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+     '</Relationships>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+     '</Relationships>'),
+)
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_INVALID.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_rows(records):
+    return ''.join('<row>' + ''.join(_xlsx_cell(value) for value in record) + '</row>' for record in records)
+
+
+def stream_xlsx(table, record_pages):
+    """Encode export pages as a single-sheet XLSX workbook, streamed as it is zipped
+
+    The worksheet is written as inline strings into a zip entry opened for
+    streaming, so only the current page is ever held in memory.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS:
+            archive.writestr(name, content)
+        archive.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(table.title())}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        )
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_rows([headers(table)])
+            ).encode('utf-8'))
+            for records in record_pages:
+                sheet.write(_xlsx_rows(records).encode('utf-8'))
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
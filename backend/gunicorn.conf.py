@@ -0,0 +1,90 @@
+"""Gunicorn settings for the backend; every value can be overridden from the environment.
+
+    gunicorn --config gunicorn.conf.py wsgi:application
+"""
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+
+bind = os.environ.get('BIND', f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}")
+
+# Routes spend most of their time waiting on Supabase, so each process runs
+# several threads; processes spread the Python work over every core
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+wsgi_app = 'wsgi:application'
+
+# Workers share their metrics through this directory, so any worker can answer a scrape for all of them.
+# It is set before the app is imported, which reads it
+if 'METRICS_DIR' not in os.environ:
+    os.environ['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f'fuel_pump_erp_metrics_{os.getpid()}')
+    _owns_metrics_dir = True
+else:
+    _owns_metrics_dir = False
+
+# The nightly rollups are computed by one worker; the others read them from this directory
+if workers > 1 and not os.environ.get('REPORT_ROLLUP_DIR'):
+    os.environ['REPORT_ROLLUP_DIR'] = os.path.join(tempfile.gettempdir(), f'fuel_pump_erp_rollups_{os.getpid()}')
+    _owns_rollup_dir = True
+else:
+    _owns_rollup_dir = False
+
+
+def post_worker_init(worker):
+    """Flip readiness on shutdown and open the worker's first Supabase connection"""
+    import app as backend
+
+    # Gunicorn's own handler stops accepting and lets in-flight requests finish
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        backend.health.start_draining()
+        if callable(stop):
+            stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+    # Sockets cannot be shared across fork, so each worker warms its own pool
+    if not backend.supabase.ping():
+        worker.log.warning('Supabase is not reachable yet; /readyz will report unavailable')
+
+    # Start this worker's job threads now rather than on its first request
+    backend.scheduler.ensure_started()
+    # Replays writes journaled before a crash or restart
+    backend.journal.ensure_started()
+    backend.metrics_registry.ensure_writer()
+
+
+def worker_exit(server, worker):
+    """Let running background jobs and journal flushes finish before the worker exits"""
+    import app as backend
+
+    backend.scheduler.stop(timeout=float(os.environ.get('JOBS_SHUTDOWN_SECONDS', 10)))
+    backend.journal.stop()
+    backend.metrics_registry.discard()
+
+
+def on_exit(server):
+    """Remove the metrics and rollup directories created for this run"""
+    if _owns_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    if _owns_rollup_dir:
+        shutil.rmtree(os.environ['REPORT_ROLLUP_DIR'], ignore_errors=True)
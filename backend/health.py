@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+READY_CHECK_SECONDS = float(os.environ.get('READY_CHECK_SECONDS', 5))
+READY_CHECK_TIMEOUT = float(os.environ.get('READY_CHECK_TIMEOUT', 2))
+
+
+class Health:
+    """Liveness and readiness state for one worker process
+
+    Readiness needs Supabase to be reachable and the worker not to be
+    draining. The upstream check result is reused for READY_CHECK_SECONDS so
+    frequent probes do not turn into upstream traffic.
+    """
+
+    def __init__(self, check):
+        self.check = check
+        self.started_at = time.time()
+        self._draining = threading.Event()
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._upstream_ok = False
+
+    def start_draining(self):
+        """Report not-ready from now on so load balancers stop sending new requests"""
+        self._draining.set()
+
+    @property
+    def draining(self):
+        return self._draining.is_set()
+
+    def upstream_ok(self):
+        now = time.monotonic()
+        if now - self._checked_at >= READY_CHECK_SECONDS and self._lock.acquire(blocking=False):
+            try:
+                self._upstream_ok = self.check(READY_CHECK_TIMEOUT)
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._upstream_ok
+
+    def readiness(self):
+        """Return (ready, details) for the readiness endpoint"""
+        if self.draining:
+            return False, {'status': 'draining'}
+        if not self.upstream_ok():
+            return False, {'status': 'unavailable', 'upstream': 'unreachable'}
+        return True, {'status': 'ready', 'upstream': 'ok'}
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+COMPRESS_MIMETYPES = frozenset(['application/json', 'application/x-ndjson', 'text/csv', 'text/plain'])
+
+
+def _choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def install(app):
+    """Add ETag validation, 304 answers and gzip/brotli compression to GET responses"""
+    from flask import request
+
+    @app.after_request
+    def _conditional_and_compress(response):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+
+        if response.is_streamed:
+            if request.accept_encodings.quality('gzip') > 0 and response.mimetype in COMPRESS_MIMETYPES:
+                response.response = _gzip_stream(response.response)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.headers.pop('Content-Length', None)
+                response.vary.add('Accept-Encoding')
+            return response
+
+        if response.direct_passthrough or response.mimetype not in COMPRESS_MIMETYPES:
+            return response
+
+        body = response.get_data()
+        if not response.get_etag()[0]:
+            response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest(), weak=True)
+        response.vary.add('Accept-Encoding')
+
+        # Answers If-None-Match with an empty 304
+        response = response.make_conditional(request)
+        if response.status_code != 200 or len(body) < COMPRESS_MIN_SIZE:
+            return response
+
+        encoding = _choose_encoding(request.accept_encodings)
+        if encoding == 'br':
+            response.set_data(brotli.compress(body, quality=min(COMPRESS_LEVEL, 11)))
+        elif encoding == 'gzip':
+            response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+        else:
+            return response
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,86 @@
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime
+
+# Host number (0-1679615). Set a distinct one per host when several hosts write ids;
+# the host name hash used otherwise can collide
+ID_NODE = os.environ.get('ID_NODE', '')
+
+SEQUENCE_DIGITS = 4
+MAX_SEQUENCE = 10 ** SEQUENCE_DIGITS - 1
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _base36(value, width):
+    digits = []
+    for _ in range(width):
+        value, remainder = divmod(value, 36)
+        digits.append(BASE36[remainder])
+    return ''.join(reversed(digits))
+
+
+def _node_id():
+    """Host number plus pid, so ids are unique per process on a host, and across hosts with ID_NODE"""
+    if ID_NODE:
+        host = int(ID_NODE) % 36 ** 4
+    else:
+        host = zlib.crc32(socket.gethostname().encode('utf-8')) % 36 ** 4
+    return _base36(host, 4) + _base36(os.getpid() % 36 ** 5, 5)
+
+
+class IdGenerator:
+    """Monotonic, k-sortable record ids.
+
+    Layout: PREFIX + YYYYmmddHHMMSS + milliseconds + node + sequence. The leading
+    timestamp keeps the legacy PREFIX + YYYYmmddHHMMSS ordering, the node makes
+    ids from different processes (and from hosts with distinct ID_NODE values)
+    disjoint, and the per-millisecond sequence makes ids from one process
+    unique and increasing.
+    """
+
+    def __init__(self, node=None):
+        self._fixed_node = node
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self.node = self._fixed_node or _node_id()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _next_tick(self):
+        """Return (millisecond, sequence), never going backwards"""
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock stepped back: keep counting
+                self._sequence += 1
+            else:
+                # Sequence exhausted for this millisecond: borrow the next one
+                self._last_ms += 1
+                self._sequence = 0
+            return self._last_ms, self._sequence
+
+    def new_id(self, prefix):
+        ms, sequence = self._next_tick()
+        seconds, millis = divmod(ms, 1000)
+        stamp = datetime.fromtimestamp(seconds).strftime('%Y%m%d%H%M%S')
+        return f"{prefix}{stamp}{millis:03d}{self.node}{sequence:0{SEQUENCE_DIGITS}d}"
+
+
+generator = IdGenerator()
+
+# Forked workers must not reuse the parent's node id or sequence
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=generator._reset)
+
+
+def new_id(prefix):
+    """Return a new unique id such as TRX20250101120000123abcd0042f0000"""
+    return generator.new_id(prefix)
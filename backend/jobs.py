@@ -0,0 +1,282 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from metrics import job_delay, job_latency, job_runs, registry
+
+JOBS_ENABLED = os.environ.get('JOBS_ENABLED', 'true').lower() == 'true'
+JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', os.path.join(tempfile.gettempdir(), 'fuel_pump_erp_jobs.sqlite3'))
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+JOBS_POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', 1))
+JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+JOBS_BACKOFF_SECONDS = float(os.environ.get('JOBS_BACKOFF_SECONDS', 2))
+JOBS_BACKOFF_MAX_SECONDS = float(os.environ.get('JOBS_BACKOFF_MAX_SECONDS', 300))
+# A job still marked running after this long is assumed lost with its process
+JOBS_LEASE_SECONDS = float(os.environ.get('JOBS_LEASE_SECONDS', 300))
+JOBS_RETAIN_DAYS = int(os.environ.get('JOBS_RETAIN_DAYS', 7))
+# Local time at which the nightly precomputation jobs run, and how many days back they cover
+JOBS_NIGHTLY_AT = os.environ.get('JOBS_NIGHTLY_AT', '02:00')
+JOBS_PRECOMPUTE_DAYS = int(os.environ.get('JOBS_PRECOMPUTE_DAYS', 7))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    locked_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_due_idx ON jobs (status, run_at);
+"""
+
+
+class JobQueue:
+    """Durable job queue in a local SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread and process; connections are not fork-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, name, payload=None, delay=0.0, dedupe_key=None):
+        """Add a job; returns its id, or None when dedupe_key was already queued"""
+        now = time.time()
+        cursor = self._connection().execute(
+            'INSERT OR IGNORE INTO jobs (name, payload, dedupe_key, run_at, created_at) VALUES (?, ?, ?, ?, ?)',
+            (name, json.dumps(payload or {}), dedupe_key, now + delay, now)
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def claim(self):
+        """Mark the next due job as running and return it, or None"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? ORDER BY run_at LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', locked_at = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (now, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        job = dict(row)
+        job['attempts'] += 1
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def complete(self, job_id):
+        self._connection().execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, locked_at = NULL WHERE id = ?", (time.time(), job_id))
+
+    def retry(self, job_id, error, delay):
+        self._connection().execute(
+            "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, locked_at = NULL WHERE id = ?",
+            (time.time() + delay, error, job_id))
+
+    def fail(self, job_id, error):
+        self._connection().execute(
+            "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ?, locked_at = NULL WHERE id = ?",
+            (error, time.time(), job_id))
+
+    def requeue_stale(self, lease=JOBS_LEASE_SECONDS):
+        """Return jobs whose process died mid-run to the queue"""
+        return self._connection().execute(
+            "UPDATE jobs SET status = 'pending', locked_at = NULL WHERE status = 'running' AND locked_at < ?",
+            (time.time() - lease,)).rowcount
+
+    def purge(self, retain_days=JOBS_RETAIN_DAYS):
+        """Delete finished jobs older than the retention window"""
+        return self._connection().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - retain_days * 86400,)).rowcount
+
+    def counts(self):
+        rows = self._connection().execute('SELECT name, status, COUNT(*) AS n FROM jobs GROUP BY name, status')
+        return [(row['name'], row['status'], row['n']) for row in rows]
+
+
+def backoff_delay(attempt, base=JOBS_BACKOFF_SECONDS, cap=JOBS_BACKOFF_MAX_SECONDS):
+    """Exponential backoff with jitter for the given (1-based) attempt"""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+class Scheduler:
+    """In-process job runner: a worker thread pool over the durable queue plus periodic jobs
+
+    Threads are started lazily in each process (and again after a fork), so
+    the scheduler can be created at import time under a preforking server.
+    Shared periodic jobs are enqueued once per period across all processes;
+    process-local ones run in every process, for warming in-memory state.
+    """
+
+    def __init__(self, queue=None, workers=JOBS_WORKERS, enabled=JOBS_ENABLED):
+        self.queue = queue or JobQueue()
+        self.workers = workers
+        self.enabled = enabled
+        self._handlers = {}
+        self._periodic = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        registry.register_collector(self._collect)
+
+    def task(self, name, max_attempts=JOBS_MAX_ATTEMPTS):
+        """Register the decorated function as the handler for jobs called name"""
+        def register(fn):
+            self._handlers[name] = (fn, max_attempts)
+            return fn
+        return register
+
+    def daily(self, name, at='02:00', shared=True, payload=None):
+        """Run a registered job every day at local time HH:MM"""
+        hour, minute = (int(part) for part in at.split(':'))
+        self._periodic.append({'name': name, 'hour': hour, 'minute': minute, 'shared': shared,
+                               'payload': payload or {}, 'next': None})
+
+    def defer(self, name, delay=0.0, dedupe_key=None, **payload):
+        """Queue a job to run off the request path; runs inline when the scheduler is disabled"""
+        if not self.enabled:
+            try:
+                self._execute(name, payload)
+            except Exception as e:
+                print(f"Warning: Job {name} failed: {e}")
+                job_runs.inc(job=name, outcome='failed')
+            return None
+        self.ensure_started()
+        return self.queue.enqueue(name, payload, delay, dedupe_key)
+
+    def ensure_started(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._threads = [threading.Thread(target=self._work, name=f'jobs-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._tick, name='jobs-ticker', daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop this process's threads; a job cut short is retried once its lease expires"""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _execute(self, name, payload):
+        fn, _ = self._handlers[name]
+        start = time.perf_counter()
+        try:
+            fn(**payload)
+        finally:
+            job_latency.observe(time.perf_counter() - start, job=name)
+        job_runs.inc(job=name, outcome='success')
+
+    def run_job(self, job):
+        """Run one claimed job and record its outcome in the queue"""
+        name = job['name']
+        job_delay.observe(max(0.0, time.time() - job['run_at']), job=name)
+        if name not in self._handlers:
+            self.queue.fail(job['id'], f'No handler registered for {name}')
+            job_runs.inc(job=name, outcome='failed')
+            return
+        try:
+            self._execute(name, job['payload'])
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            if job['attempts'] >= self._handlers[name][1]:
+                print(f"Warning: Job {name} ({job['id']}) failed permanently: {error}")
+                traceback.print_exc()
+                self.queue.fail(job['id'], error)
+                job_runs.inc(job=name, outcome='failed')
+            else:
+                self.queue.retry(job['id'], error, backoff_delay(job['attempts']))
+                job_runs.inc(job=name, outcome='retried')
+            return
+        self.queue.complete(job['id'])
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"Warning: Job queue unavailable: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(JOBS_POLL_SECONDS)
+                continue
+            self.run_job(job)
+
+    def _next_run(self, entry, now):
+        run = now.replace(hour=entry['hour'], minute=entry['minute'], second=0, microsecond=0)
+        return run if run > now else run + timedelta(days=1)
+
+    def _tick(self):
+        for entry in self._periodic:
+            entry['next'] = self._next_run(entry, datetime.now())
+        while not self._stop.wait(JOBS_POLL_SECONDS):
+            now = datetime.now()
+            for entry in self._periodic:
+                if now < entry['next']:
+                    continue
+                period = entry['next'].strftime('%Y-%m-%d')
+                entry['next'] = self._next_run(entry, now)
+                try:
+                    if entry['shared']:
+                        self.queue.enqueue(entry['name'], entry['payload'], dedupe_key=f"{entry['name']}:{period}")
+                    else:
+                        self._execute(entry['name'], entry['payload'])
+                except Exception as e:
+                    print(f"Warning: Periodic job {entry['name']} failed: {e}")
+                    job_runs.inc(job=entry['name'], outcome='failed')
+            try:
+                self.queue.requeue_stale()
+            except sqlite3.Error:
+                pass
+
+    def _collect(self):
+        lines = [
+            '# HELP jobs_queued Jobs in the local queue by name and status',
+            '# TYPE jobs_queued gauge'
+        ]
+        try:
+            counts = self.queue.counts()
+        except sqlite3.Error:
+            counts = []
+        for name, status, count in counts:
+            lines.append(f'jobs_queued{{job="{name}",status="{status}"}} {count}')
+        return lines
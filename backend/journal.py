@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from jobs import backoff_delay
+from metrics import journal_flush_lag, journal_flushes, registry
+
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'false').lower() == 'true'
+JOURNAL_DB_PATH = os.environ.get(
+    'JOURNAL_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'write_journal.sqlite3'))
+JOURNAL_BATCH_SIZE = int(os.environ.get('JOURNAL_BATCH_SIZE', 100))
+JOURNAL_FLUSH_SECONDS = float(os.environ.get('JOURNAL_FLUSH_SECONDS', 0.5))
+JOURNAL_MAX_ATTEMPTS = int(os.environ.get('JOURNAL_MAX_ATTEMPTS', 50))
+JOURNAL_BACKOFF_SECONDS = float(os.environ.get('JOURNAL_BACKOFF_SECONDS', 1))
+JOURNAL_BACKOFF_MAX_SECONDS = float(os.environ.get('JOURNAL_BACKOFF_MAX_SECONDS', 60))
+# A batch still marked flushing after this long is assumed lost with its process
+JOURNAL_LEASE_SECONDS = float(os.environ.get('JOURNAL_LEASE_SECONDS', 120))
+JOURNAL_RETAIN_HOURS = float(os.environ.get('JOURNAL_RETAIN_HOURS', 24))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    record TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL DEFAULT 0,
+    locked_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    flushed_at REAL
+);
+CREATE INDEX IF NOT EXISTS journal_status_idx ON journal (status, seq);
+CREATE INDEX IF NOT EXISTS journal_table_idx ON journal (table_name, status);
+"""
+
+
+class WriteJournal:
+    """Durable local journal of writes that are acknowledged before Supabase has them
+
+    Each append is committed to a SQLite WAL file with a full sync before the
+    write is acknowledged. A flusher thread per process sends pending records
+    upstream in batches, oldest first, through idempotent inserts keyed by the
+    record id, so a batch replayed after a crash or an ambiguous failure does
+    not create duplicates.
+    """
+
+    def __init__(self, path=JOURNAL_DB_PATH, enabled=WRITE_BEHIND, batch_size=JOURNAL_BATCH_SIZE):
+        self.path = path
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self._flushers = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        registry.register_collector(self._collect)
+
+    def _connection(self):
+        # One connection per thread and process; connections are not fork-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, table, flush, on_flushed=None):
+        """Journal writes to table; flush(table, records) must return (ok, body) and be idempotent"""
+        self._flushers[table] = (flush, on_flushed)
+
+    def handles(self, table):
+        return self.enabled and table in self._flushers
+
+    def append(self, table, record):
+        """Durably record a write; the record must carry its final id"""
+        self._connection().execute(
+            'INSERT INTO journal (table_name, record_id, record, created_at) VALUES (?, ?, ?, ?)',
+            (table, str(record['id']), json.dumps(record, default=str), time.time()))
+        self.ensure_started()
+
+    def pending(self, table, match=None):
+        """Records for table not yet confirmed upstream, optionally filtered by column equality"""
+        rows = self._connection().execute(
+            "SELECT record FROM journal WHERE table_name = ? AND status IN ('pending', 'flushing') ORDER BY seq",
+            (table,))
+        records = [json.loads(row['record']) for row in rows]
+        if match:
+            records = [record for record in records
+                       if all(str(record.get(column)) == str(value) for column, value in match.items())]
+        return records
+
+    def claim(self):
+        """Mark the next due batch as flushing and return its entries
+
+        A batch is a run of one table's entries in journal order. Entries that
+        already failed once are retried on their own, so a record the database
+        rejects cannot hold back the others.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                "SELECT seq, table_name, record, attempts, created_at FROM journal "
+                "WHERE status = 'pending' AND next_at <= ? ORDER BY seq LIMIT ?", (now, self.batch_size)
+            ).fetchall()
+            batch = []
+            for row in rows:
+                if batch and (row['table_name'] != batch[0]['table_name'] or row['attempts'] or batch[0]['attempts']):
+                    break
+                batch.append(row)
+            if batch:
+                conn.executemany("UPDATE journal SET status = 'flushing', locked_at = ?, attempts = attempts + 1 "
+                                 "WHERE seq = ?", [(now, row['seq']) for row in batch])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [dict(row, record=json.loads(row['record']), attempts=row['attempts'] + 1) for row in batch]
+
+    def _update(self, sql, entries, *args):
+        self._connection().executemany(sql, [(*args, entry['seq']) for entry in entries])
+
+    def flush_once(self):
+        """Flush one batch; returns the number of entries attempted"""
+        entries = self.claim()
+        if not entries:
+            return 0
+        table = entries[0]['table_name']
+        flush, on_flushed = self._flushers.get(table, (None, None))
+        records = [entry['record'] for entry in entries]
+        if flush is None:
+            ok, body = False, f'No flusher registered for {table}'
+        else:
+            try:
+                ok, body = flush(table, records)
+            except Exception as e:
+                ok, body = False, f'{type(e).__name__}: {e}'
+
+        now = time.time()
+        if ok:
+            self._update("UPDATE journal SET status = 'flushed', flushed_at = ?, locked_at = NULL WHERE seq = ?",
+                         entries, now)
+            journal_flushes.inc(len(entries), table=table, outcome='flushed')
+            for entry in entries:
+                journal_flush_lag.observe(now - entry['created_at'], table=table)
+            if on_flushed is not None:
+                on_flushed(records)
+            return len(entries)
+
+        error = str(body)[:1000]
+        if entries[0]['attempts'] >= JOURNAL_MAX_ATTEMPTS:
+            print(f"Warning: Giving up on journaled {table} write {records[0].get('id')}: {error}")
+            self._update("UPDATE journal SET status = 'failed', last_error = ?, locked_at = NULL WHERE seq = ?",
+                         entries, error)
+            journal_flushes.inc(len(entries), table=table, outcome='failed')
+        else:
+            delay = backoff_delay(entries[0]['attempts'], JOURNAL_BACKOFF_SECONDS, JOURNAL_BACKOFF_MAX_SECONDS)
+            self._update("UPDATE journal SET status = 'pending', next_at = ?, last_error = ?, locked_at = NULL "
+                         "WHERE seq = ?", entries, now + delay, error)
+            journal_flushes.inc(len(entries), table=table, outcome='retried')
+        return len(entries)
+
+    def requeue_stale(self, lease=JOURNAL_LEASE_SECONDS):
+        """Return batches whose process died mid-flush to the journal; the replay is idempotent"""
+        return self._connection().execute(
+            "UPDATE journal SET status = 'pending', locked_at = NULL WHERE status = 'flushing' AND locked_at < ?",
+            (time.time() - lease,)).rowcount
+
+    def purge(self, retain_hours=JOURNAL_RETAIN_HOURS):
+        """Delete flushed entries older than the retention window; failed ones are kept for inspection"""
+        return self._connection().execute(
+            "DELETE FROM journal WHERE status = 'flushed' AND flushed_at < ?",
+            (time.time() - retain_hours * 3600,)).rowcount
+
+    def counts(self):
+        rows = self._connection().execute(
+            "SELECT table_name, status, COUNT(*) AS n FROM journal WHERE status != 'flushed' GROUP BY table_name, status")
+        return [(row['table_name'], row['status'], row['n']) for row in rows]
+
+    def ensure_started(self):
+        """Start this process's flusher thread, once per process"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='journal-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_sweep > JOURNAL_LEASE_SECONDS / 4:
+                    self.requeue_stale()
+                    self.purge()
+                    last_sweep = time.monotonic()
+                if self.flush_once():
+                    continue
+            except sqlite3.Error as e:
+                print(f"Warning: Write journal unavailable: {e}")
+            self._stop.wait(JOURNAL_FLUSH_SECONDS)
+
+    def _collect(self):
+        if not self.enabled:
+            return []
+        lines = [
+            '# HELP journal_entries Journaled writes not yet flushed, by table and status',
+            '# TYPE journal_entries gauge'
+        ]
+        try:
+            counts = self.counts()
+        except sqlite3.Error:
+            counts = []
+        for table, status, count in counts:
+            lines.append(f'journal_entries{{table="{table}",status="{status}"}} {count}')
+        return lines
@@ -0,0 +1,65 @@
+import os
+
+LEDGER_ENFORCE_CREDIT_LIMIT = os.environ.get('LEDGER_ENFORCE_CREDIT_LIMIT', 'true').lower() == 'true'
+
+# Error markers raised by the ledger functions in the database
+LEDGER_ERRORS = ('credit_limit_exceeded', 'customer_not_found')
+
+
+def ledger_error(body):
+    """Return the ledger error marker in an upstream error body, if any"""
+    text = body if isinstance(body, str) else str(body)
+    for marker in LEDGER_ERRORS:
+        if marker in text:
+            return marker
+    return None
+
+
+class BalanceLedger:
+    """Client for the customer balance ledger functions in Supabase
+
+    The database applies each delta to customers.balance under the customer's
+    row lock, together with the row that caused it, so the stored balance is
+    always the running total and reads never have to scan history.
+    """
+
+    def __init__(self, rpc, enforce_credit_limit=LEDGER_ENFORCE_CREDIT_LIMIT):
+        self.rpc = rpc
+        self.enforce_credit_limit = enforce_credit_limit
+
+    def record_transactions(self, table, rows, enforce_credit_limit=None):
+        """Insert transactions and charge them to their customers; same contract as supabase_post_many
+
+        Rows whose id already exists are skipped, so a batch can be safely replayed.
+        """
+        if enforce_credit_limit is None:
+            enforce_credit_limit = self.enforce_credit_limit
+        return self.rpc('record_transactions', {
+            'p_rows': rows,
+            'p_enforce_credit_limit': enforce_credit_limit
+        })
+
+    def record_payment(self, payment):
+        """Insert a customer payment and credit it; returns (ok, {payment, balance} or error)"""
+        ok, body = self.rpc('record_customer_payment', {'p_payment': payment})
+        if ok and isinstance(body, list):
+            body = body[0] if body else None
+        return ok, body
+
+    def adjust(self, customer_id, amount, source_id, note=None, source='adjustment'):
+        """Apply a manual delta; returns (ok, new balance or error)"""
+        return self.rpc('apply_customer_balance_delta', {
+            'p_customer_id': customer_id,
+            'p_delta': amount,
+            'p_source': source,
+            'p_source_id': source_id,
+            'p_note': note
+        })
+
+    def snapshot(self):
+        """Snapshot every balance changed since its last snapshot; returns (ok, count)"""
+        return self.rpc('snapshot_customer_balances', {})
+
+    def verify(self, fix=False):
+        """Return (ok, drifted customers); with fix, reset them to the ledger balance"""
+        return self.rpc('verify_customer_balances', {'p_fix': fix})
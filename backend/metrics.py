@@ -0,0 +1,381 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+JOB_BUCKETS = (0.05, 0.25, 1, 5, 15, 60, 300, 900, 3600)
+
+REQUEST_LOG_SAMPLE = float(os.environ.get('REQUEST_LOG_SAMPLE', 0))
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', 10000))
+# Directory where each worker process writes its samples, so one scrape returns every worker's
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_WRITE_SECONDS = float(os.environ.get('METRICS_WRITE_SECONDS', 5))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _add_label(line, label):
+    """Add a label such as pid="12" to one exposition sample line"""
+    if not line or line.startswith('#'):
+        return line
+    series, _, value = line.rpartition(' ')
+    if series.endswith('}'):
+        return f'{series[:-1]},{label}}} {value}'
+    return f'{series}{{{label}}} {value}'
+
+
+def merge_expositions(texts):
+    """Combine several processes' expositions, keeping each metric family's lines together"""
+    families = {}
+    family = families.setdefault('', ([], []))
+    for text in texts:
+        for line in text.splitlines():
+            if line.startswith(('# HELP ', '# TYPE ')):
+                family = families.setdefault(line.split(' ', 3)[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line:
+                family[1].append(line)
+    return ''.join(line + '\n' for header, samples in families.values() for line in header + samples)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += 1
+            state[2] += value
+
+    def collect(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, value_sum) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", bound)])} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {value_sum}')
+        return lines
+
+
+class Registry:
+    """Metric registry rendered in Prometheus text format, with a pid label on every sample
+
+    Metrics live in each worker process. With a directory, every worker also
+    writes its samples there every few seconds, and a scrape of any worker
+    returns the samples of every live worker.
+    """
+
+    def __init__(self, directory=METRICS_DIR, write_seconds=METRICS_WRITE_SECONDS):
+        self._metrics = []
+        self._collectors = []
+        self.directory = directory
+        self.write_seconds = write_seconds
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+    def counter(self, *args, **kwargs):
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self._add(Histogram(*args, **kwargs))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """Add a callable that returns extra exposition lines at scrape time"""
+        self._collectors.append(collect)
+
+    def render_local(self):
+        """This process's samples"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collect in self._collectors:
+            lines.extend(collect())
+        label = f'pid="{os.getpid()}"'
+        return '\n'.join(_add_label(line, label) for line in lines) + '\n'
+
+    def render(self):
+        """Samples of every live worker when a directory is set, otherwise of this process"""
+        if not self.directory:
+            return self.render_local()
+        self.write()
+        texts = []
+        for name in sorted(os.listdir(self.directory)):
+            pid = name[:-len('.prom')]
+            if not name.endswith('.prom') or not pid.isdigit():
+                continue
+            path = os.path.join(self.directory, name)
+            if not _alive(int(pid)):
+                self._remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    texts.append(f.read())
+            except FileNotFoundError:
+                continue
+        return merge_expositions(texts)
+
+    def _path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.prom')
+
+    def write(self):
+        """Write this process's samples to the directory"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.render_local())
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def discard(self):
+        """Remove this process's samples from the directory, e.g. when the worker exits"""
+        if self.directory:
+            self._remove(self._path())
+
+    def ensure_writer(self):
+        """Start this process's writer thread; threads do not survive a fork, so each worker starts its own"""
+        pid = os.getpid()
+        if not self.directory or self._writer_pid == pid:
+            return
+        with self._lock:
+            if self._writer_pid == pid:
+                return
+            threading.Thread(target=self._write_loop, name='metrics-writer', daemon=True).start()
+            self._writer_pid = pid
+
+    def _write_loop(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Warning: Failed to write metrics to {self.directory}: {e}")
+            time.sleep(self.write_seconds)
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests handled by route', ('route', 'method', 'status'))
+http_latency = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('route', 'method'))
+http_in_flight = registry.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+upstream_requests = registry.counter(
+    'upstream_requests_total', 'Supabase API calls by table and verb', ('api', 'table', 'verb', 'status'))
+upstream_latency = registry.histogram(
+    'upstream_request_duration_seconds', 'Supabase API latency by table and verb', ('api', 'table', 'verb'))
+upstream_in_flight = registry.gauge(
+    'upstream_requests_in_flight', 'Supabase API calls currently waiting for a response', ('api', 'table'))
+upstream_rejected = registry.counter(
+    'upstream_rejected_total', 'Supabase API calls rejected without a request by reason',
+    ('api', 'table', 'reason'))
+upstream_breaker_open = registry.gauge(
+    'upstream_breaker_open', 'Whether the circuit breaker for a Supabase table and verb is open',
+    ('api', 'table', 'verb'))
+upstream_hedged = registry.counter(
+    'upstream_hedged_total', 'Supabase reads that sent a hedged duplicate, by which request answered first',
+    ('table', 'winner'))
+upstream_stale = registry.counter(
+    'upstream_stale_total', 'Supabase reads answered from the last good response while upstream failed',
+    ('table',))
+job_runs = registry.counter(
+    'jobs_total', 'Background job runs by name and outcome', ('job', 'outcome'))
+job_latency = registry.histogram(
+    'job_duration_seconds', 'Background job run time by name', ('job',), buckets=JOB_BUCKETS)
+job_delay = registry.histogram(
+    'job_queue_delay_seconds', 'Time background jobs waited past their scheduled run time', ('job',),
+    buckets=JOB_BUCKETS)
+journal_flushes = registry.counter(
+    'journal_flushes_total', 'Journaled writes sent upstream by table and outcome', ('table', 'outcome'))
+journal_flush_lag = registry.histogram(
+    'journal_flush_lag_seconds', 'Time from journaling a write to Supabase confirming it', ('table',),
+    buckets=JOB_BUCKETS)
+upstream_coalesced = registry.counter(
+    'upstream_coalesced_total', 'Supabase reads served by joining an identical in-flight read', ('table',))
+
+
+def observe_upstream(api, table, verb, status, seconds):
+    """Record one completed Supabase API call"""
+    upstream_requests.inc(api=api, table=table, verb=verb, status=status)
+    upstream_latency.observe(seconds, api=api, table=table, verb=verb)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+class RequestLogger:
+    """Sampled JSON request log written by a background thread"""
+
+    def __init__(self, sample_rate=REQUEST_LOG_SAMPLE, stream=None):
+        self.sample_rate = sample_rate
+        self.stream = stream
+        self.logger = logging.getLogger('fuel_pump_erp.requests')
+        self.logger.propagate = False
+        self._listener = None
+        self._handler = None
+        if sample_rate > 0:
+            self._start()
+            self.logger.setLevel(logging.INFO)
+            # The listener thread does not survive a fork; preforked workers start their own
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        log_queue = queue.Queue(REQUEST_LOG_QUEUE_SIZE)
+        handler = logging.StreamHandler(self.stream or sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        if self._handler is not None:
+            self.logger.removeHandler(self._handler)
+        self._listener = QueueListener(log_queue, handler)
+        self._listener.start()
+        self._handler = _DroppingQueueHandler(log_queue)
+        self.logger.addHandler(self._handler)
+
+    def log(self, **fields):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        fields['ts'] = time.time()
+        self.logger.info(json.dumps(fields, default=str))
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+
+
+def install(app, request_logger=None):
+    """Record latency, counts and in-flight requests for every Flask route"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        registry.ensure_writer()
+        g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_start = time.perf_counter()
+        http_in_flight.inc(route=g.metrics_route)
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _observe(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        route = g.metrics_route
+        status = g.pop('metrics_status', 500 if exc is not None else 200)
+        http_in_flight.dec(route=route)
+        http_requests.inc(route=route, method=request.method, status=status)
+        http_latency.observe(seconds, route=route, method=request.method)
+        if request_logger is not None:
+            request_logger.log(route=route, method=request.method, path=request.path,
+                               status=status, duration_ms=round(seconds * 1000, 3))
+
+    registry.register_collector(lambda: [
+        '# HELP request_log_dropped_total Request log records dropped because the queue was full',
+        '# TYPE request_log_dropped_total counter',
+        f'request_log_dropped_total {_DroppingQueueHandler.dropped}'
+    ])
@@ -0,0 +1,82 @@
+import json
+import os
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('API_DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+STREAM_PAGE_SIZE = int(os.environ.get('API_STREAM_PAGE_SIZE', 500))
+
+STREAM_FORMATS = ('ndjson', 'json')
+
+
+def parse_page_args(args):
+    """Read after/limit/stream from the query string.
+
+    Returns (after, limit, stream) where limit is None when the caller did not
+    ask for pagination. Raises ValueError on malformed input.
+    """
+    after = args.get('after') or None
+    stream = args.get('stream') or None
+    limit = args.get('limit')
+
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, MAX_PAGE_SIZE)
+    elif after is not None:
+        limit = DEFAULT_PAGE_SIZE
+
+    return after, limit, stream
+
+
+def keyset_params(params, after, limit, key='id'):
+    """Translate a keyset cursor into PostgREST order/limit/filter params"""
+    page_params = dict(params or {})
+    page_params['order'] = f"{key}.asc"
+    page_params['limit'] = limit
+    if after is not None:
+        page_params[key] = f"gt.{after}"
+    return page_params
+
+
+def next_cursor(rows, limit, key='id'):
+    """Return the cursor for the following page, or None on the last page"""
+    if rows and len(rows) >= limit:
+        return rows[-1].get(key)
+    return None
+
+
+def iter_pages(fetch, table, params=None, after=None, page_size=STREAM_PAGE_SIZE, key='id'):
+    """Yield successive keyset pages from fetch(table, params) until exhausted"""
+    while True:
+        rows = fetch(table, keyset_params(params, after, page_size, key))
+        if rows:
+            yield rows
+        after = next_cursor(rows, page_size, key)
+        if after is None:
+            return
+
+
+def stream_ndjson(pages):
+    """Encode pages of rows as newline-delimited JSON"""
+    for rows in pages:
+        yield ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def stream_json_array(pages):
+    """Encode pages of rows as a single JSON array, one chunk per page"""
+    yield '['
+    first = True
+    for rows in pages:
+        chunk = ','.join(json.dumps(row) for row in rows)
+        if not first:
+            chunk = ',' + chunk
+        first = False
+        yield chunk
+    yield ']'
@@ -0,0 +1,85 @@
+import os
+
+PROJECTION_MAX_FIELDS = int(os.environ.get('PROJECTION_MAX_FIELDS', 32))
+
+# Columns a client may ask for with ?fields=, per table
+FIELDS = {
+    'customers': ('id', 'name', 'contact', 'phone', 'email', 'gst', 'balance', 'fuel_pump_id', 'created_at'),
+    'vehicles': ('id', 'customer_id', 'number', 'type', 'capacity', 'fuel_pump_id', 'created_at'),
+    'staff': ('id', 'name', 'phone', 'email', 'role', 'salary', 'joining_date', 'assigned_pumps',
+              'is_active', 'staff_numeric_id', 'fuel_pump_id'),
+    'indents': ('id', 'indent_number', 'customer_id', 'vehicle_id', 'booklet_id', 'fuel_type', 'quantity',
+                'amount', 'discount_amount', 'date', 'status', 'source', 'approval_status', 'approved_by',
+                'approval_date', 'approval_notes', 'fuel_pump_id', 'created_at'),
+    'transactions': ('id', 'date', 'customer_id', 'vehicle_id', 'indent_id', 'staff_id', 'fuel_type', 'amount',
+                     'quantity', 'discount_amount', 'payment_method', 'source', 'approval_status',
+                     'approved_by', 'approval_date', 'approval_notes', 'fuel_pump_id', 'created_at'),
+    'readings': ('id', 'date', 'pump_id', 'fuel_type', 'shift_id', 'staff_id', 'opening_reading',
+                 'closing_reading', 'testing_fuel', 'cash_given', 'cash_remaining', 'cash_sales', 'card_sales',
+                 'upi_sales', 'indent_sales', 'expenses', 'consumable_expenses', 'fuel_pump_id', 'created_at'),
+}
+
+# Related resources a client may embed with ?include=, as PostgREST select items
+INCLUDES = {
+    'customers': {
+        'vehicles': 'vehicles(id,number,type,capacity)',
+        'indents': 'indents(id,indent_number,vehicle_id,fuel_type,quantity,amount,date,status)',
+    },
+    'vehicles': {
+        'customer': 'customer:customer_id(id,name,phone)',
+    },
+    'indents': {
+        'customer': 'customer:customer_id(id,name,phone)',
+        'vehicle': 'vehicle:vehicle_id(id,number,type)',
+    },
+    'transactions': {
+        'customer': 'customer:customer_id(id,name,phone)',
+        'vehicle': 'vehicle:vehicle_id(id,number,type)',
+        'staff': 'staff:staff_id(id,name)',
+        'indent': 'indent:indent_id(id,indent_number,status)',
+    },
+    'readings': {
+        'staff': 'staff:staff_id(id,name)',
+        'shift': 'shift:shift_id(id,status,start_time,end_time)',
+    },
+    'staff': {},
+}
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+def parse_select(table, args):
+    """Build a PostgREST select from ?fields= and ?include=, or None for every column
+
+    Raises ValueError for unknown fields or includes. `id` is always selected
+    so keyset paging and caching keep working.
+    """
+    fields = _split(args.get('fields'))
+    includes = _split(args.get('include'))
+    if not fields and not includes:
+        return None
+
+    allowed = FIELDS.get(table, ())
+    if len(fields) > PROJECTION_MAX_FIELDS:
+        raise ValueError(f'fields may list at most {PROJECTION_MAX_FIELDS} columns')
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields for {table}: {', '.join(unknown)}")
+
+    embeddable = INCLUDES.get(table, {})
+    unknown = [name for name in includes if name not in embeddable]
+    if unknown:
+        choices = ', '.join(sorted(embeddable)) or 'none'
+        raise ValueError(f"Unknown include for {table}: {', '.join(unknown)} (available: {choices})")
+
+    columns = ['id'] + [field for field in dict.fromkeys(fields) if field != 'id'] if fields else ['*']
+    return ','.join(columns + [embeddable[name] for name in dict.fromkeys(includes)])
+
+
+def with_select(params, select):
+    """Return params with the select applied, leaving the caller's dict untouched"""
+    if select is None:
+        return params
+    return dict(params or {}, select=select)
@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from tenancy import scope_params
+
+# Recent days may still be edited from the frontend, so they are reloaded
+# from upstream once their snapshot is older than the refresh interval
+RECON_OPEN_DAYS = int(os.environ.get('RECON_OPEN_DAYS', 2))
+RECON_REFRESH_SECONDS = float(os.environ.get('RECON_REFRESH_SECONDS', 60))
+RECON_MAX_RANGE_DAYS = int(os.environ.get('RECON_MAX_RANGE_DAYS', 366))
+# Fuel pumps whose reconciliation state is kept, least recently used dropped first
+RECON_MAX_SCOPES = int(os.environ.get('RECON_MAX_SCOPES', 256))
+
+# Anomaly thresholds: a day is flagged when |variation| exceeds both of these
+RECON_VARIANCE_LITRES = float(os.environ.get('RECON_VARIANCE_LITRES', 20))
+RECON_VARIANCE_PERCENT = float(os.environ.get('RECON_VARIANCE_PERCENT', 0.5))
+# Allowed gap between one day's closing stock and the next day's opening stock
+RECON_CONTINUITY_LITRES = float(os.environ.get('RECON_CONTINUITY_LITRES', 5))
+
+TANK_SELECT = ('id,date,fuel_type,tank_number,dip_reading,net_stock,opening_stock,receipt_quantity,closing_stock,'
+               'actual_meter_sales,fuel_pump_id')
+METER_SELECT = 'id,date,fuel_type,opening_reading,closing_reading,testing_fuel,fuel_pump_id'
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def meter_sales(reading):
+    """Litres dispensed according to a nozzle's opening and closing meter readings"""
+    if reading.get('closing_reading') is None:
+        return 0.0
+    return _number(reading['closing_reading']) - _number(reading.get('opening_reading')) - _number(reading.get('testing_fuel'))
+
+
+def _key(row):
+    return row.get('date'), row.get('fuel_type'), row.get('fuel_pump_id')
+
+
+class _Partition:
+    """One fuel pump's tank stock, meter sales and loaded days"""
+
+    def __init__(self):
+        self.tanks = {}
+        self.meter = {}
+        self.contributions = {}
+        self.loaded = {}
+
+
+class ReconciliationEngine:
+    """Running per-day, per-fuel-type, per-fuel-pump tank reconciliation state.
+
+    State is partitioned by the fuel pump a request is scoped to, the None
+    scope holding every fuel pump. Tank stock (C, D, E and the per-tank dips)
+    is loaded from daily_readings once per day. Nozzle meter sales are kept as
+    per-reading contributions, so a created or updated reading only applies
+    its own delta. fetch_all must raise when a read fails; a day is only
+    marked loaded once both reads succeeded.
+    """
+
+    def __init__(self, fetch_all, max_scopes=RECON_MAX_SCOPES):
+        self.fetch_all = fetch_all
+        self.max_scopes = max_scopes
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _partition(self, scope):
+        # Called with the lock held
+        part = self._partitions.get(scope)
+        if part is None:
+            part = self._partitions[scope] = _Partition()
+            while len(self._partitions) > self.max_scopes:
+                self._partitions.popitem(last=False)
+        else:
+            self._partitions.move_to_end(scope)
+        return part
+
+    def scopes(self):
+        """The fuel pumps whose state is held, most recently used last"""
+        with self._lock:
+            return list(self._partitions)
+
+    def _needs_load(self, part, day, today, now):
+        loaded_at = part.loaded.get(day)
+        if loaded_at is None:
+            return True
+        is_open = day > (today - timedelta(days=RECON_OPEN_DAYS)).isoformat()
+        return is_open and now - loaded_at > RECON_REFRESH_SECONDS
+
+    def ensure_loaded(self, scope, days):
+        """Load a fuel pump's snapshots for the days that are missing or stale"""
+        today = date.today()
+        now = time.monotonic()
+        with self._lock:
+            part = self._partition(scope)
+            missing = [day for day in days if self._needs_load(part, day, today, now)]
+        if not missing:
+            return
+
+        span = f'(date.gte.{missing[0]},date.lte.{missing[-1]})'
+        tank_rows = self.fetch_all('daily_readings', scope_params(
+            'daily_readings', {'select': TANK_SELECT, 'and': span}, scope))
+        meter_rows = self.fetch_all('readings', scope_params(
+            'readings', {'select': METER_SELECT, 'and': span}, scope))
+        reload = set(missing)
+
+        with self._lock:
+            part = self._partition(scope)
+            for key in [k for k in part.tanks if k[0] in reload]:
+                del part.tanks[key]
+            for key in [k for k in part.meter if k[0] in reload]:
+                del part.meter[key]
+            for reading_id in [r for r, (key, _) in part.contributions.items() if key[0] in reload]:
+                del part.contributions[reading_id]
+
+            for row in tank_rows:
+                if row.get('date') in reload:
+                    self._add_tank_row(part, row)
+            for row in meter_rows:
+                if row.get('date') in reload:
+                    self._apply_reading(part, row)
+            for day in missing:
+                part.loaded[day] = now
+
+    def _add_tank_row(self, part, row):
+        key = _key(row)
+        entry = part.tanks.get(key)
+        if entry is None:
+            # Shared C/D/E values are repeated on every tank row of a day
+            entry = part.tanks[key] = {
+                'opening_stock': _number(row.get('opening_stock')),
+                'receipt_quantity': _number(row.get('receipt_quantity')),
+                'closing_stock': _number(row.get('closing_stock')),
+                'actual_meter_sales': _number(row.get('actual_meter_sales')),
+                'tanks': {}
+            }
+        tank_number = row.get('tank_number') or 1
+        entry['tanks'].setdefault(tank_number, {
+            'tank_number': tank_number,
+            'dip_reading': _number(row.get('dip_reading')),
+            'net_stock': _number(row.get('net_stock') or row.get('opening_stock'))
+        })
+
+    def _apply_reading(self, part, row):
+        reading_id = row.get('id')
+        key = _key(row)
+        litres = meter_sales(row)
+
+        previous = part.contributions.get(reading_id)
+        if previous is not None:
+            old_key, old_litres = previous
+            part.meter[old_key] = part.meter.get(old_key, 0.0) - old_litres
+        part.meter[key] = part.meter.get(key, 0.0) + litres
+        if reading_id is not None:
+            part.contributions[reading_id] = (key, litres)
+
+    def apply_reading(self, row):
+        """Fold a created or updated meter reading into loaded days"""
+        with self._lock:
+            # The reading counts towards its own fuel pump and the unscoped state
+            for scope in {row.get('fuel_pump_id'), None}:
+                part = self._partitions.get(scope)
+                if part is not None and row.get('date') in part.loaded:
+                    self._apply_reading(part, row)
+
+    def series(self, scope, days, fuel_type=None):
+        """Return a fuel pump's reconciliation series and per-fuel summary for the given days"""
+        self.ensure_loaded(scope, days)
+        wanted = set(days)
+
+        with self._lock:
+            part = self._partition(scope)
+            keys = {k for k in part.tanks if k[0] in wanted}
+            keys.update(k for k, litres in part.meter.items() if k[0] in wanted and litres)
+            if fuel_type:
+                keys = {k for k in keys if k[1] == fuel_type}
+            snapshot = {
+                key: (dict(part.tanks[key], tanks=dict(part.tanks[key]['tanks'])) if key in part.tanks else None,
+                      part.meter.get(key, 0.0))
+                for key in keys
+            }
+
+        series = []
+        summary = {}
+        last_closing = {}
+        for key in sorted(snapshot, key=lambda k: (k[0], k[1] or '', k[2] or '')):
+            day, fuel, fuel_pump_id = key
+            tank, metered = snapshot[key]
+            point = self._point(day, fuel, tank, metered, last_closing.get(key[1:]))
+            point['fuel_pump_id'] = fuel_pump_id
+            if tank is not None:
+                last_closing[key[1:]] = tank['closing_stock']
+            series.append(point)
+
+            totals = summary.setdefault(key[1:], {
+                'fuel_type': fuel,
+                'fuel_pump_id': fuel_pump_id,
+                'sales_per_tank_stock': 0.0,
+                'meter_sales': 0.0,
+                'stock_variation': 0.0,
+                'receipts': 0.0,
+                'anomalies': 0
+            })
+            totals['sales_per_tank_stock'] += point['sales_per_tank_stock']
+            totals['meter_sales'] += point['meter_sales']
+            totals['stock_variation'] += point['stock_variation']
+            totals['receipts'] += point['receipt_quantity']
+            totals['anomalies'] += 1 if point['anomaly'] else 0
+
+        return series, list(summary.values())
+
+    def _point(self, day, fuel_type, tank, metered, previous_closing):
+        tank = tank or {'opening_stock': 0.0, 'receipt_quantity': 0.0, 'closing_stock': 0.0,
+                        'actual_meter_sales': 0.0, 'tanks': {}}
+        opening = sum(t['net_stock'] for t in tank['tanks'].values()) or tank['opening_stock']
+        sales_per_tank_stock = opening + tank['receipt_quantity'] - tank['closing_stock']
+        actual_meter_sales = tank['actual_meter_sales'] or metered
+        variation = actual_meter_sales - sales_per_tank_stock
+
+        reasons = []
+        if not tank['tanks']:
+            reasons.append('missing_tank_readings')
+        if sales_per_tank_stock < 0:
+            reasons.append('negative_tank_sales')
+        threshold = max(RECON_VARIANCE_LITRES, abs(sales_per_tank_stock) * RECON_VARIANCE_PERCENT / 100)
+        if abs(variation) > threshold:
+            reasons.append('variance_exceeds_threshold')
+        if previous_closing is not None and tank['tanks'] and abs(opening - previous_closing) > RECON_CONTINUITY_LITRES:
+            reasons.append('opening_differs_from_previous_closing')
+        if tank['actual_meter_sales'] and metered and abs(tank['actual_meter_sales'] - metered) > RECON_VARIANCE_LITRES:
+            reasons.append('meter_sales_mismatch')
+
+        return {
+            'date': day,
+            'fuel_type': fuel_type,
+            'opening_stock': opening,
+            'receipt_quantity': tank['receipt_quantity'],
+            'closing_stock': tank['closing_stock'],
+            'sales_per_tank_stock': sales_per_tank_stock,
+            'actual_meter_sales': actual_meter_sales,
+            'meter_sales': metered,
+            'stock_variation': variation,
+            'variation_percent': (variation / sales_per_tank_stock * 100) if sales_per_tank_stock else None,
+            'tanks': sorted(tank['tanks'].values(), key=lambda t: t['tank_number']),
+            'anomaly': bool(reasons),
+            'reasons': reasons
+        }
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Days this recent may still receive late (e.g. offline) postings, so their
+# rollups are always recomputed; older days are closed and cached for good
+REPORT_OPEN_DAYS = int(os.environ.get('REPORT_OPEN_DAYS', 2))
+REPORT_MAX_RANGE_DAYS = int(os.environ.get('REPORT_MAX_RANGE_DAYS', 366))
+REPORT_ROLLUP_DIR = os.environ.get('REPORT_ROLLUP_DIR', '')
+# Daily rollups held in memory per fuel pump; older ones are reloaded from REPORT_ROLLUP_DIR
+REPORT_ROLLUP_TENANT_MAX_DAYS = int(os.environ.get('REPORT_ROLLUP_TENANT_MAX_DAYS', 400))
+
+SALES_SELECT = 'id,date,fuel_type,amount,quantity,payment_method,staff_id,staff:staff_id(name)'
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def day_range(start, end):
+    """Return every date from start to end inclusive"""
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def is_closed(day, today=None):
+    today = today or date.today()
+    return day <= today - timedelta(days=REPORT_OPEN_DAYS)
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def empty_rollup(day):
+    return {
+        'date': day,
+        'totalSales': 0.0,
+        'totalQuantity': 0.0,
+        'transactionCount': 0,
+        'fuelTypes': {},
+        'paymentMethods': {},
+        'staff': {}
+    }
+
+
+def _staff_names(rows):
+    names = {}
+    for row in rows:
+        staff = row.get('staff')
+        if isinstance(staff, dict) and staff.get('name'):
+            names[row.get('staff_id') or ''] = staff['name']
+    return names
+
+
+def _rollup_numpy(rows, days):
+    """Vectorized group-by of transaction rows into per-day rollups"""
+    rollups = {day: empty_rollup(day) for day in days}
+    if not rows:
+        return rollups
+
+    day_keys, day_idx = np.unique(np.array([row.get('date') or '' for row in rows]), return_inverse=True)
+    amounts = np.array([_number(row.get('amount')) for row in rows])
+    quantities = np.array([_number(row.get('quantity')) for row in rows])
+    n_days = len(day_keys)
+
+    totals_amount = np.bincount(day_idx, weights=amounts, minlength=n_days)
+    totals_quantity = np.bincount(day_idx, weights=quantities, minlength=n_days)
+    totals_count = np.bincount(day_idx, minlength=n_days)
+
+    def group(column):
+        keys, idx = np.unique(np.array([row.get(column) or '' for row in rows]), return_inverse=True)
+        cells = day_idx * len(keys) + idx
+        size = n_days * len(keys)
+        shape = (n_days, len(keys))
+        return (
+            keys,
+            np.bincount(cells, weights=amounts, minlength=size).reshape(shape),
+            np.bincount(cells, weights=quantities, minlength=size).reshape(shape),
+            np.bincount(cells, minlength=size).reshape(shape)
+        )
+
+    fuel_keys, fuel_amount, fuel_quantity, fuel_count = group('fuel_type')
+    method_keys, method_amount, _, method_count = group('payment_method')
+    staff_keys, staff_amount, _, staff_count = group('staff_id')
+    names = _staff_names(rows)
+
+    for d, day in enumerate(day_keys.tolist()):
+        rollup = rollups.setdefault(day, empty_rollup(day))
+        rollup['totalSales'] = float(totals_amount[d])
+        rollup['totalQuantity'] = float(totals_quantity[d])
+        rollup['transactionCount'] = int(totals_count[d])
+        for f in np.nonzero(fuel_count[d])[0]:
+            rollup['fuelTypes'][str(fuel_keys[f])] = {
+                'sales': float(fuel_amount[d, f]),
+                'quantity': float(fuel_quantity[d, f])
+            }
+        for m in np.nonzero(method_count[d])[0]:
+            rollup['paymentMethods'][str(method_keys[m])] = float(method_amount[d, m])
+        for s in np.nonzero(staff_count[d])[0]:
+            staff_id = str(staff_keys[s])
+            rollup['staff'][staff_id] = {
+                'staffName': names.get(staff_id, 'Unknown Staff'),
+                'totalSales': float(staff_amount[d, s]),
+                'transactionCount': int(staff_count[d, s])
+            }
+    return rollups
+
+
+def _rollup_python(rows, days):
+    """Plain-Python group-by used when NumPy is not installed"""
+    rollups = {day: empty_rollup(day) for day in days}
+    names = _staff_names(rows)
+
+    for row in rows:
+        day = row.get('date') or ''
+        amount = _number(row.get('amount'))
+        quantity = _number(row.get('quantity'))
+        rollup = rollups.setdefault(day, empty_rollup(day))
+        rollup['totalSales'] += amount
+        rollup['totalQuantity'] += quantity
+        rollup['transactionCount'] += 1
+
+        fuel = rollup['fuelTypes'].setdefault(row.get('fuel_type') or '', {'sales': 0.0, 'quantity': 0.0})
+        fuel['sales'] += amount
+        fuel['quantity'] += quantity
+
+        method = row.get('payment_method') or ''
+        rollup['paymentMethods'][method] = rollup['paymentMethods'].get(method, 0.0) + amount
+
+        staff_id = row.get('staff_id') or ''
+        staff = rollup['staff'].setdefault(staff_id, {
+            'staffName': names.get(staff_id, 'Unknown Staff'),
+            'totalSales': 0.0,
+            'transactionCount': 0
+        })
+        staff['totalSales'] += amount
+        staff['transactionCount'] += 1
+    return rollups
+
+
+def rollup_transactions(rows, days=()):
+    """Group transaction rows into {date: rollup}, with empty rollups for days"""
+    if np is not None:
+        return _rollup_numpy(rows, days)
+    return _rollup_python(rows, days)
+
+
+def merge_rollups(rollups):
+    """Combine per-day rollups into the Daily Sales Report payload"""
+    total_sales = 0.0
+    total_quantity = 0.0
+    total_count = 0
+    sales_data = []
+    staff = {}
+    methods = {}
+
+    for rollup in sorted(rollups, key=lambda r: r['date']):
+        if not rollup['transactionCount']:
+            continue
+        total_sales += rollup['totalSales']
+        total_quantity += rollup['totalQuantity']
+        total_count += rollup['transactionCount']
+        sales_data.append({
+            'date': rollup['date'],
+            'totalSales': rollup['totalSales'],
+            'totalQuantity': rollup['totalQuantity'],
+            'fuelTypes': rollup['fuelTypes']
+        })
+        for method, amount in rollup['paymentMethods'].items():
+            methods[method] = methods.get(method, 0.0) + amount
+        for staff_id, entry in rollup['staff'].items():
+            merged = staff.setdefault(staff_id, {
+                'id': staff_id or None,
+                'staffName': entry['staffName'],
+                'totalSales': 0.0,
+                'transactionCount': 0
+            })
+            merged['totalSales'] += entry['totalSales']
+            merged['transactionCount'] += entry['transactionCount']
+
+    return {
+        'totalSales': total_sales,
+        'totalQuantity': total_quantity,
+        'transactionCount': total_count,
+        'salesData': sales_data,
+        'staffData': sorted(staff.values(), key=lambda s: s['totalSales'], reverse=True),
+        'paymentMethodData': [
+            {
+                'method': method or None,
+                'amount': amount,
+                'percentage': (amount / total_sales) * 100 if total_sales > 0 else 0
+            }
+            for method, amount in methods.items()
+        ]
+    }
+
+
+class RollupStore:
+    """Immutable per-day rollups for closed days, optionally persisted as JSON
+
+    Rollups are partitioned by scope (a fuel pump id, or None for all of
+    them). Each scope keeps its `max_days` most recently used days in memory.
+    """
+
+    def __init__(self, directory=REPORT_ROLLUP_DIR, max_days=REPORT_ROLLUP_TENANT_MAX_DAYS):
+        self.directory = directory
+        self.max_days = max_days
+        self._rollups = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, scope, day):
+        return os.path.join(self.directory, f"{scope or 'all'}-{day}.json")
+
+    def _hold(self, scope, day, rollup):
+        # Called with the lock held
+        days = self._rollups.setdefault(scope, OrderedDict())
+        days[day] = rollup
+        days.move_to_end(day)
+        while len(days) > self.max_days:
+            days.popitem(last=False)
+
+    def get(self, scope, day):
+        with self._lock:
+            days = self._rollups.get(scope)
+            rollup = days.get(day) if days is not None else None
+            if rollup is not None:
+                days.move_to_end(day)
+        if rollup is not None or not self.directory:
+            return rollup
+        try:
+            with open(self._path(scope, day)) as f:
+                rollup = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._hold(scope, day, rollup)
+        return rollup
+
+    def put(self, scope, day, rollup):
+        with self._lock:
+            self._hold(scope, day, rollup)
+        if self.directory:
+            path = self._path(scope, day)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(rollup, f)
+            os.replace(path + '.tmp', path)
+
+    def invalidate(self, day, scope=None):
+        """Forget a day after a late posting lands through the API
+
+        A posting for one fuel pump changes its own rollup and the all-pumps
+        one; without a fuel pump, the day is forgotten in every scope.
+        """
+        with self._lock:
+            scopes = list(self._rollups) if scope is None else [scope, None]
+            for key in scopes:
+                self._rollups.get(key, {}).pop(day, None)
+        if self.directory:
+            if scope is None:
+                names = [name for name in os.listdir(self.directory) if name.endswith(f"-{day}.json")]
+            else:
+                names = [os.path.basename(self._path(key, day)) for key in scopes]
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,386 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from urllib3.util.retry import Retry
+
+from cache import make_key
+from metrics import upstream_breaker_open, upstream_hedged, upstream_rejected, upstream_stale
+
+# Total time a request may spend waiting on Supabase, across retries; routes
+# that legitimately read a lot get their own budget
+UPSTREAM_DEADLINE_SECONDS = float(os.environ.get('UPSTREAM_DEADLINE_SECONDS', 10))
+DEFAULT_DEADLINES = {
+    '/api/reports/daily-sales': 60,
+    '/api/reconciliation': 60,
+    '/api/export/<table>': 60,
+    '/api/ledger/verify': 60,
+}
+BREAKER_FAILURES = int(os.environ.get('BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 0.95))
+HEDGE_MIN_SECONDS = float(os.environ.get('HEDGE_MIN_SECONDS', 0.05))
+HEDGE_MAX_RATIO = float(os.environ.get('HEDGE_MAX_RATIO', 0.1))
+HEDGE_WINDOW = int(os.environ.get('HEDGE_WINDOW', 200))
+HEDGE_WORKERS = int(os.environ.get('HEDGE_WORKERS', 32))
+STALE_MAX_ENTRIES = int(os.environ.get('STALE_MAX_ENTRIES', 256))
+STALE_MAX_ROWS = int(os.environ.get('STALE_MAX_ROWS', 1000))
+
+
+def parse_deadlines(value):
+    """Parse 'route=seconds,...' overrides, e.g. '/api/export/<table>=300'"""
+    deadlines = dict(DEFAULT_DEADLINES)
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, seconds = item.rpartition('=')
+        deadlines[route] = float(seconds)
+    return deadlines
+
+
+UPSTREAM_DEADLINES = parse_deadlines(os.environ.get('UPSTREAM_DEADLINES', ''))
+
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The request's upstream time budget ran out"""
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Calls to this upstream endpoint are failing and are being rejected without a request"""
+
+
+def start_deadline(seconds):
+    """Bound every upstream call made from this context; returns a token for end_deadline"""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def end_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current deadline, or None when there is none"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def clamp_timeout(timeout, api='', table=''):
+    """Shrink a (connect, read) timeout to the time left, raising once it has run out"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        upstream_rejected.inc(api=api, table=table, reason='deadline')
+        raise DeadlineExceeded('Upstream deadline exceeded')
+    if isinstance(timeout, tuple):
+        return tuple(min(part, left) for part in timeout)
+    return min(timeout, left)
+
+
+class DeadlineRetry(Retry):
+    """urllib3 retry policy that stops retrying, and shortens its backoff, at the deadline"""
+
+    def is_exhausted(self):
+        left = remaining()
+        return super().is_exhausted() or (left is not None and left <= 0)
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        left = remaining()
+        return backoff if left is None else max(0.0, min(backoff, left))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: opens after N failures, lets one probe through after a pause
+
+    A probe that never reports back does not hold the breaker half-open:
+    another one is let through once reset_seconds have passed.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._count = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self._opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                self._probe_at = now
+                return True
+            if self.state == 'half_open' and now - self._probe_at >= self.reset_seconds:
+                self._probe_at = now
+                return True
+            return False
+
+    def record(self, ok):
+        """Record a call's outcome; returns True when this changed whether the breaker is open"""
+        with self._lock:
+            was_open = self.state != 'closed'
+            if ok:
+                self._count = 0
+                self.state = 'closed'
+            else:
+                self._count += 1
+                if self.state == 'half_open' or self._count >= self.failures:
+                    self.state = 'open'
+                    self._opened_at = time.monotonic()
+            return was_open != (self.state != 'closed')
+
+
+class LatencyWindow:
+    """Recent successful latencies for one endpoint, for the hedging threshold"""
+
+    def __init__(self, size=HEDGE_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.calls = 0
+        self.hedges = 0
+        self._threshold = None
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            # Re-sorting on every sample is wasted work; refresh every tenth
+            if len(self.samples) % 10 == 0:
+                self._threshold = None
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+            # Halving both keeps the hedge ratio weighted towards recent calls
+            if self.calls >= 100 * self.samples.maxlen:
+                self.calls //= 2
+                self.hedges //= 2
+
+    def count_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+    def threshold(self, percentile):
+        with self._lock:
+            if len(self.samples) < self.samples.maxlen // 4:
+                return None
+            if self._threshold is None:
+                ordered = sorted(self.samples)
+                self._threshold = ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+            return self._threshold
+
+
+class Resilience:
+    """Per table/verb circuit breakers and latency-triggered hedging for upstream calls"""
+
+    def __init__(self, hedge=HEDGE_ENABLED, percentile=HEDGE_PERCENTILE, min_delay=HEDGE_MIN_SECONDS,
+                 max_ratio=HEDGE_MAX_RATIO, workers=HEDGE_WORKERS, breaker_factory=CircuitBreaker):
+        self.hedge = hedge
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.workers = workers
+        self.breaker_factory = breaker_factory
+        self._breakers = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def breaker(self, api, table, verb):
+        key = (api, table, verb)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, self.breaker_factory())
+        return breaker
+
+    def _window(self, key):
+        window = self._windows.get(key)
+        if window is None:
+            with self._lock:
+                window = self._windows.setdefault(key, LatencyWindow())
+        return window
+
+    def _pool(self):
+        # Threads do not survive a fork; each worker process gets its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='upstream-hedge')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def call(self, api, table, verb, send, hedge=False):
+        """Run send() through the table/verb breaker, hedging it when allowed"""
+        breaker = self.breaker(api, table, verb)
+        if not breaker.allow():
+            upstream_rejected.inc(api=api, table=table, reason='breaker')
+            raise CircuitOpen(f'Circuit open for {verb} {table}')
+        start = time.perf_counter()
+        try:
+            if hedge and self.hedge:
+                response = self._hedged(table, send)
+            else:
+                response = send()
+        except BaseException:
+            self._record(breaker, api, table, verb, False)
+            raise
+        ok = response.status_code < 500
+        self._record(breaker, api, table, verb, ok)
+        if ok and hedge and self.hedge:
+            self._window(table).add(time.perf_counter() - start)
+        return response
+
+    def _record(self, breaker, api, table, verb, ok):
+        if breaker.record(ok):
+            upstream_breaker_open.set(0 if breaker.state == 'closed' else 1, api=api, table=table, verb=verb)
+
+    def _hedged(self, table, send):
+        window = self._window(table)
+        threshold = window.threshold(self.percentile)
+        window.count_call()
+        if threshold is None or window.hedges > window.calls * self.max_ratio:
+            return send()
+
+        # Worker threads must see this request's deadline
+        primary = self._pool().submit(contextvars.copy_context().run, send)
+        done, _ = wait([primary], timeout=max(threshold, self.min_delay))
+        if done:
+            return primary.result()
+
+        window.count_hedge()
+        hedge = self._pool().submit(contextvars.copy_context().run, send)
+        pending = {primary: 'primary', hedge: 'hedge'}
+        while True:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = pending.pop(future)
+                failed = future.exception() is not None or future.result().status_code >= 500
+                if not failed or not pending:
+                    upstream_hedged.inc(table=table, winner=winner)
+                    return future.result()
+
+    async def acall(self, api, table, verb, send, hedge=False):
+        """Coroutine counterpart of call(); send is a coroutine function"""
+        breaker = self.breaker(api, table, verb)
+        if not breaker.allow():
+            upstream_rejected.inc(api=api, table=table, reason='breaker')
+            raise CircuitOpen(f'Circuit open for {verb} {table}')
+        start = time.perf_counter()
+        try:
+            if hedge and self.hedge:
+                response = await self._ahedged(table, send)
+            else:
+                response = await send()
+        except BaseException:
+            # A cancelled or crashed call is a failure too; otherwise a half-open probe never reports back
+            self._record(breaker, api, table, verb, False)
+            raise
+        ok = response.status_code < 500
+        self._record(breaker, api, table, verb, ok)
+        if ok and hedge and self.hedge:
+            self._window(table).add(time.perf_counter() - start)
+        return response
+
+    async def _ahedged(self, table, send):
+        window = self._window(table)
+        threshold = window.threshold(self.percentile)
+        window.count_call()
+        if threshold is None or window.hedges > window.calls * self.max_ratio:
+            return await send()
+
+        primary = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait([primary], timeout=max(threshold, self.min_delay))
+        if done:
+            return primary.result()
+
+        window.count_hedge()
+        pending = {primary: 'primary', asyncio.ensure_future(send()): 'hedge'}
+        while True:
+            done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                winner = pending.pop(task)
+                failed = task.exception() is not None or task.result().status_code >= 500
+                if not failed or not pending:
+                    # Unlike a thread, the slower coroutine can be dropped
+                    for other in pending:
+                        other.cancel()
+                    upstream_hedged.inc(table=table, winner=winner)
+                    return task.result()
+
+    def states(self):
+        """Breakers that are not closed, as {(api, table, verb): state}"""
+        return {key: breaker.state for key, breaker in list(self._breakers.items()) if breaker.state != 'closed'}
+
+
+class StaleStore:
+    """Last good response per read, served while its endpoint is failing
+
+    Bounded by entry count and by rows per entry, so large reads are never held.
+    """
+
+    def __init__(self, max_entries=STALE_MAX_ENTRIES, max_rows=STALE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, table, params, rows):
+        if self.max_entries <= 0 or not isinstance(rows, list) or len(rows) > self.max_rows:
+            return
+        key = make_key(table, params)
+        with self._lock:
+            self._entries[key] = rows
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, table, params):
+        with self._lock:
+            rows = self._entries.get(make_key(table, params))
+        if rows is not None:
+            upstream_stale.inc(table=table)
+        return rows
+
+
+def install(app, deadlines=None, default=UPSTREAM_DEADLINE_SECONDS):
+    """Give every Flask request an upstream deadline for its route"""
+    from flask import g, jsonify, request
+
+    deadlines = UPSTREAM_DEADLINES if deadlines is None else deadlines
+
+    @app.before_request
+    def _start_deadline():
+        rule = request.url_rule.rule if request.url_rule else ''
+        g.deadline_token = start_deadline(deadlines.get(rule, default))
+
+    @app.teardown_request
+    def _end_deadline(exc):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            end_deadline(token)
+
+    @app.after_request
+    def _mark_stale(response):
+        if g.get('served_stale'):
+            response.headers['Warning'] = '110 - "Response is Stale"'
+        return response
+
+    @app.errorhandler(requests.RequestException)
+    def _upstream_unavailable(error):
+        left = remaining()
+        if isinstance(error, DeadlineExceeded) or (left is not None and left <= 0):
+            return jsonify({'message': 'Upstream deadline exceeded'}), 504
+        retry_after = str(int(BREAKER_RESET_SECONDS)) if isinstance(error, CircuitOpen) else '1'
+        return jsonify({'message': 'Upstream service unavailable'}), 503, {'Retry-After': retry_after}
@@ -0,0 +1,97 @@
+"""Serve the backend with Gunicorn using gunicorn.conf.py and the environment.
+
+Run from the backend directory:
+
+    python serve.py --workers 8 --threads 4 --bind 0.0.0.0:5000
+
+Command-line options override the config file and environment. Without
+Gunicorn (for example on Windows) it falls back to Werkzeug's threaded
+server in a single process. With --asgi it serves asgi.py with Uvicorn.
+"""
+import argparse
+import os
+import runpy
+import tempfile
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', help='host:port to listen on (default: BIND or HOST:PORT, 0.0.0.0:5000)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: WEB_CONCURRENCY or 2 x cores + 1)')
+    parser.add_argument('--threads', type=int, help='threads per worker (default: GUNICORN_THREADS or 4)')
+    parser.add_argument('--no-preload', action='store_true', help='import the app in each worker instead of once')
+    parser.add_argument('--asgi', action='store_true', help='serve on an event loop with Uvicorn (asgi.py)')
+    return parser.parse_args(argv)
+
+
+if BaseApplication is not None:
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            settings = runpy.run_path(CONFIG_FILE)
+            for key, value in settings.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from wsgi import application
+            return application
+
+
+def default_bind():
+    return f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+
+
+def serve_asgi(args):
+    import uvicorn
+
+    host, _, port = (args.bind or os.environ.get('BIND') or default_bind()).rpartition(':')
+    workers = args.workers or int(os.environ.get('WEB_CONCURRENCY', 1))
+    if workers > 1:
+        # Workers share their metrics through this directory, as under Gunicorn
+        os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'fuel_pump_erp_metrics_{os.getpid()}'))
+        # The nightly rollups are computed by one worker; the others read them from this directory
+        if not os.environ.get('REPORT_ROLLUP_DIR'):
+            os.environ['REPORT_ROLLUP_DIR'] = os.path.join(tempfile.gettempdir(), f'fuel_pump_erp_rollups_{os.getpid()}')
+    uvicorn.run('asgi:application', host=host or '0.0.0.0', port=int(port), workers=workers,
+                timeout_graceful_shutdown=int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30)))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.asgi:
+        serve_asgi(args)
+        return
+
+    options = {key: value for key, value in (
+        ('bind', args.bind), ('workers', args.workers), ('threads', args.threads)
+    ) if value is not None}
+    if args.no_preload:
+        options['preload_app'] = False
+
+    if BaseApplication is not None:
+        Server(options).run()
+        return
+
+    print("Warning: gunicorn is not installed, serving with a single-process threaded server")
+    from werkzeug.serving import run_simple
+    from wsgi import application
+
+    host, _, port = (args.bind or default_bind()).rpartition(':')
+    run_simple(host or '0.0.0.0', int(port), application, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
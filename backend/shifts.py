@@ -0,0 +1,68 @@
+import json
+
+from bulk import validate_row
+
+CLOSE_AMOUNT_FIELDS = ('cash_remaining', 'cash_sales', 'card_sales', 'upi_sales', 'indent_sales',
+                       'expenses', 'consumable_expenses')
+
+# Error markers raised by close_shift, with the HTTP status each maps to
+CLOSE_ERRORS = {
+    'shift_not_found': 404,
+    'shift_already_closed': 409,
+    'reading_not_found': 400,
+    'ambiguous_reading': 400,
+    'invalid_closing_reading': 400,
+}
+
+
+def build_close_payload(data):
+    """Validate a shift-close request; returns (payload for close_shift, errors)"""
+    if not isinstance(data, dict):
+        return None, ['Expected a JSON object']
+
+    errors = validate_row(data, numeric=CLOSE_AMOUNT_FIELDS)
+    readings = data.get('readings')
+    if not isinstance(readings, list) or not readings:
+        errors.append('readings must be a non-empty list')
+        readings = []
+
+    for index, reading in enumerate(readings):
+        problems = validate_row(reading, required=('closing_reading',), numeric=('closing_reading', 'testing_fuel'))
+        if not problems and not (reading.get('id') or reading.get('fuel_type')):
+            problems.append('id or fuel_type is required')
+        errors.extend(f'readings[{index}]: {problem}' for problem in problems)
+
+    consumables = data.get('consumables') or []
+    if not isinstance(consumables, list):
+        errors.append('consumables must be a list')
+        consumables = []
+    for index, consumable in enumerate(consumables):
+        problems = validate_row(consumable, required=('id', 'quantity_returned'), numeric=('quantity_returned',))
+        errors.extend(f'consumables[{index}]: {problem}' for problem in problems)
+
+    if errors:
+        return None, errors
+
+    payload = {field: data.get(field) for field in CLOSE_AMOUNT_FIELDS if data.get(field) is not None}
+    payload['readings'] = [
+        {key: reading[key] for key in ('id', 'fuel_type', 'closing_reading', 'testing_fuel') if key in reading}
+        for reading in readings
+    ]
+    payload['consumables'] = [
+        {'id': consumable['id'], 'quantity_returned': consumable['quantity_returned']} for consumable in consumables
+    ]
+    if data.get('end_time'):
+        payload['end_time'] = data['end_time']
+    return payload, []
+
+
+def close_error(body):
+    """Return (marker, HTTP status, message) for a close_shift error body; marker is None if unrecognised"""
+    try:
+        message = json.loads(body).get('message', body)
+    except (TypeError, ValueError, AttributeError):
+        message = str(body)
+    for marker, status in CLOSE_ERRORS.items():
+        if message.startswith(marker):
+            return marker, status, message[len(marker):].lstrip(': ')
+    return None, 500, message
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+from cache import make_key
+from metrics import upstream_coalesced
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent identical reads into one upstream request
+
+    Callers that ask for the same table and params while a read is in flight
+    wait for it and share its result instead of sending their own. The shared
+    result is the same object for every caller and must not be mutated.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, table, params, fetch):
+        key = make_key(table, params)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            upstream_coalesced.inc(table=table)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines sharing one event loop
+
+    The read runs as its own task, so a caller that is cancelled (a client
+    disconnecting) leaves it running for everyone else waiting on it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, table, params, fetch):
+        key = make_key(table, params)
+        task = self._calls.get(key)
+        if task is not None:
+            upstream_coalesced.inc(table=table)
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # A cancelled caller must not cancel the shared read
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so a failure nobody waited for is not logged
+
+    def in_flight(self):
+        return len(self._calls)
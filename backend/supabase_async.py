@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+
+import requests
+
+from metrics import observe_upstream, upstream_in_flight
+from resilience import clamp_timeout, remaining
+from supabase_client import IDEMPOTENT_METHODS, MAX_RETRIES, POOL_MAXSIZE, RETRY_BACKOFF, RETRY_STATUSES
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# One event loop multiplexes every in-flight call, so the pool can be far larger than a thread's
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_ASYNC_MAX_CONNECTIONS', 256))
+
+
+class AsyncSupabaseClient:
+    """Non-blocking counterpart of SupabaseClient for the ASGI entry point
+
+    Shares the sync client's URL, headers, timeouts, retry settings and
+    circuit breakers. Transport errors are raised as their `requests`
+    equivalents, so the Flask error handlers answer them the same way.
+    """
+
+    def __init__(self, client, max_connections=ASYNC_MAX_CONNECTIONS):
+        if httpx is None:
+            raise RuntimeError('httpx is required for the async Supabase client')
+        self.client = client
+        self.max_connections = max_connections
+        self._http = None
+
+    @property
+    def http(self):
+        # Created on first use so it binds to the serving event loop
+        if self._http is None:
+            self._http = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=POOL_MAXSIZE
+            ))
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def request(self, method, path, admin=False, headers=None, api='rest', target='', timeout=None, **kwargs):
+        """Send a request to a Supabase API path such as /rest/v1/customers"""
+        merged = self.client.admin_headers if admin else self.client.rest_headers
+        if headers:
+            merged = {**merged, **headers}
+        connect, read = clamp_timeout(timeout or self.client.timeout, api, target)
+        url = f"{self.client.url}{path}"
+        attempts = 1 + (MAX_RETRIES if method in IDEMPOTENT_METHODS else 0)
+
+        async def send():
+            for attempt in range(attempts):
+                last = attempt == attempts - 1
+                status = 'error'
+                error = None
+                upstream_in_flight.inc(api=api, table=target)
+                start = time.perf_counter()
+                try:
+                    response = await self.http.request(
+                        method, url, headers=merged, timeout=httpx.Timeout(read, connect=connect, pool=read),
+                        **kwargs)
+                    status = response.status_code
+                except httpx.TimeoutException as e:
+                    error = requests.Timeout(str(e))
+                except httpx.TransportError as e:
+                    error = requests.ConnectionError(str(e))
+                finally:
+                    upstream_in_flight.dec(api=api, table=target)
+                    observe_upstream(api, target, method, status, time.perf_counter() - start)
+                if error is not None:
+                    if last or not await self._backoff(attempt):
+                        raise error
+                    continue
+                if status in RETRY_STATUSES and not last and await self._backoff(attempt):
+                    continue
+                return response
+
+        # Only reads are safe to send twice
+        return await self.client.resilience.acall(api, target, method, send, hedge=method == 'GET' and api == 'rest')
+
+    async def _backoff(self, attempt):
+        """Sleep before a retry; False when the deadline leaves no time for one"""
+        delay = RETRY_BACKOFF * (2 ** attempt)
+        left = remaining()
+        if left is not None and left <= delay:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+    async def rest(self, method, table, **kwargs):
+        """Send a request to a PostgREST table endpoint"""
+        return await self.request(method, f"/rest/v1/{table}", api='rest', target=table, **kwargs)
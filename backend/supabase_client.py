@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import observe_upstream, upstream_in_flight
+from resilience import DeadlineRetry, Resilience, clamp_timeout
+
+# Connection pool and timeout settings, overridable from the environment
+POOL_CONNECTIONS = int(os.environ.get('SUPABASE_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('SUPABASE_POOL_MAXSIZE', 32))
+POOL_BLOCK = os.environ.get('SUPABASE_POOL_BLOCK', 'false').lower() == 'true'
+CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('SUPABASE_READ_TIMEOUT', 10))
+MAX_RETRIES = int(os.environ.get('SUPABASE_MAX_RETRIES', 3))
+RETRY_BACKOFF = float(os.environ.get('SUPABASE_RETRY_BACKOFF', 0.2))
+
+# Only verbs that are safe to repeat are retried; POST and PATCH are not
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = (502, 503, 504)
+
+
+class SupabaseClient:
+    """Shared keep-alive HTTP client for the Supabase REST and Auth APIs.
+
+    Each worker process gets its own pooled session, created lazily on first
+    use so that sockets are never shared across a fork.
+    """
+
+    def __init__(self, url, anon_key, service_role_key='', resilience=None):
+        self.url = url.rstrip('/')
+        self.resilience = resilience or Resilience()
+        self.anon_key = anon_key
+        self.service_role_key = service_role_key
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+        # Header dicts are built once and reused for every call
+        self.rest_headers = {
+            "apikey": anon_key,
+            "Authorization": f"Bearer {anon_key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation"
+        }
+        self.admin_headers = {
+            "apikey": service_role_key,
+            "Authorization": f"Bearer {service_role_key}",
+            "Content-Type": "application/json"
+        }
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        retry = DeadlineRetry(
+            total=MAX_RETRIES,
+            connect=MAX_RETRIES,
+            read=MAX_RETRIES,
+            status=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=POOL_MAXSIZE,
+            pool_block=POOL_BLOCK,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """Return the pooled session for the current process"""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._build_session()
+                    self._session_pid = pid
+        return self._session
+
+    def close(self):
+        """Close all pooled connections held by this process"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._session_pid = None
+
+    def ping(self, timeout=None):
+        """Return True when Supabase answers its health endpoint; also opens a pooled connection"""
+        try:
+            response = self.request('GET', '/auth/v1/health', api='auth', target='health',
+                                    timeout=timeout or self.timeout)
+        except requests.RequestException:
+            return False
+        return response.status_code < 500
+
+    def request(self, method, path, admin=False, headers=None, api='rest', target='', **kwargs):
+        """Send a request to a Supabase API path such as /rest/v1/customers"""
+        merged = self.admin_headers if admin else self.rest_headers
+        if headers:
+            merged = {**merged, **headers}
+        # Never wait past the current request's upstream deadline
+        kwargs['timeout'] = clamp_timeout(kwargs.get('timeout', self.timeout), api, target)
+
+        def send():
+            status = 'error'
+            upstream_in_flight.inc(api=api, table=target)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, f"{self.url}{path}", headers=merged, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                upstream_in_flight.dec(api=api, table=target)
+                observe_upstream(api, target, method, status, time.perf_counter() - start)
+
+        # Only reads are safe to send twice
+        return self.resilience.call(api, target, method, send, hedge=method == 'GET' and api == 'rest')
+
+    def rest(self, method, table, **kwargs):
+        """Send a request to a PostgREST table endpoint"""
+        return self.request(method, f"/rest/v1/{table}", api='rest', target=table, **kwargs)
+
+    def auth_admin(self, method, path='', **kwargs):
+        """Send a request to the GoTrue admin users endpoint"""
+        return self.request(method, f"/auth/v1/admin/users{path}", admin=True, api='auth', target='admin_users', **kwargs)
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+SYNC_TABLES = ('customers', 'vehicles', 'indents', 'transactions', 'readings')
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 1000))
+# Change log entries younger than this are held back: a sequence number is
+# taken when a row is written but becomes visible only at commit, so a newer
+# entry can appear before an older, still-open one
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+SYNC_ID_BATCH = int(os.environ.get('SYNC_ID_BATCH', 200))
+
+CHANGE_LOG_TABLE = 'sync_changes'
+
+
+def parse_cursor(value):
+    """Return the change log sequence number in a client cursor, or None when absent"""
+    if value in (None, ''):
+        return None
+    seq = int(value)
+    if seq < 0:
+        raise ValueError('cursor must not be negative')
+    return seq
+
+
+def _log_params(fuel_pump_id, **params):
+    if fuel_pump_id:
+        params['fuel_pump_id'] = f'eq.{fuel_pump_id}'
+    return params
+
+
+def _settled_before(now=None):
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+
+
+def _quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def current_cursor(fetch, fuel_pump_id=None, now=None):
+    """Return the newest settled sequence number in the change log"""
+    rows = fetch(CHANGE_LOG_TABLE, _log_params(
+        fuel_pump_id, select='seq', changed_at=f'lt.{_settled_before(now)}', order='seq.desc', limit=1))
+    return rows[0]['seq'] if rows else 0
+
+
+def cursor_expired(fetch, since):
+    """True when log entries after `since` may already have been pruned"""
+    if since == 0:
+        return False
+    rows = fetch(CHANGE_LOG_TABLE, {'select': 'seq', 'seq': f'lte.{since}', 'order': 'seq.desc', 'limit': 1})
+    return not rows
+
+
+def fetch_rows(fetch, table, ids):
+    """Fetch the current version of rows by id, in batches that keep URLs short"""
+    rows = []
+    ids = list(ids)
+    for start in range(0, len(ids), SYNC_ID_BATCH):
+        batch = ids[start:start + SYNC_ID_BATCH]
+        rows.extend(fetch(table, {'id': f"in.({','.join(_quote(i) for i in batch)})"}))
+    return rows
+
+
+def collect_changes(fetch, since, fuel_pump_id=None, limit=None, now=None):
+    """Return the sync payload for every change logged after sequence `since`
+
+    Several log entries for one row collapse into its latest state: rows that
+    still exist are returned whole under `upserted`, the rest by id under
+    `deleted`. fetch must raise when a read fails: a row missing from a
+    failed read would otherwise be reported as deleted and skipped for good.
+    """
+    limit = limit or SYNC_MAX_CHANGES
+    entries = fetch(CHANGE_LOG_TABLE, _log_params(
+        fuel_pump_id,
+        select='seq,table_name,row_id,op',
+        seq=f'gt.{since}',
+        changed_at=f'lt.{_settled_before(now)}',
+        order='seq.asc',
+        limit=limit
+    ))
+
+    latest = {}
+    for entry in entries:
+        if entry['table_name'] in SYNC_TABLES:
+            latest[(entry['table_name'], entry['row_id'])] = entry['op']
+
+    changes = {}
+    for table in SYNC_TABLES:
+        ids = [row_id for (name, row_id), op in latest.items() if name == table and op != 'delete']
+        deleted = [row_id for (name, row_id), op in latest.items() if name == table and op == 'delete']
+        upserted = fetch_rows(fetch, table, ids) if ids else []
+
+        # Rows deleted after their last logged write are gone too
+        found = {str(row.get('id')) for row in upserted}
+        deleted.extend(row_id for row_id in ids if row_id not in found)
+
+        if upserted or deleted:
+            changes[table] = {'upserted': upserted, 'deleted': deleted}
+
+    return {
+        'cursor': str(entries[-1]['seq'] if entries else since),
+        'has_more': len(entries) >= limit,
+        'changes': changes
+    }
@@ -0,0 +1,93 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Reject reads of fuel pump data from requests whose session names no fuel pump
+TENANT_REQUIRED = os.environ.get('TENANT_REQUIRED', 'false').lower() == 'true'
+TENANT_FANOUT_WORKERS = int(os.environ.get('TENANT_FANOUT_WORKERS', 8))
+
+# Tables with a fuel_pump_id column; reads and writes on them are scoped to the request's fuel pump
+TENANT_TABLES = frozenset([
+    'business_settings', 'consumables', 'customer_payments', 'customers', 'daily_readings', 'fuel_settings',
+    'fuel_tests', 'indent_booklets', 'indents', 'inventory', 'invoices', 'pump_settings', 'readings', 'shifts',
+    'staff', 'tank_unloads', 'transactions', 'vehicles'
+])
+
+# Roles that may read every fuel pump, or any one with ?fuel_pump_id=
+CROSS_TENANT_ROLES = ('super_admin',)
+
+
+class TenantError(Exception):
+    """The request may not read the fuel pump data it asked for"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_tenant(session, requested=None, required=TENANT_REQUIRED):
+    """Return (fuel_pump_id, cross_tenant, error) for a request
+
+    A session bound to a fuel pump is scoped to it, and asking for another one
+    is an error. Cross-tenant roles get the fuel pump they ask for, or every
+    fuel pump when they ask for none. Other requests keep the unscoped
+    behaviour, filtered by ?fuel_pump_id= when given, unless TENANT_REQUIRED.
+    """
+    if session is not None and session.get('role') in CROSS_TENANT_ROLES:
+        return requested, requested is None, None
+
+    own = session.get('fuel_pump_id') if session is not None else None
+    if own:
+        if requested and requested != own:
+            return own, False, TenantError(403, 'Forbidden: fuel pump does not belong to this session')
+        return own, False, None
+
+    if required:
+        if session is None:
+            return None, False, TenantError(401, 'Unauthorized')
+        return None, False, TenantError(403, 'Forbidden: no fuel pump for this session')
+    return requested, False, None
+
+
+def scope_params(table, params, fuel_pump_id):
+    """params with the fuel pump filter added for tenant tables"""
+    if not fuel_pump_id or table not in TENANT_TABLES:
+        return params
+    return {**(params or {}), 'fuel_pump_id': f'eq.{fuel_pump_id}'}
+
+
+def partition_params(params, fuel_pump_ids):
+    """One params dict per fuel pump, plus one for rows that belong to none"""
+    partitions = [{**(params or {}), 'fuel_pump_id': f'eq.{fuel_pump_id}'} for fuel_pump_id in fuel_pump_ids]
+    partitions.append({**(params or {}), 'fuel_pump_id': 'is.null'})
+    return partitions
+
+
+class FanOut:
+    """Bounded pool for cross-tenant reads, one call per fuel pump
+
+    The pool is shared by every request in the process, so concurrent
+    super-admin reads together never run more than `workers` upstream calls.
+    """
+
+    def __init__(self, workers=TENANT_FANOUT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Threads do not survive a fork; each worker process gets its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='tenant-fanout')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def map(self, fetch, items):
+        """fetch(item) for every item, in order; the request's context (deadline, g) goes with each call"""
+        pool = self._pool()
+        futures = [pool.submit(contextvars.copy_context().run, fetch, item) for item in items]
+        return [future.result() for future in futures]
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other flatly, as when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """The Flask app module pointed at a fresh stub Supabase, with background jobs off; yields (app, state)"""
+    from bench import stub_server
+
+    import app
+    from resilience import Resilience
+
+    server, state = stub_server.start(stub_server.seed_dataset(rows=50, days=2, pumps=2))
+    monkeypatch.setattr(app.supabase, 'url', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(app.supabase, 'resilience', Resilience())
+    monkeypatch.setattr(app.scheduler, 'enabled', False)
+    app.cache.clear()
+    yield app, state
+    app.cache.clear()
+    app.supabase.close()
+    server.shutdown()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip('httpx')
+
+
+def call(application, path, headers=()):
+    """Run one GET through the ASGI app; returns (status, JSON body)"""
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 1234), 'scheme': 'http',
+             'http_version': '1.1', 'root_path': ''}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await application(scope, receive, send)
+        return messages[0]['status'], json.loads(b''.join(m.get('body', b'') for m in messages[1:]))
+
+    return run()
+
+
+def test_session_lookups_do_not_block_the_loop(backend, monkeypatch):
+    app, state = backend
+    import asgi
+
+    application = asgi.Application()
+    token, _ = app.sessions.issue({'email': 'a@b', 'role': 'admin', 'fuel_pump_id': 'pump-0001'})
+    customer = next(c for c in state.data['customers'] if c['fuel_pump_id'] == 'pump-0001')
+
+    # A revocation lookup stuck behind a SQLite lock
+    def slow_is_revoked(jti):
+        time.sleep(0.3)
+        return False
+    monkeypatch.setattr(app.sessions.revoked, 'is_revoked', slow_is_revoked)
+
+    async def main():
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.02)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            call(application, f"/api/customers/{customer['id']}", [('Authorization', f'Bearer {token}')]),
+            tick())
+        return started, ticks, results[0]
+
+    try:
+        started, ticks, (status, body) = asyncio.run(main())
+    finally:
+        application.pool.shutdown()
+
+    assert status == 200 and body['id'] == customer['id']
+    # The loop kept running while the session was checked
+    assert ticks[-1] - started < 0.25
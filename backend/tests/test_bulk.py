@@ -0,0 +1,32 @@
+def test_a_rejected_row_is_isolated_and_stored_rows_are_folded_in(backend, monkeypatch):
+    app, state = backend
+    applied = []
+    monkeypatch.setattr(app, 'apply_reading', applied.append)
+    rows = [{'pump_id': f'N{i}', 'opening_reading': -1 if i == 3 else 100 + i, 'date': '2025-01-01'}
+            for i in range(8)]
+
+    before = len(state.data['readings'])
+    response = app.app.test_client().post('/api/readings/bulk', json=rows)
+    body = response.get_json()
+
+    assert response.status_code == 207
+    assert (body['inserted'], body['failed']) == (7, 1)
+    assert [result['index'] for result in body['results'] if not result['success']] == [3]
+    assert 'check constraint' in body['results'][3]['errors'][0]
+    assert len(state.data['readings']) == before + 7
+
+    # Readings reach reconciliation as stored, with their database ids
+    assert [reading['id'] for reading in applied] == [result['id'] for result in body['results'] if result['success']]
+    assert all(reading['id'] for reading in applied)
+
+
+def test_a_chunk_that_fails_upstream_is_not_split(backend):
+    app, state = backend
+    state.error_rate = 1.0
+    sent = state.requests
+
+    response = app.app.test_client().post('/api/readings/bulk', json=[
+        {'pump_id': f'N{i}', 'opening_reading': 100, 'date': '2025-01-01'} for i in range(8)])
+
+    assert response.status_code == 207 and response.get_json()['failed'] == 8
+    assert state.requests - sent == 1
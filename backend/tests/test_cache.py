@@ -0,0 +1,55 @@
+import cache as cache_module
+from cache import TTLCache
+
+
+def test_entries_expire_after_their_table_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = TTLCache({'customers': 60})
+
+    cache.set('customers', {'id': 'eq.1'}, [{'id': 1}])
+    cache.set('readings', None, [{'id': 2}])
+    assert cache.get('customers', {'id': 'eq.1'}) == (True, [{'id': 1}])
+    # Tables without a TTL are never cached
+    assert cache.get('readings') == (False, None)
+
+    now[0] += 61
+    assert cache.get('customers', {'id': 'eq.1'}) == (False, None)
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted_within_each_fuel_pump():
+    cache = TTLCache({'customers': 60}, max_entries=3, tenant_max_rows=2)
+
+    cache.set('customers', {'id': 'eq.1'}, [1])
+    cache.set('customers', {'id': 'eq.2'}, [2])
+    cache.get('customers', {'id': 'eq.1'})
+    cache.set('customers', {'id': 'eq.3'}, [3])
+    assert cache.get('customers', {'id': 'eq.2'})[0] is False
+    assert cache.get('customers', {'id': 'eq.1'})[0] is True
+
+    # A fuel pump over its row budget evicts its own entries, not the others'
+    other = {'fuel_pump_id': 'eq.pump-0002'}
+    for ident in ('a', 'b', 'c'):
+        cache.set('customers', {**other, 'id': f'eq.{ident}'}, [ident])
+    assert cache.get('customers', {**other, 'id': 'eq.a'})[0] is False
+    assert cache.get('customers', {**other, 'id': 'eq.c'})[0] is True
+    # The overall bound still applies across fuel pumps
+    assert cache.stats()['entries'] == 3
+
+
+def test_a_write_invalidates_cached_reads(backend):
+    app, state = backend
+    client = app.app.test_client()
+    customer = state.data['customers'][0]
+    path = f"/api/vehicles?customer_id={customer['id']}"
+
+    first = client.get(path).get_json()
+    sent = state.requests
+    assert client.get(path).get_json() == first
+    assert state.requests == sent
+
+    created = client.post('/api/vehicles', json={'customer_id': customer['id'], 'number': 'KA01AB1234'})
+    assert created.status_code == 200
+    numbers = [vehicle['number'] for vehicle in client.get(path).get_json()]
+    assert numbers == [vehicle['number'] for vehicle in first] + ['KA01AB1234']
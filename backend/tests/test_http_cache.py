@@ -0,0 +1,17 @@
+def test_a_deleted_row_is_never_answered_with_304(backend):
+    app, state = backend
+    client = app.app.test_client()
+    for customer in state.data['customers']:
+        customer['updated_at'] = '2025-02-01T00:00:00+00:00'
+
+    first = client.get('/api/customers')
+    assert first.status_code == 200 and 'Last-Modified' not in first.headers
+    assert client.get('/api/customers', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # Deleting a row leaves every remaining updated_at as it was
+    deleted = state.data['customers'].pop()
+    for headers in ({'If-None-Match': first.headers['ETag']},
+                    {'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}):
+        response = client.get('/api/customers', headers=headers)
+        assert response.status_code == 200
+        assert deleted['id'] not in {row['id'] for row in response.get_json()}
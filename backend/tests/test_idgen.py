@@ -0,0 +1,51 @@
+import multiprocessing
+import threading
+
+import pytest
+
+import idgen
+from idgen import IdGenerator, new_id
+
+THREADS = 4
+IDS_PER_THREAD = 100000
+
+
+def generate_in_threads(_=None):
+    """Ids from THREADS threads of this process, each list in the order it was generated"""
+    batches = [None] * THREADS
+
+    def work(slot):
+        batches[slot] = [new_id('TRX') for _ in range(IDS_PER_THREAD)]
+
+    threads = [threading.Thread(target=work, args=(slot,)) for slot in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return batches
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_millions_of_ids_are_unique_across_threads_and_processes():
+    # Forked workers reset their node and sequence, as under Gunicorn
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        batches = [batch for batches in pool.map(generate_in_threads, range(4)) for batch in batches]
+    batches += generate_in_threads()
+
+    ids = [record_id for batch in batches for record_id in batch]
+    assert len(ids) == 5 * THREADS * IDS_PER_THREAD
+    assert len(set(ids)) == len(ids)
+    for batch in batches:
+        assert batch == sorted(batch)
+
+
+def test_ids_keep_increasing_when_the_clock_steps_back(monkeypatch):
+    now = [1700000000.0]
+    monkeypatch.setattr(idgen.time, 'time', lambda: now[0])
+    generator = IdGenerator(node='abcd00001')
+
+    ids = [generator.new_id('IND') for _ in range(idgen.MAX_SEQUENCE + 5)]
+    now[0] -= 5
+    ids += [generator.new_id('IND') for _ in range(10)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from jobs import JobQueue, Scheduler, backoff_delay
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return Scheduler(JobQueue(str(tmp_path / 'jobs.sqlite3')), workers=1, enabled=True)
+
+
+def test_dedupe_key_enqueues_once(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    assert queue.enqueue('nightly', dedupe_key='nightly:2025-04-01') is not None
+    assert queue.enqueue('nightly', dedupe_key='nightly:2025-04-01') is None
+    assert queue.counts() == [('nightly', 'pending', 1)]
+
+
+def test_failed_job_is_retried_with_backoff_then_failed(scheduler):
+    calls = []
+
+    @scheduler.task('flaky', max_attempts=2)
+    def flaky():
+        calls.append(time.time())
+        raise RuntimeError('upstream down')
+
+    scheduler.queue.enqueue('flaky')
+    scheduler.run_job(scheduler.queue.claim())
+    assert scheduler.queue.claim() is None  # backing off
+
+    scheduler.queue._connection().execute('UPDATE jobs SET run_at = 0')
+    scheduler.run_job(scheduler.queue.claim())
+    assert len(calls) == 2
+    assert scheduler.queue.counts() == [('flaky', 'failed', 1)]
+
+
+def test_payload_reaches_handler(scheduler):
+    seen = []
+    scheduler.task('echo')(lambda **payload: seen.append(payload))
+
+    scheduler.queue.enqueue('echo', {'column': 'id', 'value': 'pump-1'})
+    scheduler.run_job(scheduler.queue.claim())
+    assert seen == [{'column': 'id', 'value': 'pump-1'}]
+    assert scheduler.queue.counts() == [('echo', 'done', 1)]
+
+
+def test_backoff_grows_and_is_capped():
+    assert backoff_delay(1, base=2, cap=300) <= 3
+    assert 16 <= backoff_delay(5, base=2, cap=300) <= 48
+    assert backoff_delay(20, base=2, cap=300) <= 450
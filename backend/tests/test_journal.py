@@ -0,0 +1,63 @@
+import pytest
+import requests
+
+from bench import stub_server
+from journal import WriteJournal
+
+
+@pytest.fixture
+def stub():
+    server, state = stub_server.start(stub_server.seed_dataset(rows=20, days=2))
+    yield f'http://127.0.0.1:{server.server_port}', state
+    server.shutdown()
+
+
+@pytest.fixture
+def journal(tmp_path, stub):
+    url, _ = stub
+    journal = WriteJournal(str(tmp_path / 'journal.sqlite3'), enabled=True)
+    journal.ensure_started = lambda: None  # flushed by hand below
+
+    def insert_ignore(table, rows):
+        response = requests.post(f'{url}/rest/v1/{table}', params={'on_conflict': 'id'}, json=rows,
+                                 headers={'Prefer': 'return=representation,resolution=ignore-duplicates'})
+        return response.status_code == 201, response.text
+
+    journal.register('indents', insert_ignore)
+    return journal
+
+
+def indent(number):
+    return {'id': f'IND-TEST-{number}', 'customer_id': 'cust-1', 'amount': number}
+
+
+def test_pending_records_are_readable_until_flushed(journal, stub):
+    _, state = stub
+    journal.append('indents', indent(1))
+    journal.append('indents', indent(2))
+
+    assert [r['id'] for r in journal.pending('indents', {'customer_id': 'cust-1'})] == ['IND-TEST-1', 'IND-TEST-2']
+    assert journal.pending('indents', {'customer_id': 'other'}) == []
+
+    assert journal.flush_once() == 2
+    assert journal.pending('indents') == []
+    assert {'IND-TEST-1', 'IND-TEST-2'} <= {row['id'] for row in state.data['indents']}
+
+
+def test_failed_flush_is_retried_and_replay_is_idempotent(journal, stub):
+    _, state = stub
+    journal.append('indents', indent(3))
+
+    state.error_rate = 1.0
+    journal.flush_once()
+    assert journal.counts() == [('indents', 'pending', 1)]
+
+    # A crash after the upstream insert but before it was marked flushed
+    state.error_rate = 0.0
+    journal._connection().execute("UPDATE journal SET next_at = 0")
+    journal.flush_once()
+    journal._connection().execute("UPDATE journal SET status = 'pending'")
+    journal.flush_once()
+
+    assert journal.counts() == []
+    assert sum(row['id'] == 'IND-TEST-3' for row in state.data['indents']) == 1
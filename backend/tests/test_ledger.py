@@ -0,0 +1,38 @@
+def test_a_payment_credits_the_balance_once(backend):
+    app, state = backend
+    client = app.app.test_client()
+    customer = state.data['customers'][0]
+    customer.update(balance=-500, credit_limit=1000)
+
+    response = client.post(f"/api/customers/{customer['id']}/payments",
+                           json={'amount': 200, 'payment_method': 'Cash'})
+    assert response.status_code == 200
+    assert response.get_json()['balance'] == -300
+    assert customer['balance'] == -300
+    assert [entry['delta'] for entry in state.data['customer_ledger'] if entry['customer_id'] == customer['id']] == [200]
+
+
+def test_ledger_errors_map_to_statuses(backend, monkeypatch):
+    app, state = backend
+    client = app.app.test_client()
+    monkeypatch.setattr(app.ledger, 'enforce_credit_limit', True)
+    customer = state.data['customers'][0]
+    customer.update(balance=0, credit_limit=100)
+
+    unknown = client.post('/api/customers/cust-missing/payments', json={'amount': 10, 'payment_method': 'Cash'})
+    assert unknown.status_code == 404
+
+    over = client.post('/api/transactions', json={'customer_id': customer['id'], 'fuel_type': 'Petrol',
+                                                  'amount': 150, 'quantity': 1.5, 'payment_method': 'Credit'})
+    assert over.status_code == 422
+    assert customer['balance'] == 0
+
+    within = client.post('/api/transactions', json={'customer_id': customer['id'], 'fuel_type': 'Petrol',
+                                                    'amount': 80, 'quantity': 0.8, 'payment_method': 'Credit'})
+    assert within.status_code == 200
+    assert customer['balance'] == -80
+
+    # An upstream outage is a 503, not a missing customer
+    state.error_rate = 1.0
+    failed = client.post(f"/api/customers/{customer['id']}/payments", json={'amount': 10, 'payment_method': 'Cash'})
+    assert failed.status_code == 503
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+from metrics import Registry
+
+
+def test_scrape_returns_every_live_workers_samples(tmp_path):
+    registry = Registry(directory=str(tmp_path))
+    requests = registry.counter('http_requests_total', 'Requests', ('route',))
+    requests.inc(route='/api/customers')
+
+    # Another worker's samples, as written by its own registry
+    other = os.getppid()
+    (tmp_path / f'{other}.prom').write_text(
+        '# HELP http_requests_total Requests\n# TYPE http_requests_total counter\n'
+        f'http_requests_total{{route="/api/customers",pid="{other}"}} 5\n')
+    # A worker that has exited
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    (tmp_path / f'{dead.pid}.prom').write_text(f'http_requests_total{{pid="{dead.pid}"}} 9\n')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP http_requests_total Requests', '# TYPE http_requests_total counter']
+    assert f'http_requests_total{{route="/api/customers",pid="{os.getpid()}"}} 1' in lines
+    assert f'http_requests_total{{route="/api/customers",pid="{other}"}} 5' in lines
+    assert len(lines) == 4
+    assert not (tmp_path / f'{dead.pid}.prom').exists()
+
+    registry.discard()
+    assert not (tmp_path / f'{os.getpid()}.prom').exists()
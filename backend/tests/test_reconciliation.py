@@ -0,0 +1,74 @@
+import pytest
+
+from reconciliation import ReconciliationEngine
+
+DAY = '2025-01-01'
+
+
+def tank_row(fuel_pump_id, opening, closing):
+    return {'date': DAY, 'fuel_type': 'Petrol', 'tank_number': 1, 'opening_stock': opening,
+            'closing_stock': closing, 'net_stock': opening, 'fuel_pump_id': fuel_pump_id}
+
+
+def test_failed_reads_are_retried_and_fuel_pumps_kept_apart():
+    rows = {
+        'daily_readings': [tank_row('pump-1', 8000, 7000), tank_row('pump-2', 5000, 4500)],
+        'readings': [
+            {'id': 'r1', 'date': DAY, 'fuel_type': 'Petrol', 'opening_reading': 0, 'closing_reading': 1000,
+             'fuel_pump_id': 'pump-1'},
+            {'id': 'r2', 'date': DAY, 'fuel_type': 'Petrol', 'opening_reading': 0, 'closing_reading': 500,
+             'fuel_pump_id': 'pump-2'},
+        ],
+    }
+    failing = [True]
+
+    def fetch_all(table, params):
+        if failing[0]:
+            raise ConnectionError('upstream down')
+        return [row for row in rows[table] if params.get('fuel_pump_id') in (None, f"eq.{row['fuel_pump_id']}")]
+
+    engine = ReconciliationEngine(fetch_all)
+    with pytest.raises(ConnectionError):
+        engine.series(None, [DAY])
+
+    failing[0] = False
+    series, summary = engine.series(None, [DAY])
+    points = {point['fuel_pump_id']: point for point in series}
+    assert points['pump-1']['opening_stock'] == 8000 and points['pump-1']['meter_sales'] == 1000
+    assert points['pump-2']['opening_stock'] == 5000 and points['pump-2']['meter_sales'] == 500
+    assert not points['pump-2']['anomaly']
+    assert len(summary) == 2
+
+
+def test_a_fuel_pump_reads_only_its_own_state():
+    rows = {
+        'daily_readings': [tank_row('pump-1', 8000, 7000), tank_row('pump-2', 5000, 4500)],
+        'readings': [],
+    }
+    calls = []
+
+    def fetch_all(table, params):
+        calls.append(params.get('fuel_pump_id'))
+        return [row for row in rows[table] if params.get('fuel_pump_id') in (None, f"eq.{row['fuel_pump_id']}")]
+
+    engine = ReconciliationEngine(fetch_all)
+    series, _ = engine.series('pump-2', [DAY])
+    assert [point['fuel_pump_id'] for point in series] == ['pump-2']
+    assert calls == ['eq.pump-2', 'eq.pump-2']
+
+    # A posted reading reaches its own fuel pump only
+    engine.series('pump-1', [DAY])
+    engine.apply_reading({'id': 'r3', 'date': DAY, 'fuel_type': 'Petrol', 'opening_reading': 0,
+                          'closing_reading': 300, 'fuel_pump_id': 'pump-1'})
+    assert engine.series('pump-1', [DAY])[0][0]['meter_sales'] == 300
+    assert engine.series('pump-2', [DAY])[0][0]['meter_sales'] == 0
+
+
+def test_the_nightly_warm_up_refreshes_only_fuel_pumps_in_use(backend, monkeypatch):
+    app, state = backend
+    engine = ReconciliationEngine(app.supabase_get_all, max_scopes=2)
+    monkeypatch.setattr(app, 'reconciliation', engine)
+
+    engine.series('pump-0001', [DAY])
+    app.warm_reconciliation()
+    assert engine.scopes() == ['pump-0001']
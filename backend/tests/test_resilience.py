@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+import supabase_client
+from bench import stub_server
+from metrics import upstream_hedged
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, Resilience, end_deadline, start_deadline
+from supabase_client import SupabaseClient
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    # Retries would only slow these tests down; the breaker sees one outcome per call either way
+    monkeypatch.setattr(supabase_client, 'MAX_RETRIES', 0)
+    server, state = stub_server.start(stub_server.seed_dataset(rows=50, days=2))
+    yield f'http://127.0.0.1:{server.server_port}', state
+    server.shutdown()
+
+
+def make_client(url, **kwargs):
+    breaker = lambda: CircuitBreaker(failures=3, reset_seconds=0.2)
+    return SupabaseClient(url, 'anon', resilience=Resilience(breaker_factory=breaker, **kwargs))
+
+
+def test_breaker_opens_fails_fast_and_recovers(stub):
+    url, state = stub
+    client = make_client(url)
+    state.error_rate = 1.0
+
+    for _ in range(3):
+        assert client.rest('GET', 'customers').status_code == 503
+    sent = state.requests
+    with pytest.raises(CircuitOpen):
+        client.rest('GET', 'customers')
+    assert state.requests == sent
+
+    # Other tables and verbs have their own breakers
+    assert client.rest('GET', 'vehicles').status_code == 503
+
+    state.error_rate = 0.0
+    time.sleep(0.25)
+    assert client.rest('GET', 'customers').status_code == 200
+    assert client.resilience.states() == {}
+
+
+def test_deadline_bounds_slow_upstream(stub):
+    url, state = stub
+    client = make_client(url)
+    state.latency_ms = 2000
+
+    token = start_deadline(0.3)
+    start = time.perf_counter()
+    try:
+        with pytest.raises(requests.RequestException):
+            client.rest('GET', 'customers')
+        with pytest.raises(DeadlineExceeded):
+            client.rest('GET', 'customers')
+    finally:
+        end_deadline(token)
+    assert time.perf_counter() - start < 0.6
+
+
+def test_hedged_reads_bound_tail_latency(stub):
+    url, state = stub
+    client = make_client(url, hedge=True, min_delay=0.02, max_ratio=0.5)
+    state.latency_ms = 5
+    for _ in range(60):
+        client.rest('GET', 'customers', params={'limit': '1'})
+
+    state.slow_rate, state.slow_ms = 0.1, 1000
+    before = sum(upstream_hedged._values.values())
+    latencies = []
+    for _ in range(100):
+        start = time.perf_counter()
+        assert client.rest('GET', 'customers', params={'limit': '1'}).status_code == 200
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    assert sum(upstream_hedged._values.values()) > before
+    assert latencies[94] < 0.5
+
+
+def test_a_cancelled_probe_reopens_the_breaker():
+    resilience = Resilience(breaker_factory=lambda: CircuitBreaker(failures=1, reset_seconds=0.05))
+    breaker = resilience.breaker('rest', 'customers', 'GET')
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        with pytest.raises(requests.ConnectionError):
+            await resilience.acall('rest', 'customers', 'GET', fail)
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(resilience.acall('rest', 'customers', 'GET', hang))
+        await asyncio.sleep(0.01)
+        assert breaker.state == 'half_open'
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert breaker.state == 'open'
+
+        # The next probe goes through once the pause is over
+        await asyncio.sleep(0.06)
+        return await resilience.acall('rest', 'customers', 'GET', ok)
+
+    async def fail():
+        raise requests.ConnectionError('upstream down')
+
+    async def ok():
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+    assert asyncio.run(main()).status_code == 200
+    assert breaker.state == 'closed'
+
+
+def test_any_failed_probe_reopens_and_a_lost_one_times_out():
+    resilience = Resilience(breaker_factory=lambda: CircuitBreaker(failures=1, reset_seconds=0.05))
+    breaker = resilience.breaker('rest', 'customers', 'GET')
+
+    def broken():
+        raise ValueError('unexpected')
+
+    with pytest.raises(ValueError):
+        resilience.call('rest', 'customers', 'GET', broken)
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        resilience.call('rest', 'customers', 'GET', broken)
+    assert breaker.state == 'open'
+
+    # A probe that never reports back holds the breaker for one pause only
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == 'half_open'
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
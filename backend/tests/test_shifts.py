@@ -0,0 +1,61 @@
+import pytest
+
+from shifts import close_error
+
+
+@pytest.fixture
+def shift(backend):
+    app, state = backend
+    state.data['shifts'].append({'id': 'shift-1', 'status': 'active', 'fuel_pump_id': 'pump-0001'})
+    # Two Petrol nozzles, so Petrol readings can only be closed by id
+    state.data['readings'] += [
+        {'id': reading_id, 'shift_id': 'shift-1', 'fuel_type': fuel_type, 'opening_reading': opening,
+         'date': '2025-01-01'}
+        for reading_id, fuel_type, opening in (('r-petrol-1', 'Petrol', 1000), ('r-petrol-2', 'Petrol', 500),
+                                               ('r-diesel', 'Diesel', 200))
+    ]
+    return app.app.test_client(), state
+
+
+def test_close_error_maps_markers_to_statuses():
+    assert close_error('{"code": "P0001", "message": "shift_already_closed: shift-1"}') == (
+        'shift_already_closed', 409, 'shift-1')
+    assert close_error('{"message": "ambiguous_reading: Petrol has 2 readings"}')[:2] == ('ambiguous_reading', 400)
+    assert close_error('syntax error') == (None, 500, 'syntax error')
+
+
+def test_a_shift_closes_once_with_totals_on_one_reading(shift):
+    client, state = shift
+    payload = {
+        'readings': [{'id': 'r-petrol-1', 'closing_reading': 1100}, {'id': 'r-petrol-2', 'closing_reading': 550},
+                     {'fuel_type': 'Diesel', 'closing_reading': 260, 'testing_fuel': 5}],
+        'cash_remaining': 2000, 'cash_sales': 1500, 'card_sales': 500,
+    }
+
+    response = client.post('/api/shifts/shift-1/close', json=payload)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['total_litres'] == 100 + 50 + 55
+    assert body['shift']['status'] == 'completed'
+    assert [reading['cash_sales'] for reading in body['readings']] == [1500, 0, 0]
+
+    again = client.post('/api/shifts/shift-1/close', json=payload)
+    assert again.status_code == 409 and again.get_json()['error'] == 'shift_already_closed'
+
+
+def test_close_errors_leave_the_shift_open(shift):
+    client, state = shift
+
+    ambiguous = client.post('/api/shifts/shift-1/close',
+                            json={'readings': [{'fuel_type': 'Petrol', 'closing_reading': 1100}]})
+    assert ambiguous.status_code == 400 and ambiguous.get_json()['error'] == 'ambiguous_reading'
+
+    lower = client.post('/api/shifts/shift-1/close', json={'readings': [{'id': 'r-diesel', 'closing_reading': 100}]})
+    assert lower.status_code == 400 and lower.get_json()['error'] == 'invalid_closing_reading'
+
+    missing = client.post('/api/shifts/shift-2/close', json={'readings': [{'id': 'r-diesel', 'closing_reading': 300}]})
+    assert missing.status_code == 404
+
+    assert state.data['shifts'][0]['status'] == 'active'
+    assert all(reading.get('closing_reading') is None for reading in state.data['readings']
+               if reading.get('shift_id') == 'shift-1')
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from metrics import upstream_coalesced
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+@pytest.fixture
+def slow_backend(backend):
+    app, state = backend
+    state.latency_ms = 200
+    return app, state
+
+
+def coalesced(table):
+    return upstream_coalesced._values.get((table,), 0)
+
+
+def run_concurrently(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('read', ['supabase_get', 'supabase_get_cached'])
+def test_identical_concurrent_reads_share_one_request(slow_backend, read):
+    app, state = slow_backend
+    before = coalesced('customers')
+
+    results = run_concurrently(20, lambda index: getattr(app, read)('customers', {'limit': '5'}))
+
+    assert state.requests == 1
+    assert all(result == results[0] and len(result) == 5 for result in results)
+    assert coalesced('customers') - before == 19
+    assert app.upstream_reads.in_flight() == 0
+
+
+def test_different_params_are_not_coalesced(slow_backend):
+    app, state = slow_backend
+
+    results = run_concurrently(10, lambda index: app.supabase_get('customers', {'limit': str(index % 2 + 1)}))
+
+    assert state.requests == 2
+    assert sorted({len(result) for result in results}) == [1, 2]
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        started.set()
+        release.wait()
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def leader():
+        try:
+            flight.do('readings', None, failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    def follower():
+        try:
+            flight.do('readings', None, lambda: calls.append(1))
+        except RuntimeError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=leader)
+    first.start()
+    started.wait()
+    followers = [threading.Thread(target=follower) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [first] + followers:
+        thread.join()
+
+    assert len(errors) == 6
+    assert len(calls) == 1
+    assert flight.do('readings', None, lambda: ['fresh']) == ['fresh']
+
+
+def test_a_cancelled_leader_does_not_abort_its_waiters():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return ['shared']
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('customers', None, fetch))
+        await asyncio.sleep(0)
+        waiters = [asyncio.ensure_future(flight.do('customers', None, fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(main()) == [['shared']] * 3
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
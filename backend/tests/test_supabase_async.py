@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+pytest.importorskip('httpx')
+
+import supabase_async
+from bench import stub_server
+from resilience import CircuitBreaker, CircuitOpen, Resilience, end_deadline, start_deadline
+from singleflight import AsyncSingleFlight
+from supabase_async import AsyncSupabaseClient
+from supabase_client import SupabaseClient
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(supabase_async, 'MAX_RETRIES', 0)
+    server, state = stub_server.start(stub_server.seed_dataset(rows=50, days=2), latency_ms=200)
+    yield f'http://127.0.0.1:{server.server_port}', state
+    server.shutdown()
+
+
+def make_client(url):
+    breaker = lambda: CircuitBreaker(failures=3, reset_seconds=60)
+    return AsyncSupabaseClient(SupabaseClient(url, 'anon', resilience=Resilience(breaker_factory=breaker)))
+
+
+def test_concurrent_reads_wait_on_the_loop_and_coalesce(stub):
+    url, state = stub
+    client = make_client(url)
+    flight = AsyncSingleFlight()
+
+    async def read(index):
+        params = {'limit': str(index % 4 + 1)}
+        return await flight.do('customers', params, lambda: fetch(params))
+
+    async def fetch(params):
+        return (await client.rest('GET', 'customers', params=params)).json()
+
+    async def main():
+        try:
+            return await asyncio.gather(*[read(i) for i in range(200)])
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+
+    # 200 requests, one thread, about one upstream round trip
+    assert time.perf_counter() - start < 1.0
+    assert state.requests == 4
+    assert [len(result) for result in results[:4]] == [1, 2, 3, 4]
+    assert flight.in_flight() == 0
+
+
+def test_errors_map_to_requests_exceptions(stub):
+    url, state = stub
+    client = make_client(url)
+
+    async def main():
+        token = start_deadline(0.1)
+        try:
+            with pytest.raises(requests.Timeout):
+                await client.rest('GET', 'customers')
+        finally:
+            end_deadline(token)
+
+        state.latency_ms, state.error_rate = 0, 1.0
+        for _ in range(3):
+            assert (await client.rest('GET', 'vehicles')).status_code == 503
+        with pytest.raises(CircuitOpen):
+            await client.rest('GET', 'vehicles')
+        await client.close()
+
+    asyncio.run(main())
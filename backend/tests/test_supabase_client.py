@@ -0,0 +1,55 @@
+import pytest
+import requests
+
+import supabase_client
+from bench import stub_server
+from resilience import CircuitBreaker, Resilience
+from supabase_client import SupabaseClient
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(supabase_client, 'MAX_RETRIES', 2)
+    monkeypatch.setattr(supabase_client, 'RETRY_BACKOFF', 0)
+    server, state = stub_server.start(stub_server.seed_dataset(rows=50, days=2))
+    yield f'http://127.0.0.1:{server.server_port}', state
+    server.shutdown()
+
+
+def make_client(url):
+    # A breaker that never opens, so every call reaches the stub
+    return SupabaseClient(url, 'anon', resilience=Resilience(breaker_factory=lambda: CircuitBreaker(failures=1000)))
+
+
+def test_calls_reuse_one_pooled_connection(stub):
+    url, state = stub
+    client = make_client(url)
+    for _ in range(20):
+        assert client.rest('GET', 'customers', params={'limit': '1'}).status_code == 200
+    assert client.rest('POST', 'customers', json={'name': 'New'}).status_code == 201
+    assert len(state.connections) == 1
+
+    # A closed client opens a fresh pool on its next call
+    client.close()
+    assert client.rest('GET', 'customers', params={'limit': '1'}).status_code == 200
+    assert len(state.connections) == 2
+
+
+def test_slow_upstream_times_out(stub):
+    url, state = stub
+    client = make_client(url)
+    client.timeout = (1, 0.1)
+    state.latency_ms = 500
+    with pytest.raises(requests.RequestException):
+        client.rest('POST', 'customers', json={'name': 'Slow'})
+
+
+def test_only_idempotent_verbs_are_retried(stub):
+    url, state = stub
+    client = make_client(url)
+    state.error_rate = 1.0
+
+    for method, sent in (('GET', 3), ('PUT', 3), ('POST', 1), ('PATCH', 1)):
+        before = state.requests
+        assert client.rest(method, 'customers', json={}).status_code == 503
+        assert state.requests - before == sent, method
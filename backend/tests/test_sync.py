@@ -0,0 +1,28 @@
+import pytest
+
+from sync import collect_changes
+
+ENTRIES = [
+    {'seq': 4, 'table_name': 'customers', 'row_id': 'cust-000001', 'op': 'update'},
+    {'seq': 5, 'table_name': 'customers', 'row_id': 'cust-000002', 'op': 'insert'},
+]
+
+
+def test_rows_missing_upstream_are_deleted_but_failed_reads_raise():
+    def fetch(table, params):
+        if table == 'sync_changes':
+            return ENTRIES
+        return [{'id': 'cust-000002', 'name': 'Customer 2'}]
+
+    payload = collect_changes(fetch, 3)
+    assert payload['cursor'] == '5'
+    assert payload['changes']['customers'] == {'upserted': [{'id': 'cust-000002', 'name': 'Customer 2'}],
+                                               'deleted': ['cust-000001']}
+
+    def failing(table, params):
+        if table == 'sync_changes':
+            return ENTRIES
+        raise ConnectionError('upstream down')
+
+    with pytest.raises(ConnectionError):
+        collect_changes(failing, 3)
@@ -0,0 +1,61 @@
+from cache import TTLCache
+from reports import RollupStore
+from tenancy import FanOut, partition_params, resolve_tenant, scope_params
+
+
+def test_sessions_are_scoped_to_their_fuel_pump():
+    staff = {'role': 'admin', 'fuel_pump_id': 'pump-1'}
+    assert resolve_tenant(staff) == ('pump-1', False, None)
+    assert resolve_tenant(staff, 'pump-1') == ('pump-1', False, None)
+    assert resolve_tenant(staff, 'pump-2')[2].status == 403
+
+    admin = {'role': 'super_admin'}
+    assert resolve_tenant(admin) == (None, True, None)
+    assert resolve_tenant(admin, 'pump-2') == ('pump-2', False, None)
+
+    assert resolve_tenant(None, 'pump-2', required=False) == ('pump-2', False, None)
+    assert resolve_tenant(None, 'pump-2', required=True)[2].status == 401
+
+    assert scope_params('customers', {'select': 'id'}, 'pump-1') == {'select': 'id', 'fuel_pump_id': 'eq.pump-1'}
+    assert scope_params('fuel_pumps', {'select': 'id'}, 'pump-1') == {'select': 'id'}
+
+
+def test_fan_out_covers_every_fuel_pump_and_unassigned_rows():
+    partitions = partition_params({'select': 'id'}, ['pump-1', 'pump-2'])
+    assert [p['fuel_pump_id'] for p in partitions] == ['eq.pump-1', 'eq.pump-2', 'is.null']
+
+    fanout = FanOut(workers=2)
+    assert fanout.map(lambda p: p['fuel_pump_id'], partitions) == ['eq.pump-1', 'eq.pump-2', 'is.null']
+
+
+def test_cache_quota_evicts_within_one_fuel_pump():
+    cache = TTLCache({'customers': 60}, max_entries=100, tenant_max_rows=10)
+    cache.set('customers', {'fuel_pump_id': 'eq.pump-2'}, [{'id': 1}] * 4)
+    for n in range(4):
+        cache.set('customers', {'fuel_pump_id': 'eq.pump-1', 'id': f'eq.{n}'}, [{'id': n}] * 3)
+
+    # pump-1 is over its quota and drops its own oldest entry; pump-2 keeps its rows
+    assert cache.get('customers', {'fuel_pump_id': 'eq.pump-1', 'id': 'eq.0'}) == (False, None)
+    assert cache.get('customers', {'fuel_pump_id': 'eq.pump-1', 'id': 'eq.3'})[0]
+    assert cache.get('customers', {'fuel_pump_id': 'eq.pump-2'})[0]
+    assert cache.stats()['tenants'] == 2
+
+    # A read larger than the quota is not cached at all
+    cache.set('customers', {'fuel_pump_id': 'eq.pump-3'}, [{'id': 1}] * 11)
+    assert cache.get('customers', {'fuel_pump_id': 'eq.pump-3'}) == (False, None)
+
+
+def test_rollups_are_invalidated_per_fuel_pump():
+    rollups = RollupStore(directory='', max_days=2)
+    for scope in (None, 'pump-1', 'pump-2'):
+        rollups.put(scope, '2025-01-01', {'scope': scope})
+
+    rollups.invalidate('2025-01-01', 'pump-1')
+    assert rollups.get('pump-1', '2025-01-01') is None
+    assert rollups.get(None, '2025-01-01') is None
+    assert rollups.get('pump-2', '2025-01-01') == {'scope': 'pump-2'}
+
+    for day in ('2025-01-02', '2025-01-03', '2025-01-04'):
+        rollups.put('pump-2', day, {'day': day})
+    assert rollups.get('pump-2', '2025-01-02') is None
+    assert rollups.get('pump-2', '2025-01-04') == {'day': '2025-01-04'}
@@ -0,0 +1,100 @@
+from array import array
+from datetime import date, timedelta
+
+import pytest
+
+import timeseries
+from timeseries import DAY_SECONDS, TimeSeriesStore, day_time, downsample, parse_step
+
+
+def test_downsample_buckets_min_max_avg(monkeypatch):
+    start = day_time('2025-01-01')
+    times = array('d', [start + day * DAY_SECONDS for day in (0, 1, 2, 7, 8)])
+    values = array('d', [1.0, 5.0, 3.0, 10.0, 20.0])
+
+    expected = {'t': ['2025-01-01', '2025-01-08'], 'min': [1.0, 10.0], 'max': [5.0, 20.0],
+                'avg': [3.0, 15.0], 'count': [3, 2]}
+    assert downsample(times, values, start, 7 * DAY_SECONDS) == expected
+    monkeypatch.setattr(timeseries, 'np', None)
+    assert downsample(times, values, start, 7 * DAY_SECONDS) == expected
+
+    assert parse_step('2w', None, None) == 14 * DAY_SECONDS
+    assert parse_step('172800', None, None) == 2 * DAY_SECONDS
+    assert parse_step(None, date(2025, 1, 1), date(2025, 12, 31)) == DAY_SECONDS
+    for text in ('0d', '6h', '3600', '36h'):
+        with pytest.raises(ValueError):
+            parse_step(text, None, None)
+
+
+class FakeUpstream:
+    def __init__(self, today):
+        old = (today - timedelta(days=30)).isoformat()
+        self.today = today.isoformat()
+        self.calls = []
+        self.failing = False
+        self.rows = {
+            # Closing stock is repeated on both tank rows of a day
+            'daily_readings': [
+                {'date': old, 'fuel_type': 'Petrol', 'closing_stock': 7000, 'fuel_pump_id': 'p1'},
+                {'date': old, 'fuel_type': 'Petrol', 'closing_stock': 7000, 'fuel_pump_id': 'p1'},
+            ],
+            'readings': [
+                {'id': 'r1', 'date': old, 'fuel_type': 'Petrol', 'pump_id': 'N1',
+                 'opening_reading': 100, 'closing_reading': 150, 'fuel_pump_id': 'p1'},
+            ],
+            'tank_unloads': [],
+        }
+
+    def fetch_all(self, table, params):
+        self.calls.append(table)
+        if self.failing:
+            raise ConnectionError('upstream down')
+        return [row for row in self.rows[table] if params.get('fuel_pump_id') in (None, f"eq.{row['fuel_pump_id']}")]
+
+
+def test_store_folds_posts_into_open_days_and_reloads_closed_ones():
+    today = date.today()
+    upstream = FakeUpstream(today)
+    store = TimeSeriesStore(upstream.fetch_all)
+    start = today - timedelta(days=30)
+
+    def query(kind, ident, metric):
+        return store.query('p1', kind, ident, (metric,), start, today, DAY_SECONDS)[metric]
+
+    assert query('tank', 'Petrol', 'level')['max'] == [7000.0]
+    assert query('nozzle', 'N1', 'sales')['max'] == [50.0]
+    loads = len(upstream.calls)
+
+    # Today is open: a new reading and its update replace one contribution, without an upstream read
+    store.apply_reading({'id': 'r2', 'date': upstream.today, 'fuel_type': 'Petrol', 'pump_id': 'N1',
+                         'opening_reading': 0, 'closing_reading': 10, 'fuel_pump_id': 'p1'})
+    store.apply_reading({'id': 'r2', 'date': upstream.today, 'fuel_type': 'Petrol', 'pump_id': 'N1',
+                         'opening_reading': 0, 'closing_reading': 30, 'fuel_pump_id': 'p1'})
+    store.apply_unload({'id': 'u1', 'date': upstream.today, 'fuel_type': 'Petrol', 'quantity': 4000,
+                        'fuel_pump_id': 'p1'})
+    assert query('tank', 'Petrol', 'sales')['max'] == [50.0, 30.0]
+    assert query('tank', 'Petrol', 'receipts')['max'] == [4000.0]
+    assert len(upstream.calls) == loads
+
+    # A closed day is dropped on change and read again from upstream
+    upstream.rows['readings'][0]['closing_reading'] = 180
+    store.apply_reading(upstream.rows['readings'][0])
+    assert query('nozzle', 'N1', 'sales')['max'] == [80.0, 30.0]
+    assert len(upstream.calls) == loads + 3
+
+    # Other fuel pumps have their own partitions
+    assert store.query('p2', 'tank', 'Petrol', ('level',), start, today, DAY_SECONDS)['level']['t'] == []
+
+
+def test_days_read_during_an_outage_are_loaded_after_recovery():
+    today = date.today()
+    upstream = FakeUpstream(today)
+    store = TimeSeriesStore(upstream.fetch_all)
+    start = today - timedelta(days=30)
+
+    upstream.failing = True
+    with pytest.raises(ConnectionError):
+        store.query('p1', 'tank', 'Petrol', ('level',), start, today, DAY_SECONDS)
+
+    upstream.failing = False
+    assert store.query('p1', 'tank', 'Petrol', ('level',), start, today, DAY_SECONDS)['level']['max'] == [7000.0]
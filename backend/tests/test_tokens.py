@@ -0,0 +1,20 @@
+from tokens import TokenSigner
+
+
+def test_logout_is_seen_by_every_worker_on_the_host(tmp_path):
+    path = str(tmp_path / 'revocations.sqlite3')
+    # Two signers sharing a secret and a revocation file, as two Gunicorn workers do
+    first = TokenSigner('secret', revocation_db=path)
+    second = TokenSigner('secret', revocation_db=path)
+
+    token, _ = first.issue({'sub': 'user-1'})
+    other, _ = first.issue({'sub': 'user-2'})
+    claims = second.verify(token)
+    assert claims['sub'] == 'user-1'
+
+    second.revoke(claims)
+    assert first.verify(token) is None
+    assert second.verify(token) is None
+    assert first.verify(other)['sub'] == 'user-2'
+
+    assert TokenSigner('other-secret', revocation_db=path).verify(other) is None
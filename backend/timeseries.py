@@ -0,0 +1,329 @@
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from reconciliation import meter_sales
+from reports import day_range
+from tenancy import scope_params
+
+# Recent days may still be edited from the frontend, so they are reloaded
+# once their points are older than the refresh interval
+TIMESERIES_OPEN_DAYS = int(os.environ.get('TIMESERIES_OPEN_DAYS', 2))
+TIMESERIES_REFRESH_SECONDS = float(os.environ.get('TIMESERIES_REFRESH_SECONDS', 60))
+TIMESERIES_MAX_RANGE_DAYS = int(os.environ.get('TIMESERIES_MAX_RANGE_DAYS', 1100))
+# Default step: the smallest whole number of days that keeps a chart under this many points
+TIMESERIES_DEFAULT_POINTS = int(os.environ.get('TIMESERIES_DEFAULT_POINTS', 400))
+# Fuel pumps whose series are held in memory, least recently used evicted first
+TIMESERIES_MAX_SCOPES = int(os.environ.get('TIMESERIES_MAX_SCOPES', 256))
+
+LEVEL_SELECT = 'id,date,fuel_type,closing_stock,fuel_pump_id'
+READING_SELECT = 'id,date,fuel_type,pump_id,opening_reading,closing_reading,testing_fuel'
+UNLOAD_SELECT = 'id,date,fuel_type,quantity'
+
+TANK_METRICS = ('level', 'receipts', 'sales')
+NOZZLE_METRICS = ('sales',)
+
+DAY_SECONDS = 86400
+STEP_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': DAY_SECONDS, 'w': 7 * DAY_SECONDS}
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def day_time(day):
+    """Unix time of midnight UTC at the start of a day ('YYYY-MM-DD...' or a date)"""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def parse_step(text, start_day, end_day):
+    """Bucket width in seconds from ?step= (e.g. 86400, 1d, 2w); defaults to whole days
+
+    The series hold one point per day, so a step must be a whole number of days.
+    """
+    if not text:
+        days = (end_day - start_day).days + 1
+        return DAY_SECONDS * max(1, -(-days // TIMESERIES_DEFAULT_POINTS))
+    match = re.fullmatch(r'(\d+)([smhdw]?)', text.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError('step must be a positive number of seconds or a duration like 1d, 7d or 2w')
+    step = int(match.group(1)) * STEP_UNITS[match.group(2) or 's']
+    if step % DAY_SECONDS:
+        raise ValueError('step must be a whole number of days; series hold one point per day')
+    return step
+
+
+def _label(t, step):
+    moment = datetime.fromtimestamp(t, timezone.utc)
+    if step % DAY_SECONDS == 0:
+        return moment.date().isoformat()
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def downsample(times, values, start, step):
+    """Min, max, average and count of the values in each step-wide bucket from start, as columns
+
+    Only buckets holding at least one point are returned.
+    """
+    columns = {'t': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+    if not times:
+        return columns
+
+    if np is not None:
+        t = np.frombuffer(times, dtype=np.float64)
+        v = np.frombuffer(values, dtype=np.float64)
+        buckets = ((t - start) // step).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(starts, len(v)))
+        sums = np.add.reduceat(v, starts)
+        columns.update({
+            't': [_label(start + bucket * step, step) for bucket in buckets[starts].tolist()],
+            'min': np.minimum.reduceat(v, starts).tolist(),
+            'max': np.maximum.reduceat(v, starts).tolist(),
+            'avg': (sums / counts).tolist(),
+            'count': counts.tolist()
+        })
+        return columns
+
+    current = None
+    for t, value in zip(times, values):
+        bucket = int((t - start) // step)
+        if bucket != current:
+            current = bucket
+            columns['t'].append(_label(start + bucket * step, step))
+            columns['min'].append(value)
+            columns['max'].append(value)
+            columns['avg'].append(value)
+            columns['count'].append(1)
+            continue
+        count = columns['count'][-1]
+        columns['min'][-1] = min(columns['min'][-1], value)
+        columns['max'][-1] = max(columns['max'][-1], value)
+        columns['avg'][-1] += (value - columns['avg'][-1]) / (count + 1)
+        columns['count'][-1] = count + 1
+    return columns
+
+
+class Series:
+    """Daily points sorted by time, in typed arrays of timestamps, values and contribution counts"""
+
+    __slots__ = ('times', 'values', 'counts')
+
+    def __init__(self):
+        self.times = array('d')
+        self.values = array('d')
+        self.counts = array('l')
+
+    def add(self, t, value, count=1):
+        """Add value to the point at t; a negative count withdraws a contribution"""
+        i = bisect_left(self.times, t)
+        if i < len(self.times) and self.times[i] == t:
+            self.values[i] += value
+            self.counts[i] += count
+            if self.counts[i] <= 0:
+                self._delete(i)
+        elif count > 0:
+            self.times.insert(i, t)
+            self.values.insert(i, value)
+            self.counts.insert(i, count)
+
+    def remove(self, t):
+        i = bisect_left(self.times, t)
+        if i < len(self.times) and self.times[i] == t:
+            self._delete(i)
+
+    def _delete(self, i):
+        del self.times[i]
+        del self.values[i]
+        del self.counts[i]
+
+    def window(self, start, end):
+        """Copies of the timestamps and values with start <= t < end"""
+        i, j = bisect_left(self.times, start), bisect_left(self.times, end)
+        return self.times[i:j], self.values[i:j]
+
+
+class _Partition:
+    """One fuel pump's series, plus the row contributions of its open days"""
+
+    def __init__(self):
+        self.series = {}
+        self.contributions = {}
+        self.by_day = {}
+        self.loaded = {}
+
+
+class TimeSeriesStore:
+    """Per-tank and per-nozzle daily series for charts, partitioned by fuel pump
+
+    Tanks are identified by fuel type. Each tank has a `level` series (closing
+    stock from daily_readings), `receipts` (tank unloads) and `sales` (litres
+    dispensed by its nozzles, from meter readings); each nozzle has `sales`.
+    Days are loaded from upstream on first use. Posted readings and unloads
+    are folded into open days as they arrive; a change to a closed day drops
+    it, and it is reloaded on the next read. fetch_all must raise when a read
+    fails; a day is only marked loaded once all three reads succeeded.
+    """
+
+    def __init__(self, fetch_all, max_scopes=TIMESERIES_MAX_SCOPES):
+        self.fetch_all = fetch_all
+        self.max_scopes = max_scopes
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _partition(self, scope):
+        # Called with the lock held
+        part = self._partitions.get(scope)
+        if part is None:
+            part = self._partitions[scope] = _Partition()
+            while len(self._partitions) > self.max_scopes:
+                self._partitions.popitem(last=False)
+        else:
+            self._partitions.move_to_end(scope)
+        return part
+
+    @staticmethod
+    def _is_open(day, today):
+        return day > (today - timedelta(days=TIMESERIES_OPEN_DAYS)).isoformat()
+
+    def _needs_load(self, part, day, today, now):
+        loaded_at = part.loaded.get(day)
+        if loaded_at is None:
+            return True
+        return self._is_open(day, today) and now - loaded_at > TIMESERIES_REFRESH_SECONDS
+
+    def ensure_loaded(self, scope, days):
+        """Load the days of a fuel pump's series that are missing or stale"""
+        today = date.today()
+        now = time.monotonic()
+        with self._lock:
+            part = self._partition(scope)
+            missing = [day for day in days if self._needs_load(part, day, today, now)]
+        if not missing:
+            return
+
+        span = f'(date.gte.{missing[0]},date.lte.{missing[-1]})'
+        level_rows = self.fetch_all('daily_readings', scope_params(
+            'daily_readings', {'select': LEVEL_SELECT, 'and': span}, scope))
+        reading_rows = self.fetch_all('readings', scope_params(
+            'readings', {'select': READING_SELECT, 'and': span}, scope))
+        unload_rows = self.fetch_all('tank_unloads', scope_params(
+            'tank_unloads', {'select': UNLOAD_SELECT, 'and': span}, scope))
+        reload = set(missing)
+
+        # Closing stock is repeated on every tank row of a fuel type's day; the first one counts
+        levels = {}
+        for row in level_rows:
+            levels.setdefault(((row.get('date') or '')[:10], row.get('fuel_type'), row.get('fuel_pump_id')), row)
+
+        with self._lock:
+            part = self._partition(scope)
+            for day in missing:
+                self._drop_day(part, day)
+            for rows, points in ((levels.values(), self._level_points), (reading_rows, self._reading_points),
+                                 (unload_rows, self._unload_points)):
+                for row in rows:
+                    day = (row.get('date') or '')[:10]
+                    if day in reload:
+                        self._apply(part, day, points(row), self._is_open(day, today))
+            for day in missing:
+                part.loaded[day] = now
+
+    @staticmethod
+    def _level_points(row):
+        day = (row.get('date') or '')[:10]
+        source = ('level', day, row.get('fuel_type'), row.get('fuel_pump_id'))
+        return [(source, ('tank', row.get('fuel_type'), 'level'), _number(row.get('closing_stock')))]
+
+    @staticmethod
+    def _reading_points(row):
+        if row.get('closing_reading') is None:
+            litres = None
+        else:
+            litres = meter_sales(row)
+        points = [(('reading', row.get('id'), 'nozzle'), ('nozzle', row.get('pump_id'), 'sales'), litres)]
+        if row.get('fuel_type'):
+            points.append((('reading', row.get('id'), 'tank'), ('tank', row.get('fuel_type'), 'sales'), litres))
+        return points
+
+    @staticmethod
+    def _unload_points(row):
+        return [(('unload', row.get('id')), ('tank', row.get('fuel_type'), 'receipts'), _number(row.get('quantity')))]
+
+    def _apply(self, part, day, points, track):
+        # Called with the lock held. Contributions of open days are kept, so a
+        # repeated or updated row replaces its previous value
+        t = day_time(day)
+        for source, key, value in points:
+            previous = part.contributions.pop(source, None) if track else None
+            if previous is not None:
+                old_key, old_day, old_value = previous
+                part.series[old_key].add(day_time(old_day), -old_value, -1)
+                part.by_day[old_day].discard(source)
+            if value is None or key[1] is None:
+                continue
+            part.series.setdefault(key, Series()).add(t, value)
+            if track:
+                part.contributions[source] = (key, day, value)
+                part.by_day.setdefault(day, set()).add(source)
+
+    def _drop_day(self, part, day):
+        # Called with the lock held
+        t = day_time(day)
+        for series in part.series.values():
+            series.remove(t)
+        for source in part.by_day.pop(day, ()):
+            part.contributions.pop(source, None)
+        part.loaded.pop(day, None)
+
+    def _posted(self, row, points):
+        day = (row.get('date') or '')[:10]
+        if not day:
+            return
+        today = date.today()
+        with self._lock:
+            # The row counts towards its own fuel pump and the unscoped series
+            for scope in {row.get('fuel_pump_id'), None}:
+                part = self._partitions.get(scope)
+                if part is None or day not in part.loaded:
+                    continue
+                if self._is_open(day, today):
+                    self._apply(part, day, points(row), True)
+                else:
+                    self._drop_day(part, day)
+
+    def apply_reading(self, row):
+        """Fold a created or updated meter reading into loaded series"""
+        self._posted(row, self._reading_points)
+
+    def apply_unload(self, row):
+        """Fold a created tank unload into loaded series"""
+        self._posted(row, self._unload_points)
+
+    def query(self, scope, kind, ident, metrics, start_day, end_day, step):
+        """Downsampled columns per metric for one tank or nozzle over a day range"""
+        self.ensure_loaded(scope, [day.isoformat() for day in day_range(start_day, end_day)])
+
+        start, end = day_time(start_day), day_time(end_day + timedelta(days=1))
+        with self._lock:
+            part = self._partition(scope)
+            windows = {}
+            for metric in metrics:
+                series = part.series.get((kind, ident, metric))
+                windows[metric] = series.window(start, end) if series is not None else (array('d'), array('d'))
+        return {metric: downsample(times, values, start, step) for metric, (times, values) in windows.items()}
@@ -0,0 +1,138 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 12 * 60 * 60))
+# Revocations are shared by every worker process on the host through this file;
+# set it to an empty string to keep them in each process only
+SESSION_REVOCATION_DB = os.environ.get(
+    'SESSION_REVOCATION_DB', os.path.join(tempfile.gettempdir(), 'fuel_pump_erp_revocations.sqlite3'))
+SESSION_REVOCATION_MAX = int(os.environ.get('SESSION_REVOCATION_MAX', 10000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revoked_tokens_expiry_idx ON revoked_tokens (expires_at);
+"""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class RevocationCache:
+    """Bounded set of revoked token ids, each kept only until its token expires"""
+
+    def __init__(self, max_entries=SESSION_REVOCATION_MAX):
+        self.max_entries = max_entries
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        with self._lock:
+            now = time.time()
+            if len(self._revoked) >= self.max_entries:
+                for key in [k for k, exp in self._revoked.items() if exp <= now]:
+                    del self._revoked[key]
+            if len(self._revoked) >= self.max_entries:
+                # Still full: drop the entry closest to expiring anyway
+                del self._revoked[min(self._revoked, key=self._revoked.get)]
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        return jti in self._revoked
+
+
+class RevocationStore:
+    """Revoked token ids in a local SQLite file, shared by every worker process on the host
+
+    Each id is kept only until its token expires.
+    """
+
+    def __init__(self, path=SESSION_REVOCATION_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread and process; connections are not fork-safe
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def revoke(self, jti, expires_at):
+        conn = self._connection()
+        conn.execute('DELETE FROM revoked_tokens WHERE expires_at <= ?', (time.time(),))
+        conn.execute('INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)', (jti, expires_at))
+
+    def is_revoked(self, jti):
+        row = self._connection().execute(
+            'SELECT 1 FROM revoked_tokens WHERE jti = ? AND expires_at > ?', (jti, time.time())).fetchone()
+        return row is not None
+
+
+class TokenSigner:
+    """Issue and verify compact HMAC-SHA256 signed session tokens.
+
+    A token is base64url(JSON claims) + "." + base64url(signature). Verification
+    needs no upstream access: it checks the signature, expiry and the host's
+    revocation store.
+    """
+
+    def __init__(self, secret=SESSION_SECRET, ttl=SESSION_TTL, revocation_db=SESSION_REVOCATION_DB):
+        if not secret:
+            print("Warning: SESSION_SECRET is not set, using a random per-process secret")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode('utf-8')
+        self.ttl = ttl
+        self.revoked = RevocationStore(revocation_db) if revocation_db else RevocationCache()
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload.encode('ascii'), hashlib.sha256).digest()
+
+    def issue(self, claims):
+        """Return (token, expires_at) for the given user claims"""
+        now = int(time.time())
+        body = dict(claims, iat=now, exp=now + self.ttl, jti=secrets.token_hex(8))
+        payload = _b64encode(json.dumps(body, separators=(',', ':')).encode('utf-8'))
+        return f"{payload}.{_b64encode(self._sign(payload))}", body['exp']
+
+    def verify(self, token):
+        """Return the claims of a valid token, or None"""
+        payload, sep, signature = (token or '').partition('.')
+        if not sep or '.' in signature:
+            return None
+        try:
+            expected = self._sign(payload)
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                return None
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, UnicodeError):
+            return None
+        if not isinstance(claims, dict) or claims.get('exp', 0) <= time.time():
+            return None
+        if self.revoked.is_revoked(claims.get('jti')):
+            return None
+        return claims
+
+    def revoke(self, claims):
+        self.revoked.revoke(claims.get('jti'), claims.get('exp', 0))
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+USER_INDEX_TTL = float(os.environ.get('USER_INDEX_TTL', 300))
+USER_INDEX_PAGE_SIZE = int(os.environ.get('USER_INDEX_PAGE_SIZE', 1000))
+
+
+def _users_from(data):
+    """Extract the user list from an admin users response body"""
+    users = data.get('users', []) if isinstance(data, dict) else data
+    return users if isinstance(users, list) else []
+
+
+def _normalize(email):
+    return (email or '').strip().lower()
+
+
+class UserDirectory:
+    """Email to Supabase Auth user index built from the paged admin users API.
+
+    The index is rebuilt at most once per TTL. Emails missing from the index
+    fall back to a filtered single-user query before being reported absent.
+    """
+
+    def __init__(self, client, ttl=USER_INDEX_TTL, page_size=USER_INDEX_PAGE_SIZE):
+        self.client = client
+        self.ttl = ttl
+        self.page_size = page_size
+        self._index = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _fetch_all(self):
+        """Page through every admin user; returns None if any page fails"""
+        index = {}
+        page = 1
+        while True:
+            response = self.client.auth_admin('GET', params={'page': page, 'per_page': self.page_size})
+            if response.status_code != 200:
+                print(f"Warning: Failed to load auth users page {page}: {response.text}")
+                return None
+            users = _users_from(response.json())
+            for user in users:
+                email = _normalize(user.get('email'))
+                if email:
+                    index[email] = user
+            if len(users) < self.page_size:
+                return index
+            page += 1
+
+    def refresh(self):
+        """Rebuild the index unless another thread is already doing so"""
+        if not self._refresh_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if not self._is_stale():
+                return
+            index = self._fetch_all()
+            if index is not None:
+                with self._lock:
+                    self._index = index
+                    self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _is_stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _lookup_filtered(self, email):
+        """Ask the admin API for a single email when the index misses"""
+        response = self.client.auth_admin('GET', params={'filter': email, 'page': 1, 'per_page': self.page_size})
+        if response.status_code != 200:
+            return None
+        for user in _users_from(response.json()):
+            if _normalize(user.get('email')) == email:
+                return user
+        return None
+
+    def get(self, email):
+        """Return the auth user with this email, or None"""
+        email = _normalize(email)
+        if not email:
+            return None
+
+        if self._is_stale():
+            self.refresh()
+
+        with self._lock:
+            user = self._index.get(email)
+        if user is not None:
+            return user
+
+        user = self._lookup_filtered(email)
+        if user is not None:
+            self.add(user)
+        return user
+
+    def add(self, user):
+        """Insert or replace a user, e.g. right after it was created"""
+        email = _normalize(user.get('email'))
+        if email:
+            with self._lock:
+                self._index[email] = user
+
+    def invalidate(self, email):
+        """Forget one email so the next lookup goes back to the admin API"""
+        with self._lock:
+            self._index.pop(_normalize(email), None)
@@ -0,0 +1,2 @@
+"""WSGI entry point for production servers: gunicorn --config gunicorn.conf.py wsgi:application"""
+from app import app as application
@@ -0,0 +1,81 @@
+
+-- Change log read by the backend's /api/sync endpoint. Every insert, update
+-- and delete on the synced tables appends one row; seq is the sync cursor.
+CREATE TABLE IF NOT EXISTS public.sync_changes (
+  seq BIGSERIAL PRIMARY KEY,
+  table_name TEXT NOT NULL,
+  row_id TEXT NOT NULL,
+  op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+  fuel_pump_id UUID,
+  changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS sync_changes_fuel_pump_seq_idx ON public.sync_changes (fuel_pump_id, seq);
+CREATE INDEX IF NOT EXISTS sync_changes_changed_at_idx ON public.sync_changes (changed_at);
+
+COMMENT ON TABLE public.sync_changes IS 'Append-only change log used as the delta sync cursor for mobile clients';
+
+-- Trigger function shared by all synced tables
+CREATE OR REPLACE FUNCTION public.record_sync_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_row JSONB;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    v_row := to_jsonb(OLD);
+  ELSE
+    v_row := to_jsonb(NEW);
+  END IF;
+
+  INSERT INTO public.sync_changes (table_name, row_id, op, fuel_pump_id)
+  VALUES (
+    TG_TABLE_NAME,
+    v_row ->> 'id',
+    lower(TG_OP),
+    NULLIF(v_row ->> 'fuel_pump_id', '')::UUID
+  );
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+-- Attach the trigger to the synced tables
+DO $$
+DECLARE
+  v_table TEXT;
+BEGIN
+  FOREACH v_table IN ARRAY ARRAY['customers', 'vehicles', 'indents', 'transactions', 'readings']
+  LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS record_sync_change_trigger ON public.%I', v_table);
+    EXECUTE format(
+      'CREATE TRIGGER record_sync_change_trigger AFTER INSERT OR UPDATE OR DELETE ON public.%I '
+      'FOR EACH ROW EXECUTE FUNCTION public.record_sync_change()',
+      v_table
+    );
+  END LOOP;
+END;
+$$;
+
+-- Drop change log entries older than the retention window; clients with an
+-- older cursor are told to reset and reload
+CREATE OR REPLACE FUNCTION public.prune_sync_changes(retain INTERVAL DEFAULT INTERVAL '30 days')
+RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_deleted BIGINT;
+BEGIN
+  DELETE FROM public.sync_changes WHERE changed_at < now() - retain;
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$;
+
+COMMENT ON FUNCTION public.prune_sync_changes(INTERVAL) IS 'Deletes sync_changes entries older than the retention window';
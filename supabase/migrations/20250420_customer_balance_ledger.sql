@@ -0,0 +1,212 @@
+
+-- Customer balance ledger: every change to customers.balance is recorded as a
+-- delta, applied under the customer's row lock. customers.balance stays the
+-- O(1) running balance; snapshots bound the work needed to verify it.
+ALTER TABLE IF EXISTS public.customers
+ADD COLUMN IF NOT EXISTS credit_limit NUMERIC(14, 2);
+
+COMMENT ON COLUMN public.customers.credit_limit IS 'Maximum amount the customer may owe; NULL means no limit';
+
+CREATE TABLE IF NOT EXISTS public.customer_ledger (
+  id BIGSERIAL PRIMARY KEY,
+  customer_id UUID NOT NULL REFERENCES public.customers(id) ON DELETE CASCADE,
+  source TEXT NOT NULL CHECK (source IN ('opening', 'transaction', 'payment', 'adjustment')),
+  source_id TEXT NOT NULL,
+  delta NUMERIC(14, 2) NOT NULL,
+  balance_after NUMERIC(14, 2) NOT NULL,
+  note TEXT,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  UNIQUE (source, source_id)
+);
+
+CREATE INDEX IF NOT EXISTS customer_ledger_customer_idx ON public.customer_ledger (customer_id, id);
+
+CREATE TABLE IF NOT EXISTS public.customer_balance_snapshots (
+  customer_id UUID NOT NULL REFERENCES public.customers(id) ON DELETE CASCADE,
+  ledger_id BIGINT NOT NULL,
+  balance NUMERIC(14, 2) NOT NULL,
+  taken_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  PRIMARY KEY (customer_id, ledger_id)
+);
+
+-- Apply one balance delta; repeating the same source/source_id is a no-op
+CREATE OR REPLACE FUNCTION public.apply_customer_balance_delta(
+  p_customer_id UUID,
+  p_delta NUMERIC,
+  p_source TEXT,
+  p_source_id TEXT,
+  p_enforce_credit_limit BOOLEAN DEFAULT false,
+  p_note TEXT DEFAULT NULL
+)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_balance NUMERIC;
+  v_credit_limit NUMERIC;
+  v_ledger_id BIGINT;
+BEGIN
+  SELECT COALESCE(balance, 0), credit_limit INTO v_balance, v_credit_limit
+  FROM public.customers
+  WHERE id = p_customer_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'customer_not_found: %', p_customer_id;
+  END IF;
+
+  INSERT INTO public.customer_ledger (customer_id, source, source_id, delta, balance_after, note)
+  VALUES (p_customer_id, p_source, p_source_id, p_delta, v_balance + p_delta, p_note)
+  ON CONFLICT (source, source_id) DO NOTHING
+  RETURNING id INTO v_ledger_id;
+
+  IF v_ledger_id IS NULL THEN
+    RETURN v_balance;
+  END IF;
+
+  IF p_enforce_credit_limit AND p_delta < 0 AND v_credit_limit IS NOT NULL
+     AND v_balance + p_delta < -v_credit_limit THEN
+    RAISE EXCEPTION 'credit_limit_exceeded: customer % balance % limit %', p_customer_id, v_balance, v_credit_limit;
+  END IF;
+
+  UPDATE public.customers SET balance = v_balance + p_delta WHERE id = p_customer_id;
+  RETURN v_balance + p_delta;
+END;
+$$;
+
+-- Insert transactions and charge non-payment ones to the customer's balance
+-- in one database transaction
+CREATE OR REPLACE FUNCTION public.record_transactions(
+  p_rows JSONB,
+  p_enforce_credit_limit BOOLEAN DEFAULT true
+)
+RETURNS SETOF public.transactions
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_row JSONB;
+  v_transaction public.transactions;
+BEGIN
+  FOR v_row IN SELECT * FROM jsonb_array_elements(p_rows)
+  LOOP
+    INSERT INTO public.transactions (
+      id, date, customer_id, vehicle_id, staff_id, indent_id, fuel_type,
+      amount, quantity, payment_method, fuel_pump_id
+    )
+    SELECT t.id, COALESCE(t.date, CURRENT_DATE), t.customer_id, t.vehicle_id, t.staff_id, t.indent_id,
+           t.fuel_type, t.amount, t.quantity, t.payment_method, t.fuel_pump_id
+    FROM jsonb_populate_record(NULL::public.transactions, v_row) t
+    RETURNING * INTO v_transaction;
+
+    IF v_transaction.customer_id IS NOT NULL AND v_transaction.fuel_type <> 'PAYMENT' THEN
+      PERFORM public.apply_customer_balance_delta(
+        v_transaction.customer_id, -COALESCE(v_transaction.amount, 0), 'transaction',
+        v_transaction.id::TEXT, p_enforce_credit_limit
+      );
+    END IF;
+
+    RETURN NEXT v_transaction;
+  END LOOP;
+END;
+$$;
+
+-- Insert a customer payment and credit it to the customer's balance
+CREATE OR REPLACE FUNCTION public.record_customer_payment(p_payment JSONB)
+RETURNS TABLE (payment JSONB, balance NUMERIC)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_payment public.customer_payments;
+BEGIN
+  INSERT INTO public.customer_payments (customer_id, amount, payment_method, notes, date, fuel_pump_id)
+  SELECT p.customer_id, p.amount, p.payment_method, p.notes, COALESCE(p.date, now()), p.fuel_pump_id
+  FROM jsonb_populate_record(NULL::public.customer_payments, p_payment) p
+  RETURNING * INTO v_payment;
+
+  RETURN QUERY SELECT
+    to_jsonb(v_payment),
+    public.apply_customer_balance_delta(v_payment.customer_id, v_payment.amount, 'payment', v_payment.id::TEXT);
+END;
+$$;
+
+-- Ledger balance = latest snapshot + deltas recorded after it
+CREATE OR REPLACE FUNCTION public.customer_ledger_balances()
+RETURNS TABLE (customer_id UUID, ledger_id BIGINT, balance NUMERIC)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  WITH latest AS (
+    SELECT DISTINCT ON (s.customer_id) s.customer_id, s.ledger_id, s.balance
+    FROM public.customer_balance_snapshots s
+    ORDER BY s.customer_id, s.ledger_id DESC
+  )
+  SELECT c.id,
+         COALESCE(MAX(l.id), latest.ledger_id, 0),
+         COALESCE(latest.balance, 0) + COALESCE(SUM(l.delta), 0)
+  FROM public.customers c
+  LEFT JOIN latest ON latest.customer_id = c.id
+  LEFT JOIN public.customer_ledger l
+    ON l.customer_id = c.id AND l.id > COALESCE(latest.ledger_id, 0)
+  GROUP BY c.id, latest.ledger_id, latest.balance;
+$$;
+
+-- Record a snapshot for every customer with ledger entries since their last one
+CREATE OR REPLACE FUNCTION public.snapshot_customer_balances()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_count INTEGER;
+BEGIN
+  INSERT INTO public.customer_balance_snapshots (customer_id, ledger_id, balance)
+  SELECT b.customer_id, b.ledger_id, b.balance
+  FROM public.customer_ledger_balances() b
+  WHERE b.ledger_id > 0
+  ON CONFLICT (customer_id, ledger_id) DO NOTHING;
+  GET DIAGNOSTICS v_count = ROW_COUNT;
+  RETURN v_count;
+END;
+$$;
+
+-- Compare customers.balance with the ledger; with p_fix, reset drifted balances
+CREATE OR REPLACE FUNCTION public.verify_customer_balances(p_fix BOOLEAN DEFAULT false)
+RETURNS TABLE (customer_id UUID, stored_balance NUMERIC, ledger_balance NUMERIC)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_drift RECORD;
+  v_ledger NUMERIC;
+BEGIN
+  FOR v_drift IN
+    SELECT c.id, COALESCE(c.balance, 0) AS stored, b.balance AS computed
+    FROM public.customers c
+    JOIN public.customer_ledger_balances() b ON b.customer_id = c.id
+    WHERE COALESCE(c.balance, 0) <> b.balance
+  LOOP
+    IF p_fix THEN
+      -- Recompute under the row lock so concurrent deltas are not lost
+      PERFORM 1 FROM public.customers WHERE id = v_drift.id FOR UPDATE;
+      SELECT b.balance INTO v_ledger FROM public.customer_ledger_balances() b WHERE b.customer_id = v_drift.id;
+      UPDATE public.customers SET balance = v_ledger WHERE id = v_drift.id;
+    END IF;
+    customer_id := v_drift.id;
+    stored_balance := v_drift.stored;
+    ledger_balance := v_drift.computed;
+    RETURN NEXT;
+  END LOOP;
+END;
+$$;
+
+-- Open the ledger with each existing customer's current balance
+INSERT INTO public.customer_ledger (customer_id, source, source_id, delta, balance_after, note)
+SELECT id, 'opening', id::TEXT, COALESCE(balance, 0), COALESCE(balance, 0), 'Balance before the ledger was introduced'
+FROM public.customers
+ON CONFLICT (source, source_id) DO NOTHING;
+
+SELECT public.snapshot_customer_balances();
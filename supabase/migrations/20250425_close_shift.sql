@@ -0,0 +1,132 @@
+
+-- Close a shift in one transaction: closing readings, consumable returns,
+-- cash figures and shift status, returning computed sales and cash discrepancy.
+-- The cash, card, UPI, indent and expense figures are shift totals: they are
+-- written on the first closed reading only, and zeroed on the others, so a sum
+-- over readings counts them once
+CREATE OR REPLACE FUNCTION public.close_shift(p_shift_id UUID, p_payload JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_shift public.shifts;
+  v_input JSONB;
+  v_reading public.readings;
+  v_matches INTEGER;
+  v_first BOOLEAN := TRUE;
+  v_price NUMERIC;
+  v_litres NUMERIC;
+  v_fuel JSONB := '[]'::JSONB;
+  v_readings JSONB := '[]'::JSONB;
+  v_total_litres NUMERIC := 0;
+  v_expected_sales NUMERIC := 0;
+  v_cash_remaining NUMERIC := COALESCE((p_payload ->> 'cash_remaining')::NUMERIC, 0);
+  v_cash_sales NUMERIC := COALESCE((p_payload ->> 'cash_sales')::NUMERIC, 0);
+  v_card_sales NUMERIC := COALESCE((p_payload ->> 'card_sales')::NUMERIC, 0);
+  v_upi_sales NUMERIC := COALESCE((p_payload ->> 'upi_sales')::NUMERIC, 0);
+  v_indent_sales NUMERIC := COALESCE((p_payload ->> 'indent_sales')::NUMERIC, 0);
+  v_expenses NUMERIC := COALESCE((p_payload ->> 'expenses')::NUMERIC, 0);
+  v_consumable_expenses NUMERIC := COALESCE((p_payload ->> 'consumable_expenses')::NUMERIC, 0);
+  v_reported_sales NUMERIC;
+BEGIN
+  SELECT * INTO v_shift FROM public.shifts WHERE id = p_shift_id FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'shift_not_found: %', p_shift_id;
+  END IF;
+  IF v_shift.status = 'completed' THEN
+    RAISE EXCEPTION 'shift_already_closed: %', p_shift_id;
+  END IF;
+
+  FOR v_input IN SELECT * FROM jsonb_array_elements(COALESCE(p_payload -> 'readings', '[]'::JSONB))
+  LOOP
+    -- Two nozzles of the same fuel cannot be told apart by fuel_type
+    IF NOT v_input ? 'id' THEN
+      SELECT count(*) INTO v_matches
+      FROM public.readings
+      WHERE shift_id = p_shift_id AND fuel_type = v_input ->> 'fuel_type';
+      IF v_matches > 1 THEN
+        RAISE EXCEPTION 'ambiguous_reading: % has % readings in shift %, pass the reading id',
+          v_input ->> 'fuel_type', v_matches, p_shift_id;
+      END IF;
+    END IF;
+
+    UPDATE public.readings r
+    SET closing_reading = (v_input ->> 'closing_reading')::NUMERIC,
+        testing_fuel = COALESCE((v_input ->> 'testing_fuel')::NUMERIC, 0),
+        cash_remaining = CASE WHEN v_first THEN v_cash_remaining ELSE 0 END,
+        cash_sales = CASE WHEN v_first THEN v_cash_sales ELSE 0 END,
+        card_sales = CASE WHEN v_first THEN v_card_sales ELSE 0 END,
+        upi_sales = CASE WHEN v_first THEN v_upi_sales ELSE 0 END,
+        indent_sales = CASE WHEN v_first THEN v_indent_sales ELSE 0 END,
+        expenses = CASE WHEN v_first THEN v_expenses ELSE 0 END,
+        consumable_expenses = CASE WHEN v_first THEN v_consumable_expenses ELSE 0 END
+    WHERE r.shift_id = p_shift_id
+      AND (CASE WHEN v_input ? 'id' THEN r.id::TEXT = v_input ->> 'id'
+                ELSE r.fuel_type = v_input ->> 'fuel_type' END)
+    RETURNING r.* INTO v_reading;
+
+    IF NOT FOUND THEN
+      RAISE EXCEPTION 'reading_not_found: % in shift %', COALESCE(v_input ->> 'id', v_input ->> 'fuel_type'), p_shift_id;
+    END IF;
+    IF v_reading.closing_reading <= v_reading.opening_reading THEN
+      RAISE EXCEPTION 'invalid_closing_reading: % must be greater than opening reading %',
+        v_reading.closing_reading, v_reading.opening_reading;
+    END IF;
+
+    SELECT current_price INTO v_price
+    FROM public.fuel_settings
+    WHERE fuel_type = v_reading.fuel_type
+      AND (fuel_pump_id = v_shift.fuel_pump_id OR v_shift.fuel_pump_id IS NULL)
+    ORDER BY updated_at DESC NULLS LAST
+    LIMIT 1;
+
+    v_first := FALSE;
+    v_litres := GREATEST(v_reading.closing_reading - v_reading.opening_reading - COALESCE(v_reading.testing_fuel, 0), 0);
+    v_total_litres := v_total_litres + v_litres;
+    v_expected_sales := v_expected_sales + v_litres * COALESCE(v_price, 0);
+
+    v_readings := v_readings || to_jsonb(v_reading);
+    v_fuel := v_fuel || jsonb_build_object(
+      'reading_id', v_reading.id,
+      'fuel_type', v_reading.fuel_type,
+      'opening_reading', v_reading.opening_reading,
+      'closing_reading', v_reading.closing_reading,
+      'testing_fuel', COALESCE(v_reading.testing_fuel, 0),
+      'litres', v_litres,
+      'price', v_price,
+      'amount', v_litres * COALESCE(v_price, 0)
+    );
+  END LOOP;
+
+  UPDATE public.shift_consumables
+  SET quantity_returned = (c.value ->> 'quantity_returned')::NUMERIC,
+      status = 'returned'
+  FROM jsonb_array_elements(COALESCE(p_payload -> 'consumables', '[]'::JSONB)) c
+  WHERE public.shift_consumables.id::TEXT = c.value ->> 'id'
+    AND public.shift_consumables.shift_id = p_shift_id;
+
+  UPDATE public.shifts
+  SET end_time = COALESCE((p_payload ->> 'end_time')::TIMESTAMPTZ, now()),
+      status = 'completed',
+      cash_remaining = v_cash_remaining
+  WHERE id = p_shift_id
+  RETURNING * INTO v_shift;
+
+  v_reported_sales := v_cash_sales + v_card_sales + v_upi_sales + v_indent_sales;
+
+  RETURN jsonb_build_object(
+    'shift', to_jsonb(v_shift),
+    'readings', v_readings,
+    'fuel', v_fuel,
+    'total_litres', v_total_litres,
+    'expected_sales', v_expected_sales,
+    'reported_sales', v_reported_sales,
+    'sales_difference', v_reported_sales - v_expected_sales,
+    'cash_discrepancy', v_cash_remaining - v_cash_sales + v_expenses
+  );
+END;
+$$;
+
+COMMENT ON FUNCTION public.close_shift(UUID, JSONB) IS 'Closes a shift atomically and returns computed sales and cash discrepancy';
@@ -0,0 +1,41 @@
+
+-- Make record_transactions safe to replay: a row whose id already exists is
+-- returned as stored instead of failing the batch, and its balance charge is
+-- not applied twice (the ledger is keyed by source and source_id)
+CREATE OR REPLACE FUNCTION public.record_transactions(
+  p_rows JSONB,
+  p_enforce_credit_limit BOOLEAN DEFAULT true
+)
+RETURNS SETOF public.transactions
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_row JSONB;
+  v_transaction public.transactions;
+BEGIN
+  FOR v_row IN SELECT * FROM jsonb_array_elements(p_rows)
+  LOOP
+    INSERT INTO public.transactions (
+      id, date, customer_id, vehicle_id, staff_id, indent_id, fuel_type,
+      amount, quantity, payment_method, fuel_pump_id
+    )
+    SELECT t.id, COALESCE(t.date, CURRENT_DATE), t.customer_id, t.vehicle_id, t.staff_id, t.indent_id,
+           t.fuel_type, t.amount, t.quantity, t.payment_method, t.fuel_pump_id
+    FROM jsonb_populate_record(NULL::public.transactions, v_row) t
+    ON CONFLICT (id) DO NOTHING
+    RETURNING * INTO v_transaction;
+
+    IF NOT FOUND THEN
+      SELECT * INTO v_transaction FROM public.transactions WHERE id = (v_row ->> 'id');
+    ELSIF v_transaction.customer_id IS NOT NULL AND v_transaction.fuel_type <> 'PAYMENT' THEN
+      PERFORM public.apply_customer_balance_delta(
+        v_transaction.customer_id, -COALESCE(v_transaction.amount, 0), 'transaction',
+        v_transaction.id::TEXT, p_enforce_credit_limit
+      );
+    END IF;
+
+    RETURN NEXT v_transaction;
+  END LOOP;
+END;
+$$;
@@ -0,0 +1,10 @@
+-- The backend filters every read of these tables by fuel_pump_id and pages
+-- by id, so one station's query reads only that station's rows however many
+-- fuel pumps share the database
+CREATE INDEX IF NOT EXISTS customers_fuel_pump_idx ON public.customers (fuel_pump_id, id);
+CREATE INDEX IF NOT EXISTS vehicles_fuel_pump_idx ON public.vehicles (fuel_pump_id, id);
+CREATE INDEX IF NOT EXISTS staff_fuel_pump_idx ON public.staff (fuel_pump_id, id);
+CREATE INDEX IF NOT EXISTS indents_fuel_pump_idx ON public.indents (fuel_pump_id, id);
+CREATE INDEX IF NOT EXISTS readings_fuel_pump_date_idx ON public.readings (fuel_pump_id, date);
+CREATE INDEX IF NOT EXISTS transactions_fuel_pump_date_idx ON public.transactions (fuel_pump_id, date);
+CREATE INDEX IF NOT EXISTS transactions_fuel_pump_idx ON public.transactions (fuel_pump_id, id);